@@ -1,23 +1,55 @@
 # -*- coding: utf-8 -*-
-""" Command-line interface for presswork. Piping is encouraged. """
+""" Command-line interface for presswork. Piping is encouraged.
+
+`presswork <options>` generates text (that's the `generate` command, which is the default).
+`presswork build <options>` trains a model and saves it, so that `presswork -m <model file>` can skip training.
+`presswork serve <options>` trains models once, then answers requests for text from them (see `presswork.serving`).
+`presswork publish <options>` trains models & puts them in shared memory, for any number of `serve`s to share.
+"""
 import codecs
+import contextlib
+import signal
 import sys
 
 import click
 
 from presswork import constants
+from presswork import serving
 from presswork.log import setup_logging
-from presswork.text import clean
+from presswork.text import shared_models
 from presswork.text import text_makers
+from presswork.text import timings
 from presswork.text.grammar import joiners
 from presswork.text.grammar import tokenizers
 
 
-@click.command()
+class _GenerateByDefault(click.Group):
+    """ a group of commands, where the command name can be left out, for the default command (`generate`).
+    so `presswork -i foo.txt` works like it always has, and is the same as `presswork generate -i foo.txt`.
+    """
+    default_command_name = 'generate'
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands:
+            args = [self.default_command_name] + list(args)
+        return super(_GenerateByDefault, self).parse_args(ctx, args)
+
+
+@click.group(cls=_GenerateByDefault)
+def main():
+    pass
+
+
+@main.command(epilog="other commands: 'presswork build --help', 'presswork serve --help', 'presswork publish --help'")
 @click.option('-i', '--input-filename',
               help="what to read to train the markov chain. default expectation: you will pipe things in on stdin. "
                    "if you do not use stdin, give this param with a filename to read from.",
               default='-')
+@click.option('-m', '--model', 'model_filename',
+              type=click.Path(exists=True, dir_okay=False),
+              help="generate from a model file made by 'presswork build', instead of training on input text. "
+                   "(the model is already trained, so -i, -e, -n, -s, -t don't apply.)",
+              default=None)
 @click.option('-c', '--count',
               type=int,
               help="count of sentences to generate.",
@@ -57,36 +89,54 @@ from presswork.text.grammar import tokenizers
               default='utf-8',
               show_default=True)
 @click.option('-E', '--output-encoding', help="encoding of the output text.", default='utf-8', show_default=True)
-def main(ngram_size, strategy, tokenize, join, input_filename, input_encoding, output_encoding, count, ):
+@click.option('--seed',
+              type=int,
+              help="seed for the random choices (generating, and joining), to make the same output again. "
+                   "default: different every time.",
+              default=None)
+@click.option('--jobs',
+              type=click.IntRange(min=1),
+              help="generate in this many worker processes (on as many cores), for big counts. the output for a given "
+                   "--seed is the same, with any number of jobs (or none). default: generate in this process.",
+              default=None)
+@click.option('--timings', 'show_timings',
+              is_flag=True,
+              help="after the output, print how long each stage of the pipeline took (to stderr).",
+              default=False)
+@click.option('--stats', 'show_stats',
+              is_flag=True,
+              help="after the output, print the size and shape of the trained model: states, transitions, "
+                   "vocabulary, branching, memory (to stderr).",
+              default=False)
+def generate(ngram_size, strategy, tokenize, join, input_filename, model_filename, input_encoding, output_encoding,
+             seed, jobs, count, show_timings, show_stats):
+    """ train a model on the input text (or load a prebuilt model), and generate text from it
+    """
     logger = setup_logging()
     logger.debug("CLI invocation variable dump: {}".format(locals()))
 
-    if input_filename == '-':
-        if input_encoding == "raw":
-            input_text = sys.stdin.read()
-        else:
-            UTF8Reader = codecs.getreader(input_encoding)
-            sys.stdin = UTF8Reader(sys.stdin)
-            input_text = sys.stdin.read()
+    if model_filename:
+        _check_model_file(model_filename)
+        input_text = None
     else:
-        if input_encoding == "raw":
-            with open(input_filename, 'r') as f:
-                input_text = f.read()
-        else:
-            with codecs.open(input_filename, 'r', encoding=input_encoding) as f:
-                input_text = f.read()
+        input_text = _read_input_text(input_filename, input_encoding)
 
     logger.debug("CLI invocation variable dump again: {}".format(locals()))
-    text_maker = text_makers.create_text_maker(
-            strategy=strategy,
-            sentence_tokenizer=tokenize,
-            joiner=join,
-            input_text=clean.CleanInputString(input_text),
-            ngram_size=ngram_size)
+    with timings.collect_timings() if show_timings else _no_timings() as recorded_timings:
+        if model_filename:
+            text_maker = text_makers.load_text_maker(model_filename, joiner=join, rng=seed)
+        else:
+            text_maker = text_makers.create_text_maker(
+                    strategy=strategy,
+                    sentence_tokenizer=tokenize,
+                    joiner=join,
+                    input_text=input_text,
+                    ngram_size=ngram_size,
+                    rng=seed)
 
-    output_sentences = text_maker.make_sentences(count)
-    output_text = text_maker.join(output_sentences)
-    final_result = text_maker.proofread(output_text)
+        output_sentences = text_maker.make_sentences(count, workers=jobs)
+        output_text = text_maker.join(output_sentences)
+        final_result = text_maker.proofread(output_text)
 
     UTF8Writer = codecs.getwriter(output_encoding)
     sys.stdout = UTF8Writer(sys.stdout)
@@ -94,6 +144,229 @@ def main(ngram_size, strategy, tokenize, join, input_filename, input_encoding, o
     sys.stdout.write(final_result)
     sys.stdout.write("\n")
 
+    # (stderr, so that piping the output text elsewhere still works as usual)
+    if show_timings:
+        click.echo(recorded_timings.report(), err=True)
+    if show_stats:
+        click.echo(text_maker.stats(exact_memory=True).report(), err=True)
+
+
+@main.command()
+@click.option('-i', '--input-filename',
+              help="the input text to train the model on. default: stdin",
+              default='-')
+@click.option('-o', '--output-filename',
+              required=True,
+              type=click.Path(dir_okay=False, writable=True),
+              help="where to save the model. (overwrites)")
+@click.option('-n', '--ngram-size', type=int, default=constants.DEFAULT_NGRAM_SIZE, show_default=True,
+              help="same as for generate (see 'presswork --help').")
+@click.option('-s', '--strategy', type=click.Choice(text_makers.TEXT_MAKER_NICKNAMES), default="markovify",
+              help="same as for generate.")
+@click.option('-t', '--tokenize', type=click.Choice(tokenizers.TOKENIZER_NICKNAMES), default='nltk',
+              help="same as for generate.")
+@click.option('-e', '--input-encoding', default='utf-8', show_default=True,
+              help="same as for generate.")
+@click.option('--stats', 'show_stats',
+              is_flag=True,
+              help="print the size and shape of the trained model (to stderr).",
+              default=False)
+def build(input_filename, output_filename, ngram_size, strategy, tokenize, input_encoding, show_stats):
+    """ train a model on the input text, and save it to a file. then generate from it, without retraining:
+    'presswork -m <file>' (or serve it: 'presswork serve -m <name>=<file>').
+
+    the joiner isn't part of the model; choose it when generating.
+    """
+    logger = setup_logging()
+    logger.debug("CLI invocation variable dump: {}".format(locals()))
+
+    text_maker = text_makers.create_text_maker(
+            strategy=strategy,
+            sentence_tokenizer=tokenize,
+            input_text=_read_input_text(input_filename, input_encoding),
+            ngram_size=ngram_size)
+    text_makers.save_text_maker(text_maker, output_filename)
+
+    if show_stats:
+        click.echo(text_maker.stats(exact_memory=True).report(), err=True)
+
+
+@main.command()
+@click.option('-m', '--model', 'model_specs',
+              multiple=True,
+              metavar='NAME=FILENAME',
+              help="a model to serve: its name, and a model file from 'presswork build' - or input text, to train "
+                   "the model on. give this once per model.")
+@click.option('--shared', 'shared_names',
+              multiple=True,
+              metavar='NAME',
+              help="a model to serve from shared memory, as published by 'presswork publish'. publishing it again "
+                   "swaps it, while serving. give this once per model.")
+@click.option('--shared-directory',
+              type=click.Path(exists=True, file_okay=False),
+              help="where shared models are. (same as for 'presswork publish')",
+              default=shared_models.DEFAULT_DIRECTORY,
+              show_default=True)
+@click.option('--socket', 'socket_path',
+              help="answer requests on a Unix socket at this path. default: answer requests from stdin, on stdout.",
+              default=None)
+@click.option('-n', '--ngram-size', type=int, default=constants.DEFAULT_NGRAM_SIZE, show_default=True,
+              help="same as for generate (see 'presswork --help'). applies to all the models trained from input text.")
+@click.option('-s', '--strategy', type=click.Choice(text_makers.TEXT_MAKER_NICKNAMES), default="markovify",
+              help="same as for generate. applies to all the models trained from input text.")
+@click.option('-t', '--tokenize', type=click.Choice(tokenizers.TOKENIZER_NICKNAMES), default='nltk',
+              help="same as for generate. applies to all the models trained from input text.")
+@click.option('-j', '--join', type=click.Choice(joiners.JOINER_NICKNAMES), default='nltk',
+              help="same as for generate. applies to all the models.")
+@click.option('-e', '--input-encoding', default='utf-8', show_default=True,
+              help="same as for generate. applies to all the input files.")
+def serve(model_specs, shared_names, shared_directory, socket_path, ngram_size, strategy, tokenize, join,
+          input_encoding):
+    """ train (or load) models once, then answer requests for text from them, until stopped.
+
+    requests and responses are JSON, one per line. for example, request {"model": "bills", "count": 10};
+    response {"model": "bills", "text": "..."}. see the docstring of presswork.serving for the details.
+    """
+    logger = setup_logging()
+    logger.debug("CLI invocation variable dump: {}".format(locals()))
+
+    if not model_specs and not shared_names:
+        raise click.UsageError("give at least 1 model to serve: --model NAME=FILENAME, or --shared NAME")
+    text_makers_by_name = _load_models(model_specs, ngram_size, strategy, tokenize, join, input_encoding)
+    for name in shared_names:
+        if name in text_makers_by_name:
+            raise click.BadParameter("model name given more than once: {}".format(name), param_hint="--shared")
+        try:
+            text_makers_by_name[name] = shared_models.SharedModel(name, directory=shared_directory, joiner=join)
+        except (IOError, OSError, ValueError) as e:
+            raise click.BadParameter("can't attach shared model {}: {}".format(name, e), param_hint="--shared")
+    model_server = serving.ModelServer(text_makers_by_name)
+
+    # (stderr: on stdout, there's nothing but responses)
+    where = "on Unix socket {}".format(socket_path) if socket_path else "on stdin"
+    click.echo("serving models: {}. requests {}".format(", ".join(model_server.model_names), where), err=True)
+
+    if socket_path:
+        # (so that a plain `kill` also stops the server cleanly, removing the socket)
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+        try:
+            model_server.serve_unix_socket(socket_path)
+        except KeyboardInterrupt:
+            pass
+    else:
+        model_server.serve_lines(sys.stdin, sys.stdout)
+
+
+@main.command()
+@click.option('-m', '--model', 'model_specs',
+              multiple=True,
+              required=True,
+              metavar='NAME=FILENAME',
+              help="a model to publish: its name, and a model file from 'presswork build' - or input text, to train "
+                   "the model on. give this once per model.")
+@click.option('--shared-directory',
+              type=click.Path(exists=True, file_okay=False),
+              help="where to put the shared models. (servers must look in the same place)",
+              default=shared_models.DEFAULT_DIRECTORY,
+              show_default=True)
+@click.option('-n', '--ngram-size', type=int, default=constants.DEFAULT_NGRAM_SIZE, show_default=True,
+              help="same as for generate (see 'presswork --help'). applies to all the models trained from input text.")
+@click.option('-s', '--strategy', type=click.Choice(text_makers.TEXT_MAKER_NICKNAMES), default="markovify",
+              help="same as for generate. applies to all the models trained from input text.")
+@click.option('-t', '--tokenize', type=click.Choice(tokenizers.TOKENIZER_NICKNAMES), default='nltk',
+              help="same as for generate. applies to all the models trained from input text.")
+@click.option('-e', '--input-encoding', default='utf-8', show_default=True,
+              help="same as for generate. applies to all the input files.")
+def publish(model_specs, shared_directory, ngram_size, strategy, tokenize, input_encoding):
+    """ train (or load) models, and put them in shared memory, by name: for 'presswork serve --shared NAME'.
+    any number of servers can then serve them, without each loading its own copy.
+
+    publishing a model again, under the same name (say, retrained on a new corpus), swaps it for the new one - in the
+    servers too, from their next request on. the models stay published until reboot (or until deleted: they're
+    files, in --shared-directory).
+    """
+    logger = setup_logging()
+    logger.debug("CLI invocation variable dump: {}".format(locals()))
+
+    for name, text_maker in sorted(_load_models(model_specs, ngram_size, strategy, tokenize, None,
+                                                input_encoding).iteritems()):
+        try:
+            path = shared_models.publish(text_maker, name, directory=shared_directory)
+        except shared_models.ModelTooBigToPublish as e:
+            raise click.BadParameter(str(e), param_hint="--model")
+        click.echo("published model {}: {}".format(name, path), err=True)
+
+
+def _load_models(model_specs, ngram_size, strategy, tokenize, join, input_encoding):
+    """ :return: {name: TextMaker}, for `--model NAME=FILENAME`s: each loaded from a model file, or trained on text
+    """
+    text_makers_by_name = {}
+    for name, filename in _parse_model_specs(model_specs):
+        if text_makers.is_model_file(filename):
+            text_makers_by_name[name] = text_makers.load_text_maker(filename, joiner=join)
+        else:
+            text_makers_by_name[name] = text_makers.create_text_maker(
+                    strategy=strategy,
+                    sentence_tokenizer=tokenize,
+                    joiner=join,
+                    input_text=_read_input_text(filename, input_encoding),
+                    ngram_size=ngram_size,
+                    compact_corpus=True)  # (these are long-lived; markovify keeps the tokenized corpus)
+    return text_makers_by_name
+
+
+def _exit_on_signal(signal_number, frame):
+    sys.exit(0)
+
+
+def _parse_model_specs(model_specs):
+    """ `NAME=FILENAME` pairs, for `serve --model`
+
+        >>> _parse_model_specs(["bills=senate-bills.txt", "poems=/tmp/a=b.txt"])
+        [('bills', 'senate-bills.txt'), ('poems', '/tmp/a=b.txt')]
+        >>> _parse_model_specs(["bills"])
+        Traceback (most recent call last):
+        ...
+        BadParameter: expected NAME=FILENAME, got: bills
+    """
+    pairs = []
+    for spec in model_specs:
+        name, _, filename = spec.partition("=")
+        if not name or not filename:
+            raise click.BadParameter("expected NAME=FILENAME, got: {}".format(spec), param_hint="--model")
+        if name in dict(pairs):
+            raise click.BadParameter("model name given more than once: {}".format(name), param_hint="--model")
+        pairs.append((name, filename))
+    return pairs
+
+
+def _check_model_file(model_filename):
+    if not text_makers.is_model_file(model_filename):
+        raise click.BadParameter("not a model file (make one with 'presswork build'): {}".format(model_filename),
+                                 param_hint="--model")
+
+
+def _read_input_text(input_filename, input_encoding):
+    """ read from a file, or '-' for stdin. input_encoding 'raw' means: don't decode (bytes in, bytes out)
+    """
+    if input_filename == '-':
+        if input_encoding == "raw":
+            return sys.stdin.read()
+        UTF8Reader = codecs.getreader(input_encoding)
+        sys.stdin = UTF8Reader(sys.stdin)
+        return sys.stdin.read()
+
+    if input_encoding == "raw":
+        with open(input_filename, 'r') as f:
+            return f.read()
+    with codecs.open(input_filename, 'r', encoding=input_encoding) as f:
+        return f.read()
+
+
+@contextlib.contextmanager
+def _no_timings():
+    yield None
+
 
 if __name__ == "__main__":  # pragma: no cover
     main()
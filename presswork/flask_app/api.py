@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+""" JSON API for the Flask app: batches of generation jobs, for other programs to call (rather than people, in browsers)
+
+the form (`/`) trains a model on every submission, and answers with a page of HTML. here, a client sends any number
+of jobs in 1 request, against models that are already trained, and gets the sentences back as JSON.
+
+POST /api/generate, with a JSON body: {"jobs": [<job>, ...]}. each job makes sentences from 1 model:
+    * {"model": <name>}: one of the models the app was started with (app.config['PRESSWORK_MODELS'], {name:
+        TextMaker, or shared_models.SharedModel}; see app.py)
+    * or {"input_text": <text>, "strategy": .., "tokenizer": .., "ngram_size": ..}: a model trained on input_text.
+        trained models are cached (the last MAX_CACHED_MODELS of them): the same text, with the same options, isn't
+        trained on again. the result tells the model's "model_key"; later jobs can give {"model_key": <key>} instead of
+        sending the text again. (until it's dropped from the cache; then that's an error, and the text is needed.)
+        nor is it trained on twice at once: a job whose model is being trained for another request waits for that
+        (up to BUILD_TIMEOUT seconds; then it's an error - try again), and gets the same model. (see ModelCache)
+    and, all optional:
+    * "count": sentences to make (default 1, up to serving.MAX_COUNT)
+    * "format": "sentences" (default): a list of sentences, each joined up as text. "text": 1 string, all of them
+        joined up (like the form's output). "words": a list of sentences, each a list of words - not joined at all.
+    * "joiner": a joiner nickname, to join with. (default: the model's)
+    * "seed": a whole number, to make the same output again. (the joiner's too, if "joiner" is given)
+    * "id": anything; it's echoed back in the result
+
+the response: {"results": [<result>, ...]}, 1 per job, in the same order. each is {"sentences": ..} (or "text"/"words",
+by format), with "model" or "model_key", and "id" if given - or {"error": <message>}: a bad job gets an error result,
+and the rest of the batch goes on. (a request that isn't {"jobs": [...]} at all gets status 400, and {"error": ...}.)
+
+POST /api/stream, with 1 job as the JSON body (the same as above; "count" can go up to MAX_STREAM_COUNT): the output
+streams back as it's made - a chunk (STREAM_CHUNK_SIZE sentences) at a time, joined & proofread - so the first of it
+comes back as soon as for a small count, and neither end holds all of it at once. the response is JSON lines
+(application/x-ndjson), 1 object per line:
+    * 1st, the job's result without the output: {"model" or "model_key": .., "id": .., "count": ..}
+    * then 1 per chunk: {"sentences": [..]} (or "words"). for "text", {"text": <piece>}: the pieces add up to the text.
+    * last, {"done": true}. (if it broke off partway, the last line is {"error": <message>} instead)
+a bad job gets status 400, and {"error": ...}, before any streaming. with a seed, the output is the same each time -
+but not the same as from /api/generate (sentences are drawn chunk by chunk; see TextMaker.iter_text).
+
+the sentences are made as the client reads them: the WSGI server writes each line out before asking for the next,
+so a slow client slows generating down (rather than piling output up in memory), and a client that hangs up stops it.
+
+GET /api/models: {"models": [<name>, ...]}, the models the app was started with.
+
+GET /api/stats: {"model_cache": {..}}, counts of what the model cache has done (see ModelCache.stats)
+"""
+import collections
+import hashlib
+import logging
+import threading
+
+from flask import Blueprint, Response, current_app, json, jsonify, request, stream_with_context
+
+from presswork import constants
+from presswork import serving
+from presswork.text import clean
+from presswork.text import parallel
+from presswork.text import randomness
+from presswork.text import text_makers
+from presswork.text.grammar import joiners
+from presswork.text.grammar import tokenizers
+
+logger = logging.getLogger('presswork')
+
+blueprint = Blueprint('api', __name__, url_prefix='/api')
+
+FORMATS = ('sentences', 'text', 'words')
+DEFAULT_FORMAT = 'sentences'
+
+# per request: jobs, and sentences (all the jobs' counts added up). so 1 request can't tie up a worker for long
+MAX_JOBS = 100
+MAX_SENTENCES = 10 * serving.MAX_COUNT
+
+# per streamed request. streaming holds 1 chunk at a time, so this only bounds how long it runs
+MAX_STREAM_COUNT = 100 * serving.MAX_COUNT
+STREAM_CHUNK_SIZE = text_makers.TEXT_CHUNK_SIZE
+
+MAX_CACHED_MODELS = 16
+
+# seconds to wait for a model that another request is training, before giving up (it goes on training, and is cached)
+BUILD_TIMEOUT = 60
+
+
+class BuildTimeout(serving.RequestError):
+    """ raised if a model being trained for another request wasn't ready in time
+    """
+
+
+class ModelCache(object):
+    """ TextMakers trained on input text, by key (see key_for): the last `size` used. thread-safe
+
+    get_or_create() trains each model once, however many requests ask for it at once ("single flight"): the 1st
+    trains it, the rest wait for that, and all of them get the same TextMaker. (if training fails, they all get the
+    error; nothing is cached, so the next request tries again.)
+
+        >>> cache = ModelCache()
+        >>> cache.get_or_create("key", lambda: "a text maker"), cache.get_or_create("key", lambda: "another")
+        ('a text maker', 'a text maker')
+        >>> cache.stats()["builds"], cache.stats()["hits"]
+        (1, 1)
+    """
+
+    def __init__(self, size=MAX_CACHED_MODELS, build_timeout=BUILD_TIMEOUT):
+        self.size = size
+        self.build_timeout = build_timeout
+        self._text_makers = collections.OrderedDict()
+        # models being trained right now, by key
+        self._builds = {}
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(input_text, strategy, tokenizer, ngram_size):
+        """ :return: the key for a model trained on input_text, with these options: a hash of all of them
+        """
+        options = [unicode(strategy), unicode(tokenizer), unicode(ngram_size), u""]
+        digest = hashlib.sha1(u"\0".join(options).encode('utf-8'))
+        digest.update(unicode(input_text).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ :return: the TextMaker cached as `key`, or None
+        """
+        with self._lock:
+            return self._get(key)
+
+    def put(self, key, text_maker):
+        with self._lock:
+            self._put(key, text_maker)
+
+    def get_or_create(self, key, create, timeout=None):
+        """ :return: the TextMaker cached as `key`; or if there isn't one, create()'s, cached. if another thread is
+            already creating it, waits for that one instead of calling create() again
+
+        :param timeout: seconds to wait for another thread's create(). default: self.build_timeout. (None: forever)
+        :raises BuildTimeout: if another thread's create() took longer than that
+        :raises: whatever create() raised (here, or in the thread that called it)
+        """
+        with self._lock:
+            text_maker = self._get(key)
+            if text_maker is not None:
+                self._counts["hits"] += 1
+                return text_maker
+            build = self._builds.get(key)
+            if build is None:
+                build = self._builds[key] = _Build()
+                self._counts["builds"] += 1
+                creating = True
+            else:
+                self._counts["coalesced"] += 1
+                creating = False
+
+        if creating:
+            try:
+                build.text_maker = create()
+            except BaseException as e:
+                build.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._builds[key]
+                    if build.error is None:
+                        self._put(key, build.text_maker)
+                    else:
+                        self._counts["build_errors"] += 1
+                build.done.set()
+            return build.text_maker
+
+        logger.info(u"[flask] waiting for model {} to be trained (for another request)".format(key))
+        timeout = self.build_timeout if timeout is None else timeout
+        if not build.done.wait(timeout):
+            with self._lock:
+                self._counts["timeouts"] += 1
+            raise BuildTimeout(u"model {} is still being trained (for another request), after {}s. try again "
+                               u"later".format(key, timeout))
+        if build.error is not None:
+            raise build.error
+        return build.text_maker
+
+    def stats(self):
+        """ :return: dict of counts, since this cache was made:
+            * "builds": models trained. "build_errors": of those, how many failed
+            * "hits": models that were already cached. "coalesced": models that were being trained, and were waited
+                for - each of these & hits is a training saved. "timeouts": of those waits, how many gave up
+            and right now: "cached" models, and "building": models being trained
+        """
+        with self._lock:
+            stats = {name: self._counts[name] for name in ("builds", "build_errors", "hits", "coalesced", "timeouts")}
+            stats.update(cached=len(self._text_makers), building=len(self._builds))
+            return stats
+
+    def _get(self, key):
+        text_maker = self._text_makers.pop(key, None)
+        if text_maker is not None:
+            self._text_makers[key] = text_maker   # (most recently used: last)
+        return text_maker
+
+    def _put(self, key, text_maker):
+        self._text_makers.pop(key, None)
+        self._text_makers[key] = text_maker
+        while len(self._text_makers) > self.size:
+            self._text_makers.popitem(last=False)
+
+    def __len__(self):
+        return len(self._text_makers)
+
+
+class _Build(object):
+    """ a model being trained, for ModelCache.get_or_create: done is set once it's trained (or failed)
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.text_maker = None
+        self.error = None
+
+
+model_cache = ModelCache()
+
+
+@blueprint.route('/generate', methods=['POST'])
+def generate():
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("jobs"), list):
+        return _error_response(u'expected a JSON object like {"jobs": [...]}')
+    jobs = body["jobs"]
+    if len(jobs) > MAX_JOBS:
+        return _error_response(u"too many jobs: {} (at most {} per request)".format(len(jobs), MAX_JOBS))
+    sentences = sum(job.get("count", 1) for job in jobs
+                    if isinstance(job, dict) and isinstance(job.get("count", 1), (int, long)))
+    if sentences > MAX_SENTENCES:
+        return _error_response(u"too many sentences: {} (at most {} per request)".format(sentences, MAX_SENTENCES))
+
+    return jsonify(results=[run_job(job) for job in jobs])
+
+
+@blueprint.route('/stream', methods=['POST'])
+def stream():
+    job = request.get_json(force=True, silent=True)
+    if not isinstance(job, dict):
+        return _error_response(u"expected a JSON object: 1 job")
+    result = {}
+    try:
+        prepared = _prepare(job, result, max_count=MAX_STREAM_COUNT)
+    except serving.RequestError as e:
+        return _error_response(unicode(e))
+    result["count"] = prepared.count
+    return Response(stream_with_context(_iter_json_lines(result, prepared)), mimetype='application/x-ndjson')
+
+
+@blueprint.route('/models', methods=['GET'])
+def models():
+    return jsonify(models=sorted(_named_models()))
+
+
+@blueprint.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(model_cache=model_cache.stats())
+
+
+def run_job(job):
+    """ :param job: dict, see module docstring
+        :return: result dict, see module docstring. doesn't raise for bad jobs; they get error results
+    """
+    if not isinstance(job, dict):
+        return {"error": u"each job must be a JSON object, got {}".format(type(job).__name__)}
+
+    result = {}
+    try:
+        prepared = _prepare(job, result)
+        with serving.acquire_text_maker(prepared.model) as text_maker:
+            sentences = text_maker.make_sentences(prepared.count, rng=prepared.sentence_rng)
+            joiner = prepared.joiner_for(text_maker)
+            result[prepared.output_format] = _format(text_maker, joiner, sentences, prepared.output_format)
+    except serving.RequestError as e:
+        result["error"] = unicode(e)
+    except Exception as e:
+        # (not the client's fault. log it, and go on with the other jobs)
+        logger.exception(u"[flask] error running job {!r}".format(job))
+        result["error"] = u"internal error: {}".format(e)
+    return result
+
+
+class _PreparedJob(collections.namedtuple(
+        '_PreparedJob', 'model count output_format joiner_nickname sentence_rng joiner_rng')):
+    """ a job, checked, with its model found (see _prepare)
+    """
+
+    def joiner_for(self, text_maker):
+        if self.joiner_nickname:
+            return joiners.create_joiner(self.joiner_nickname, rng=self.joiner_rng)
+        return text_maker.joiner
+
+
+def _prepare(job, result, max_count=serving.MAX_COUNT):
+    """ check a job, & find (or train) its model. (notes the id, and which model, in `result`)
+
+    :return: _PreparedJob
+    :raises serving.RequestError: if it's a bad job
+    """
+    if "id" in job:
+        result["id"] = job["id"]
+    count = _count_of(job, max_count)
+    output_format = _choice_of(job, "format", FORMATS, default=DEFAULT_FORMAT)
+    joiner_nickname = _choice_of(job, "joiner", joiners.JOINER_NICKNAMES, default=None)
+    sentence_rng, joiner_rng = _rngs_of(job)
+    model_key, model = _model_of(job, result)
+    return _PreparedJob(model, count, output_format, joiner_nickname, sentence_rng, joiner_rng)
+
+
+def _iter_json_lines(result, job):
+    """ :return: (generator) the lines of a streamed response (see module docstring), each made when it's asked for
+    """
+    yield _json_line(result)
+    try:
+        with serving.acquire_text_maker(job.model) as text_maker:
+            joiner = job.joiner_for(text_maker)
+            if job.output_format == 'text':
+                for piece in text_maker.iter_text(job.count, rng=job.sentence_rng, joiner=joiner,
+                                                  chunk_size=STREAM_CHUNK_SIZE):
+                    yield _json_line({"text": piece})
+            else:
+                for chunk in parallel.iter_sentence_chunks(text_maker, job.count, workers=1, rng=job.sentence_rng,
+                                                           chunk_size=STREAM_CHUNK_SIZE):
+                    yield _json_line({job.output_format: _format(text_maker, joiner, chunk, job.output_format)})
+    except Exception as e:
+        # (too late for a status code: the client gets a last line with the error, instead of {"done": true})
+        logger.exception(u"[flask] error streaming {!r}".format(result))
+        yield _json_line({"error": u"internal error: {}".format(e)})
+        return
+    yield _json_line({"done": True})
+
+
+def _json_line(obj):
+    return json.dumps(obj) + "\n"
+
+
+def _model_of(job, result):
+    """ :return: (name or key, the model) for a job: named, or cached (or trained now, and cached).
+        (notes which in `result`)
+    """
+    if "model" in job:
+        name = job["model"]
+        named_models = _named_models()
+        if name not in named_models:
+            raise serving.RequestError(u"unknown model {!r}; models: {}".format(name, u", ".join(sorted(named_models))))
+        result["model"] = name
+        return name, named_models[name]
+
+    if "model_key" in job:
+        key = job["model_key"]
+        text_maker = model_cache.get(key) if isinstance(key, basestring) else None
+        if text_maker is None:
+            raise serving.RequestError(u"no model cached as {!r} (anymore?). send its input_text again".format(key))
+        result["model_key"] = key
+        return key, text_maker
+
+    if "input_text" in job:
+        if not isinstance(job["input_text"], basestring):
+            raise serving.RequestError(u"input_text must be a string")
+        input_text = clean.CleanInputString(job["input_text"])
+        strategy = _choice_of(job, "strategy", text_makers.TEXT_MAKER_NICKNAMES,
+                              default=text_makers.DEFAULT_TEXT_MAKER_NICKNAME)
+        tokenizer = _choice_of(job, "tokenizer", tokenizers.TOKENIZER_NICKNAMES, default='nltk')
+        ngram_size = job.get("ngram_size", constants.DEFAULT_NGRAM_SIZE)
+        if isinstance(ngram_size, bool) or not isinstance(ngram_size, (int, long)) or not 1 <= ngram_size <= 6:
+            raise serving.RequestError(u"ngram_size must be a whole number from 1 to 6, got {!r}".format(ngram_size))
+
+        key, text_maker = get_or_train(input_text, strategy, tokenizer, ngram_size)
+        result["model_key"] = key
+        return key, text_maker
+
+    raise serving.RequestError(u'which model? give "model", "model_key", or "input_text"')
+
+
+def get_or_train(input_text, strategy, tokenizer, ngram_size, timeout=None):
+    """ :return: (key, TextMaker) trained on input_text with these options: from model_cache, or trained now (once,
+        for all the requests asking for it at the same time; see ModelCache.get_or_create)
+    """
+    key = ModelCache.key_for(input_text, strategy, tokenizer, ngram_size)
+    return key, model_cache.get_or_create(key, lambda: text_makers.create_text_maker(
+            input_text=input_text, strategy=strategy, sentence_tokenizer=tokenizer, ngram_size=ngram_size),
+            timeout=timeout)
+
+
+def _format(text_maker, joiner, sentences, output_format):
+    if output_format == 'words':
+        return [[word for word in sentence if word] for sentence in sentences]
+    if output_format == 'text':
+        return text_maker.proofread(joiner.join(sentences))
+    return [text_maker.proofread(joiner.join([sentence])) for sentence in sentences]
+
+
+def _count_of(job, max_count=serving.MAX_COUNT):
+    count = job.get("count", 1)
+    if isinstance(count, bool) or not isinstance(count, (int, long)) or not 1 <= count <= max_count:
+        raise serving.RequestError(u"count must be a whole number from 1 to {}, got {!r}".format(max_count, count))
+    return count
+
+
+def _choice_of(job, field, choices, default):
+    """ :return: job[field] - one of `choices` (not case sensitive, like the form) - or default if it isn't given
+    """
+    value = job.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, basestring) or value.lower() not in choices:
+        raise serving.RequestError(u"{} must be one of: {}; got {!r}".format(field, u", ".join(sorted(choices)), value))
+    return str(value.lower())
+
+
+def _rngs_of(job):
+    """ :return: (rng for the sentences, rng for the joiner): substreams of the job's seed. (None, None) if no seed
+    """
+    seed = job.get("seed")
+    if seed is None:
+        return None, None
+    if isinstance(seed, bool) or not isinstance(seed, (int, long)):
+        raise serving.RequestError(u"seed must be a whole number, got {!r}".format(seed))
+    return randomness.split_rng(randomness.make_rng(seed), 2)
+
+
+def _named_models():
+    return current_app.config.get('PRESSWORK_MODELS') or {}
+
+
+def _error_response(message, status=400):
+    response = jsonify(error=message)
+    response.status_code = status
+    return response
@@ -1,15 +1,27 @@
 # -*- coding: utf-8 -*-
 """ Little Flask app FOR LOCAL USE ONLY, for rapidly playing around with text generation.
+
+`/` is a form, for people. `/api/...` is a JSON API, for programs: batches of jobs, against trained models (see `api`).
+
+the form and the API share 1 cache of trained models (see api.ModelCache): submitting the same text, with the same
+options, again - or at the same time as someone else - doesn't train on it again.
+
+the form can stream its output: the page is sent as the text is made, a chunk of sentences at a time (see
+TextMaker.iter_text), so the first of it shows up about as soon for 3000 sentences as for 10.
+
+`/ready` says whether the app has warmed up yet - loaded NLTK's data, and its corpora (see `warmup`).
 """
 import logging
 import uuid
 
-from flask import Flask, render_template
+from flask import Flask, Response, jsonify, render_template, stream_with_context
 from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
-from wtforms import validators, StringField, IntegerField, ValidationError, TextAreaField
+from wtforms import validators, BooleanField, StringField, IntegerField, ValidationError, TextAreaField
 
 from presswork import constants
+from presswork.flask_app import api
+from presswork.flask_app import warmup
 from presswork.text import clean
 from presswork.text import text_makers
 from presswork.text.grammar import joiners
@@ -18,6 +30,12 @@ from presswork.text.grammar import tokenizers
 app = Flask(__name__)
 csrf = CSRFProtect(app=app)
 app.config['SECRET_KEY'] = str(uuid.uuid4())
+# models for the API, trained (or loaded) up front: {name: TextMaker, or shared_models.SharedModel}. see `api`
+app.config['PRESSWORK_MODELS'] = {}
+
+# (the API is for programs, not browsers: no forms, so no CSRF tokens)
+csrf.exempt(api.blueprint)
+app.register_blueprint(api.blueprint)
 
 logger = logging.getLogger('presswork')
 
@@ -61,6 +79,9 @@ class MarkovChainTextMakerForm(FlaskForm):
             filters=[lower_or_empty],
             default='nltk')
 
+    stream_output = BooleanField("Stream the output (the first of it shows up sooner, for lots of sentences)",
+                                 default=False)
+
     def validate_text_maker_strategy(form, field):
         if field.data not in text_makers.TEXT_MAKER_NICKNAMES:
             raise ValidationError(
@@ -96,35 +117,75 @@ def markov():
             for field in iter(form)
             }
 
-        text_maker = text_makers.create_text_maker(
-                input_text=data['input_text'],
-                strategy=data['text_maker_strategy'],
-                sentence_tokenizer=data['tokenizer_strategy'],
-                joiner=data['joiner_strategy'],
-                ngram_size=data['ngram_size'],
-        )
-
-        generated_text_title = text_maker.join(text_maker.make_sentences(count=1))
-        generated_text_body = text_maker.join(text_maker.make_sentences(count=data['count_of_sentences_to_make']))
-
-        generated_text_body = text_maker.proofread(generated_text_body)
+        try:
+            model_key, text_maker = api.get_or_train(
+                    input_text=data['input_text'],
+                    strategy=data['text_maker_strategy'],
+                    tokenizer=data['tokenizer_strategy'],
+                    ngram_size=data['ngram_size'],
+            )
+        except api.BuildTimeout as e:
+            form.input_text.errors.append(unicode(e))
+            return render_template('index.html', form=form)
+        # (the model is shared, so the joiner is per request)
+        joiner = joiners.create_joiner(data['joiner_strategy'])
+
+        generated_text_title = joiner.join(text_maker.make_sentences(count=1))
         generated_text_title = text_maker.proofread(generated_text_title)
 
+        if data['stream_output']:
+            # (made as the page is sent - see stream_template)
+            generated_text_pieces = text_maker.iter_text(data['count_of_sentences_to_make'], joiner=joiner)
+        else:
+            generated_text_body = joiner.join(text_maker.make_sentences(count=data['count_of_sentences_to_make']))
+            generated_text_pieces = [text_maker.proofread(generated_text_body)]
+
         for field in iter(form):
             # make the fields 'sticky' by keeping values from last submission
             if not field.name.lower().startswith('csrf'):
                 field.default = field.data
 
-        return render_template(
-                'index.html', form=form, generated_text=generated_text_body, generated_text_title=generated_text_title)
+        render = stream_template if data['stream_output'] else render_template
+        return render('index.html', form=form, generated_text_pieces=generated_text_pieces,
+                      generated_text_title=generated_text_title)
 
     return render_template('index.html', form=form)
 
 
+@app.route("/ready", methods=['GET'])
+def ready():
+    status = warmup.status_of(app)
+    response = jsonify(status)
+    response.status_code = 200 if status["ready"] else 503
+    return response
+
+
+def stream_template(template_name, **context):
+    """ like render_template, but the response is sent as the template renders: context can hold generators, which
+    are only run as the page gets to them. (the WSGI server writes out each piece before asking for the next, so
+    there's only ever a piece held at a time)
+    """
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return Response(stream_with_context(template.generate(context)))
+
+
 if __name__ == "__main__":  # pragma: no cover
     """ development-only server. will run in Flask's wonderful, wonderful debug mode if you set "DEBUG" var beforehand
 
     $ DEBUG=1 python presswork/flask_app/app.py 5000
+
+    models for the API: model files (from `presswork build`) in PRESSWORK_MODELS, and/or shared models (published by
+    `presswork publish`) in PRESSWORK_SHARED_MODELS:
+
+    $ PRESSWORK_MODELS=bills=bills.model,poems=poems.model PRESSWORK_SHARED_MODELS=news \
+    >     python presswork/flask_app/app.py
+
+    it warms up (see `warmup`) before it starts serving. corpora to load then, in PRESSWORK_WARM_UP_CORPORA: files or
+    directories, separated by os.pathsep (':'). PRESSWORK_WARM_UP=background serves right away, and warms up
+    meanwhile (watch /ready); PRESSWORK_WARM_UP=0 skips it.
+
+    $ PRESSWORK_WARM_UP_CORPORA=tests/fixtures/plaintext/newlines:models python presswork/flask_app/app.py
     """
     import datetime
     import os
@@ -132,6 +193,8 @@ if __name__ == "__main__":  # pragma: no cover
 
     from presswork.log import setup_logging
 
+    from presswork.text import shared_models
+
     debug_mode = os.environ.get("DEBUG", None) is not None
 
     setup_logging()
@@ -143,6 +206,20 @@ if __name__ == "__main__":  # pragma: no cover
     except IndexError:
         port = 5000
 
+    for model_spec in filter(None, os.environ.get("PRESSWORK_MODELS", "").split(",")):
+        name, _, filename = model_spec.partition("=")
+        app.config['PRESSWORK_MODELS'][name] = text_makers.load_text_maker(filename)
+    for name in filter(None, os.environ.get("PRESSWORK_SHARED_MODELS", "").split(",")):
+        app.config['PRESSWORK_MODELS'][name] = shared_models.SharedModel(name)
+
+    warm_up_mode = os.environ.get("PRESSWORK_WARM_UP", "")
+    if warm_up_mode != "0":
+        warm_up = warmup.WarmUp(corpora=filter(None, os.environ.get("PRESSWORK_WARM_UP_CORPORA", "").split(os.pathsep)))
+        if warm_up_mode == "background":
+            warm_up.start(app)
+        else:
+            warm_up.run(app)
+
     msg = u'[flask] started on {} at {}'.format(port, datetime.datetime.now())
     logger.info(msg)
     print msg
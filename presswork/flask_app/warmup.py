@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+""" warming the Flask app up, before it takes traffic: so the 1st request isn't the slow one
+
+a fresh app has a lot still to do, the 1st time it's asked for text: unpickling NLTK's Punkt model, compiling the
+Moses detokenizer's regexes, importing what each strategy lazily imports ... and training the model. a WarmUp does
+all that up front:
+    * tokenizers, joiners & strategies: 1 of each is made, and used on a little text (so all the lazy loading is done)
+    * corpora: files, or directories of them (such as tests/fixtures/plaintext/newlines, or a directory of models).
+        each file becomes a model, named for the file (without its extension), served by the API under that name.
+        model files (from `presswork build`) are loaded; text files are trained on, with the form's defaults - and
+        go in the model cache too, so submitting the same text to the form (or the API) doesn't train on it again.
+
+GET /ready says whether it's done: 200 and {"ready": true, ..} once it is, 503 and {"ready": false, ..} until then.
+(an app that isn't warming up at all is ready.) a corpus that can't be loaded doesn't stop the rest; it's logged, and
+listed in "errors". if the warm-up itself breaks, it's logged & listed too, and the app never gets ready: the stage is
+"failed", and /ready stays 503.
+
+    >>> import logging; logging.disable(logging.CRITICAL)
+    >>> from flask import Flask
+    >>> app = Flask(__name__); app.config['PRESSWORK_MODELS'] = {}
+    >>> warm_up = WarmUp(corpora=["no/such/corpus.txt"]).run(app)
+    >>> warm_up.ready, warm_up.status()["errors"]
+    (True, [u'no/such/corpus.txt: no such file or directory'])
+"""
+import io
+import logging
+import os
+import threading
+import time
+
+from presswork import constants
+from presswork.flask_app import api
+from presswork.text import clean
+from presswork.text import text_makers
+from presswork.text.grammar import joiners
+from presswork.text.grammar import tokenizers
+
+logger = logging.getLogger('presswork')
+
+WARM_UP_TEXT = (u"Simple is better than complex. Complex is better than complicated.\n"
+                u"Don't you think so? \"Flat\" is better than nested (mostly).\n")
+
+
+class WarmUp(object):
+    """ loads what the app needs, before it's needed. see module docstring
+
+    run() it before serving; or start() it, to serve (and say "not ready" at /ready) while it runs.
+    """
+
+    def __init__(self, corpora=(), strategy=text_makers.DEFAULT_TEXT_MAKER_NICKNAME, tokenizer='nltk',
+                 ngram_size=constants.DEFAULT_NGRAM_SIZE):
+        """
+        :param corpora: filenames, of model files or text files; or directories of them (not searched recursively)
+        :param strategy: (and tokenizer, ngram_size) to train text files with. default: the same as the form's
+        """
+        self.corpora = list(corpora)
+        self.strategy = strategy
+        self.tokenizer = tokenizer
+        self.ngram_size = ngram_size
+
+        self.stage = "not started"
+        self.models = []
+        self.errors = []
+        self.seconds = None
+        self._done = threading.Event()
+
+    @property
+    def ready(self):
+        return self._done.is_set() and self.stage != "failed"
+
+    def wait(self, timeout=None):
+        """ :return: True once it's done (or has failed) - or False, if it's still going after `timeout` seconds
+        """
+        return self._done.wait(timeout)
+
+    def status(self):
+        """ :return: dict, for /ready: "ready", "stage", "models" (names, of the ones loaded so far), "errors",
+            and "seconds" it took (once it's done)
+        """
+        return {"ready": self.ready, "stage": self.stage, "models": list(self.models), "errors": list(self.errors),
+                "seconds": self.seconds}
+
+    def start(self, app):
+        """ run() on a thread (a daemon: it doesn't keep the process alive). :return: self
+        """
+        app.config['PRESSWORK_WARM_UP'] = self
+        # (so /ready doesn't say "not started" while the thread is getting going)
+        self.stage = "starting"
+        thread = threading.Thread(target=self.run, args=(app,), name="presswork warm-up")
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def run(self, app):
+        """ warm up, right here: returns once it's done. :return: self
+        """
+        app.config['PRESSWORK_WARM_UP'] = self
+        started = time.time()
+        try:
+            self.stage = "tokenizers & joiners"
+            self._warm_up_grammar()
+            self.stage = "corpora"
+            for filename in self._iter_corpus_files():
+                self._load_corpus(app, filename)
+        except Exception as e:
+            logger.exception(u"[flask] warm-up failed, in stage: {}".format(self.stage))
+            self._error(self.stage, e)
+            self.stage = "failed"
+        else:
+            self.stage = "done"
+            logger.info(u"[flask] warmed up in {}s: models {}; {} errors".format(
+                    round(time.time() - started, 3), u", ".join(self.models) or u"(none)", len(self.errors)))
+        finally:
+            self.seconds = round(time.time() - started, 3)
+            self._done.set()
+        return self
+
+    def _warm_up_grammar(self):
+        for nickname in tokenizers.TOKENIZER_NICKNAMES:
+            sentences = tokenizers.create_sentence_tokenizer(nickname).tokenize(clean.CleanInputString(WARM_UP_TEXT))
+            for joiner_nickname in joiners.JOINER_NICKNAMES:
+                joiners.create_joiner(joiner_nickname).join(sentences)
+        for strategy in text_makers.TEXT_MAKER_NICKNAMES:
+            text_maker = text_makers.create_text_maker(strategy=strategy, input_text=WARM_UP_TEXT, ngram_size=1)
+            text_maker.proofread(text_maker.join(text_maker.make_sentences(1)))
+
+    def _iter_corpus_files(self):
+        for path in self.corpora:
+            if os.path.isdir(path):
+                for basename in sorted(os.listdir(path)):
+                    if os.path.isfile(os.path.join(path, basename)) and not basename.startswith("."):
+                        yield os.path.join(path, basename)
+            elif os.path.isfile(path):
+                yield path
+            else:
+                self._error(path, u"no such file or directory")
+
+    def _load_corpus(self, app, filename):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        try:
+            if text_makers.is_model_file(filename):
+                text_maker = text_makers.load_text_maker(filename)
+            else:
+                with io.open(filename, encoding='utf-8') as f:
+                    input_text = clean.CleanInputString(f.read())
+                key, text_maker = api.get_or_train(input_text, self.strategy, self.tokenizer, self.ngram_size)
+        except Exception as e:
+            logger.exception(u"[flask] couldn't warm up with {}".format(filename))
+            self._error(filename, e)
+            return
+        app.config['PRESSWORK_MODELS'][name] = text_maker
+        self.models.append(name)
+
+    def _error(self, path, error):
+        self.errors.append(u"{}: {}".format(path, error))
+
+
+def status_of(app):
+    """ :return: the status of the app's warm-up (see WarmUp.status). an app that isn't warming up is ready
+    """
+    warm_up = app.config.get('PRESSWORK_WARM_UP')
+    return warm_up.status() if warm_up is not None else {"ready": True}
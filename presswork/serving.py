@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+""" long-running generation server: train (or load) named models once, up front, then answer requests for text from them
+
+a CLI invocation pays for Python startup, imports, tokenizer setup, and training, before it makes a single sentence.
+a server pays that once, at startup; after that, a request only costs sampling & joining (& proofreading).
+(see `presswork serve --help`; a benchmark of requests is in tests/text/performance)
+
+the protocol is JSON lines: one JSON object per line in, one per line out, in the same order.
+    * request: {"model": <name>, "count": <sentences>, "id": <anything>}. all optional: "model" can be left out if
+        only one model is loaded, "count" defaults to DEFAULT_COUNT, and "id" (if given) is echoed back.
+    * response: {"model": <name>, "text": <text>, "id": ...}, or {"error": <message>, "id": ...}.
+        a bad request gets an error response; it doesn't stop the server.
+    * {"models": true} asks which models are loaded: {"models": [<name>, ...]}
+
+transports: stdin/stdout (serve_lines), or a Unix socket (serve_unix_socket) - local only, on purpose.
+
+models can also be shared between servers: published to shared memory by 1 process, and served by any number of
+others, without each loading its own copy - and swapped for a retrained one, while serving (see shared_models).
+
+    >>> import logging; logging.disable(logging.CRITICAL)
+    >>> from presswork.text import text_makers
+    >>> server = ModelServer({u"foo": text_makers.create_text_maker(
+    ...         strategy='crude', sentence_tokenizer='just_whitespace', input_text=u"foo bar baz")})
+    >>> print server.handle_line('{"model": "foo", "count": 2, "id": 7}')
+    {"id": 7, "model": "foo", "text": "foo bar baz\\nfoo bar baz"}
+    >>> print server.handle_line('{"model": "bar"}')
+    {"error": "unknown model u'bar'; loaded models: foo"}
+    >>> print server.handle_line('{"models": true}')
+    {"models": ["foo"]}
+"""
+import contextlib
+import json
+import logging
+import os
+import SocketServer
+import stat
+
+from presswork.text import shared_models
+
+logger = logging.getLogger("presswork")
+
+DEFAULT_COUNT = 1
+
+# same upper bound as the Flask app's form; a single request shouldn't be able to tie up the server for long
+MAX_COUNT = 3000
+
+
+class RequestError(ValueError):
+    """ raise if a request can't be answered as given (the message goes back to the client, as the error)
+    """
+
+
+class ModelServer(object):
+    """ answers requests for text from a fixed set of trained (locked) TextMakers, by name
+
+    transport-agnostic: handle() takes & returns dicts, handle_line() takes & returns lines of JSON.
+    """
+
+    def __init__(self, text_makers_by_name):
+        """
+        :param text_makers_by_name: {name: TextMaker}. they must be trained already (so, locked).
+            (or a shared_models.SharedModel, in place of a TextMaker: each request then uses its latest model)
+        """
+        if not text_makers_by_name:
+            raise ValueError("need at least 1 model to serve")
+        untrained = sorted(name for name, text_maker in text_makers_by_name.iteritems()
+                           if not isinstance(text_maker, shared_models.SharedModel) and not text_maker.is_locked)
+        if untrained:
+            raise ValueError("models must be trained before serving them; untrained: {}".format(", ".join(untrained)))
+        self.text_makers_by_name = dict(text_makers_by_name)
+
+    @property
+    def model_names(self):
+        return sorted(self.text_makers_by_name)
+
+    def handle(self, request):
+        """ :param request: dict, see module docstring
+            :return: response dict, see module docstring. doesn't raise for bad requests; they get error responses
+        """
+        if not isinstance(request, dict):
+            return {"error": "request must be a JSON object, got {}".format(type(request).__name__)}
+
+        response = {}
+        if "id" in request:
+            response["id"] = request["id"]
+
+        if request.get("models"):
+            response["models"] = self.model_names
+            return response
+
+        try:
+            name, model = self._text_maker_for(request.get("model"))
+            count = self._count_for(request.get("count", DEFAULT_COUNT))
+            response["model"] = name
+            with acquire_text_maker(model) as text_maker:
+                response["text"] = text_maker.proofread(text_maker.join(text_maker.make_sentences(count)))
+        except RequestError as e:
+            response["error"] = unicode(e)
+        except Exception as e:
+            # (not the client's fault. log it, but keep serving; other requests or models may be fine)
+            logger.exception(u"error answering request {!r}".format(request))
+            response["error"] = u"internal error: {}".format(e)
+        return response
+
+    def handle_line(self, line):
+        """ :param line: one request, as a line of JSON
+            :return: the response, as a line of JSON (without the newline)
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"error": u"request is not valid JSON: {}".format(e)}
+        else:
+            response = self.handle(request)
+        return json.dumps(response, sort_keys=True)
+
+    def serve_lines(self, input_file, output_file):
+        """ answer requests, 1 per line, from input_file, until it ends. blank lines are skipped.
+        each response is flushed right away, so this works over pipes with a client waiting on each response.
+        """
+        for line in iter(input_file.readline, ''):
+            if not line.strip():
+                continue
+            output_file.write(self.handle_line(line) + "\n")
+            output_file.flush()
+
+    def serve_unix_socket(self, path):
+        """ answer requests on a Unix socket at `path`, until interrupted. each connection is served like serve_lines.
+        each connection gets its own thread, so a client that stays connected (even idle) doesn't hold up the others.
+
+        if there's a socket at `path` already (such as left over from a server that crashed), it's replaced.
+        """
+        server = make_unix_socket_server(self, path)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            _remove_socket(path)
+
+    def _text_maker_for(self, name):
+        if name is None:
+            if len(self.text_makers_by_name) > 1:
+                raise RequestError(u"which model? loaded models: {}".format(u", ".join(self.model_names)))
+            return next(self.text_makers_by_name.iteritems())
+        if name not in self.text_makers_by_name:
+            raise RequestError(u"unknown model {!r}; loaded models: {}".format(name, u", ".join(self.model_names)))
+        return name, self.text_makers_by_name[name]
+
+    @staticmethod
+    def _count_for(count):
+        if isinstance(count, bool) or not isinstance(count, (int, long)) or not 1 <= count <= MAX_COUNT:
+            raise RequestError(u"count must be a whole number from 1 to {}, got {!r}".format(MAX_COUNT, count))
+        return count
+
+
+@contextlib.contextmanager
+def acquire_text_maker(model):
+    """ context manager: the TextMaker to use for 1 request, from a TextMaker - or a SharedModel (its latest model)
+    """
+    if isinstance(model, shared_models.SharedModel):
+        with model.text_maker() as text_maker:
+            yield text_maker
+    else:
+        yield model
+
+
+class _JsonLinesHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        self.server.model_server.serve_lines(self.rfile, self.wfile)
+
+
+class _ThreadingUnixStreamServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    # a thread per connection. (fine to share the models: a locked TextMaker is safe to generate from, on any thread)
+    # daemon threads, so connections still open don't keep the process alive once the server stops
+    daemon_threads = True
+
+
+def make_unix_socket_server(model_server, path):
+    """ :return: a SocketServer (not yet serving) that answers requests for `model_server` on a Unix socket at `path`
+    """
+    _remove_socket(path)
+    server = _ThreadingUnixStreamServer(path, _JsonLinesHandler)
+    server.model_server = model_server
+    return server
+
+
+def _remove_socket(path):
+    """ remove a Unix socket at `path`, if there is one. (anything else at `path` is left alone)
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return
+    if stat.S_ISSOCK(mode):
+        os.remove(path)
@@ -25,6 +25,8 @@ from UserString import UserString
 
 from bs4 import UnicodeDammit
 
+from presswork.text import timings
+
 logger = logging.getLogger("presswork")
 
 
@@ -118,8 +120,10 @@ class OutputProofreader(object):
         )
 
     def proofread(self, text):
-        for clean in self.cleaner_functions:
-            text = clean(text)
+        with timings.stage('proofread') as timer:
+            for clean in self.cleaner_functions:
+                text = clean(text)
+            timer.count(chars=len(text))
         return text
 
 
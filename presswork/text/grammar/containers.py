@@ -10,8 +10,21 @@ design notes -- SentencesAsWordLists, WordList
         or plain lists-of-lists. don't type-check strictly, stay compatible with primitives/builtins
     * if helper methods are added to them, they should be just that - HELPERS - i.e. things should work OK
         without them. just 'guardrails' or 'progressive enhancements', if that makes sense.
-"""
 
+-------------------------------------------------------------------------------
+design notes -- CompactSentencesAsWordLists
+===============================================================================
+
+    * same duck-typed list-of-lists interface as SentencesAsWordLists, different storage. for big corpora.
+        * SentencesAsWordLists costs a list (plus, usually, a WordList wrapper) per sentence, plus every token object
+        * CompactSentencesAsWordLists stores 1 array of token ids, 1 array of sentence offsets, and a vocabulary
+            (each distinct token is stored once, no matter how often it occurs)
+    * indexing or iterating gives plain lists of words, built on the fly. so prefer iterating once over
+        indexing the same sentence again and again.
+    * to get one, ask for it where the corpus gets tokenized: create_sentence_tokenizer(compact=True), or
+        create_text_maker(compact_corpus=True). (the CLI does, for the models it trains to serve or publish.)
+"""
+from array import array
 from UserList import UserList
 
 
@@ -52,9 +65,20 @@ class SentencesAsWordLists(UserList):
             if isinstance(self.data[0], basestring) or hasattr(self.data[0], "lower"):
                 raise ValueError("should be list-of-lists-of-strings, appears to be list of strings")
 
-    def unwrap(self):
+    def unwrap(self, copy=True):
         """ return internal list (useful when we need to pass to something that is over-strict about type-checking)
+
+            >>> sentences = SentencesAsWordLists([["plain", "lists"], ["inside"]])
+            >>> assert sentences.unwrap() == sentences.data and sentences.unwrap() is not sentences.data
+            >>> assert sentences.unwrap(copy=False) is sentences.data
+            >>> assert SentencesAsWordLists([WordList(["wrapped"])]).unwrap(copy=False) == [["wrapped"]]
+
+        :param copy: if False, and the internal list is already a plain `list` of plain `list`s, return it as-is,
+            without copying. (for handing a big corpus to something over-strict; caller must not mutate it.)
         """
+        if not copy and type(self.data) is list and all(type(word_list) is list for word_list in self.data):
+            return self.data
+
         try:
             # if self.data is a list of WordList instances, this will work
             return [word_list.unwrap() for word_list in self.data]
@@ -89,3 +113,167 @@ class WordList(UserList):
         """ return internal list (useful when we need to pass to something that is over-strict about type-checking)
         """
         return self.data
+
+
+class _Vocabulary(object):
+    """ maps token <=> token id. append-only, so it is safe to share between containers (i.e. slices)
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.ids_by_token = {}
+
+    def id_for(self, token):
+        try:
+            return self.ids_by_token[token]
+        except KeyError:
+            token_id = len(self.tokens)
+            self.tokens.append(token)
+            self.ids_by_token[token] = token_id
+            return token_id
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class CompactSentencesAsWordLists(object):
+    """ quacks like SentencesAsWordLists, but stored flat: 1 token-id array + 1 sentence-offsets array + vocabulary
+
+        >>> import pytest
+        >>> with pytest.raises(ValueError): CompactSentencesAsWordLists('wrong_data_structure ... a string')
+        >>> with pytest.raises(ValueError): CompactSentencesAsWordLists(['wrong_data_structure', 'flat', 'list'])
+        >>> with pytest.raises(ValueError): CompactSentencesAsWordLists([[["too"], ["nested"]]])
+        >>> list_of_lists_of_strings = [["ok", "here", "are"], ["lists", "of", "words"], [], ["ok"]]
+        >>> compact = CompactSentencesAsWordLists(list_of_lists_of_strings)
+        >>> assert compact == list_of_lists_of_strings
+        >>> assert compact == SentencesAsWordLists(list_of_lists_of_strings)
+        >>> print repr(compact)
+        CompactSentencesAsWordLists([['ok', 'here', 'are'], ['lists', 'of', 'words'], [], ['ok']])
+        >>> print repr(compact.unwrap())
+        [['ok', 'here', 'are'], ['lists', 'of', 'words'], [], ['ok']]
+        >>> len(compact), compact[1], compact[-1]
+        (4, ['lists', 'of', 'words'], ['ok'])
+        >>> compact[1:3]
+        CompactSentencesAsWordLists([['lists', 'of', 'words'], []])
+        >>> [len(sentence) for sentence in compact]
+        [3, 3, 0, 1]
+        >>> list(compact.token_ids), list(compact.sentence_offsets), len(compact.vocabulary)
+        ([0, 1, 2, 3, 4, 5, 0], [0, 3, 6, 6, 7], 6)
+        >>> C = CompactSentencesAsWordLists
+        >>> assert C.ensure(compact) is compact
+        >>> assert C.ensure(C.ensure(C.ensure(list_of_lists_of_strings))) == list_of_lists_of_strings
+        >>> assert not CompactSentencesAsWordLists([])
+    """
+
+    # 'i' (4 bytes) is plenty for token ids; offsets index into the (possibly huge) token id array, so 'l'
+    TOKEN_ID_TYPECODE = 'i'
+    OFFSET_TYPECODE = 'l'
+
+    def __init__(self, seq=(), _vocabulary=None):
+        """
+        :param seq: list of lists of strings, or anything that quacks like it (a generator of word-lists is fine,
+            it is consumed once, so the word-lists need not all be in memory at the same time.)
+        """
+        self._vocabulary = _vocabulary if _vocabulary is not None else _Vocabulary()
+        self._token_ids = array(self.TOKEN_ID_TYPECODE)
+        self._offsets = array(self.OFFSET_TYPECODE, [0])
+
+        if isinstance(seq, basestring) or hasattr(seq, "lower"):
+            raise ValueError("should be list-of-lists-of-strings, appears to be a string")
+
+        for word_list in seq:
+            self.append(word_list)
+
+    @classmethod
+    def ensure(cls, seq):
+        """ if it's already CompactSentencesAsWordLists, just return it. if not, convert it (which sanity checks it)
+        """
+        if isinstance(seq, cls):
+            return seq
+        else:
+            return cls(seq)
+
+    def append(self, word_list):
+        if isinstance(word_list, basestring) or hasattr(word_list, "lower"):
+            raise ValueError("should be list-of-lists-of-strings, appears to be list of strings")
+
+        id_for = self._vocabulary.id_for
+        for word in word_list:
+            if (not isinstance(word, basestring)) and (not hasattr(word, "lower")):
+                raise ValueError("should be list-of-lists-of-strings, appears to be nested deeper")
+            self._token_ids.append(id_for(word))
+
+        self._offsets.append(len(self._token_ids))
+
+    def extend(self, seq):
+        for word_list in seq:
+            self.append(word_list)
+
+    def sanity_check(self):
+        """ (checks happen as sentences are appended; kept so this quacks like SentencesAsWordLists)
+        """
+
+    def unwrap(self, copy=True):
+        """ return a plain list of lists (useful when we need to pass to something over-strict about type-checking)
+
+        :param copy: accepted so this quacks like SentencesAsWordLists; the lists are always built fresh here.
+        """
+        return list(self)
+
+    @property
+    def token_ids(self):
+        return self._token_ids
+
+    @property
+    def sentence_offsets(self):
+        return self._offsets
+
+    @property
+    def vocabulary(self):
+        """ list of distinct tokens; index in this list is the token id
+        """
+        return self._vocabulary.tokens
+
+    def _sentence(self, i):
+        tokens = self._vocabulary.tokens
+        return [tokens[token_id] for token_id in self._token_ids[self._offsets[i]:self._offsets[i + 1]]]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for i in xrange(0, len(self)):
+            yield self._sentence(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.__class__((self._sentence(i) for i in xrange(start, stop, step)), self._vocabulary)
+
+            sliced = self.__class__(_vocabulary=self._vocabulary)
+            if stop > start:
+                first_offset = self._offsets[start]
+                sliced._token_ids = self._token_ids[first_offset:self._offsets[stop]]
+                sliced._offsets = array(self.OFFSET_TYPECODE,
+                                        (offset - first_offset for offset in self._offsets[start:stop + 1]))
+            return sliced
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sentence index out of range")
+        return self._sentence(index)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactSentencesAsWordLists, UserList)):
+            other = other.unwrap()
+        return self.unwrap() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return u"CompactSentencesAsWordLists({!r})".format(self.unwrap())
@@ -9,10 +9,10 @@ design notes -- Joiners
         * fair game: random or probabilistic whitespace variations (indentation, enjambment)
 
 """
-import random
-
 from nltk.tokenize.moses import MosesDetokenizer
 
+from presswork.text import randomness
+from presswork.text import timings
 from presswork.text.grammar.containers import SentencesAsWordLists
 
 
@@ -25,20 +25,32 @@ class Joiner(object):
     How   are   U/~   Not   bad
     """
 
-    def __init__(self, separate_sentences="\n", separate_words=" "):
+    def __init__(self, separate_sentences="\n", separate_words=" ", rng=None):
         """
         :param separate_sentences: (if not empty) put this between sentences (specifically, before each sentence)
         :param separate_words: (if not empty) put this between words (specifically, after each word)
+        :param rng: (optional) seed or random.Random, for joiners that join randomly. see `randomness`
 
         The input tokenized text might have its own sentence punctuation, so it depends on your text,
         whether you want separate_sentences="", separate_sentences=". ", separate_sentences="<newline>". Experiment!
         """
         self._sentence_separator = separate_sentences
         self._word_separator = separate_words
+        self.rng = rng
 
         # explicitly declaring stateless by default. however, subclasses are free to be stateful
         self._state = None
 
+    @property
+    def rng(self):
+        """ the rng to draw from, in this thread. (see `randomness.ThreadRngs`)
+        """
+        return self._thread_rngs.get()
+
+    @rng.setter
+    def rng(self, rng):
+        self._thread_rngs = randomness.ThreadRngs(randomness.make_rng(rng))
+
     def join(self, sentences_as_word_lists):
         """ just wraps ._join_sentences(), adding a sanity check beforehand.
 
@@ -51,9 +63,12 @@ class Joiner(object):
             >>> assert joiner.join([[]]) == ""
             >>> assert joiner.join([[""]]) == ""
         """
-        if sentences_as_word_lists:
-            sentences_as_word_lists = SentencesAsWordLists.ensure(sentences_as_word_lists)
-        return self._join_sentences(sentences_as_word_lists)
+        with timings.stage('join') as timer:
+            if sentences_as_word_lists:
+                sentences_as_word_lists = SentencesAsWordLists.ensure(sentences_as_word_lists)
+            result = self._join_sentences(sentences_as_word_lists)
+            timer.count(items=len(sentences_as_word_lists or ()), chars=len(result))
+        return result
 
     def _join_sentences(self, sentences):
         """  takes SentencesAsWordLists and "re-joins" or "de-tokenizes" into a string.
@@ -116,9 +131,9 @@ class JoinerWhitespace(Joiner):
         quux
     """
 
-    def __init__(self, separate_sentences="\n", separate_words=" "):
+    def __init__(self, separate_sentences="\n", separate_words=" ", rng=None):
         super(JoinerWhitespace, self).__init__(
-                separate_sentences=separate_sentences, separate_words=separate_words)
+                separate_sentences=separate_sentences, separate_words=separate_words, rng=rng)
 
 
 class JoinerNLTK(Joiner):
@@ -148,28 +163,45 @@ class JoinerNLTK(Joiner):
 
     def __init__(self,
                  separate_sentences=" ",  # moses can be suitable for prose if we don't insert newlines
-                 separate_words=" "):
+                 separate_words=" ",
+                 rng=None):
         super(JoinerNLTK, self).__init__(
-                separate_sentences=separate_sentences, separate_words=separate_words)
+                separate_sentences=separate_sentences, separate_words=separate_words, rng=rng)
 
         self.detokenizer = MosesDetokenizer(lang="en")
 
     def _join_word_seq(self, word_list):
-        # passing to moses detokenizer is simple ...
-        sentence_string = self.detokenizer.detokenize(word_list, return_str=True)
+        """ detokenize with Moses, then put the word separator (or the between_words() hook) between the results.
+
+        MosesDetokenizer assumes separate_words=" ". That's OK in some cases, but we want other separators to be
+        allowed, AND we want the between_words() hook to be respected. So we take Moses's output as a list of
+        'spaced units' (return_str=False), then join those. When between_words() is not overridden, that's a plain
+        str.join(); otherwise it goes through the base class, calling the hook once per gap, as always.
+        (Moses itself joins the words, and splits its result, inside NLTK; that part is as it was.)
+
+            >>> print JoinerNLTK()._join_word_seq(['Fine', ',', 'you', '?'])
+            Fine, you?
+            >>> print JoinerNLTK(separate_words="_")._join_word_seq(['Fine', ',', 'you', '?'])
+            Fine,_you?
+        """
+        units = self.detokenizer.detokenize(word_list, return_str=False)
+
+        if self._between_words_is_constant():
+            return (self._word_separator or u"").join(units) if units else u""
 
-        # ... but in our terms, MosesDetokenizer assumes separate_words=" ". That's OK in some case,
-        # but we want it so other separators can be passed in; AND so that the between_words() hook is still respected.
-        # ... but to also respect custom word separator hook, we re-split & send to self._join_word_list
-        sentence_string = super(JoinerNLTK, self)._join_word_seq(word_list=sentence_string.split())
+        return super(JoinerNLTK, self)._join_word_seq(word_list=units)
 
-        return sentence_string
+    def _between_words_is_constant(self):
+        """ True if between_words() is the base class default (constant separator), so it need not be called per gap
+        """
+        return getattr(self.between_words, '__func__', None) is Joiner.between_words.__func__
 
 
 class JoinerNLTKWithRandomIndent(JoinerNLTK):
     """ want crude pseudopoetry? just add pseudorandom indentation! Default is (0-8)*2spaces.
 
-        >>> joiner = JoinerNLTKWithRandomIndent(_random=random.Random(456))
+        >>> import random
+        >>> joiner = JoinerNLTKWithRandomIndent(rng=random.Random(456))
         >>> print joiner.join([["Expect", "some", "intense"], ["Indents."]] * 3)
         Expect some intense
                     Indents.
@@ -187,23 +219,31 @@ class JoinerNLTKWithRandomIndent(JoinerNLTK):
         >>> assert joiner.join([[""]]) == ""
     """
 
-    def __init__(self, separate_sentences="\n", separate_words=" ", _random=None):
+    def __init__(self, separate_sentences="\n", separate_words=" ", rng=None, _random=None):
         """
-        :param _random: can pass in random.Random(...) (i.e. random with seed)
+        :param rng: seed, or random.Random(...), for the indents. (if not given, seeded from the OS)
+        :param _random: older name for `rng`
         """
         super(JoinerNLTKWithRandomIndent, self).__init__(
-                separate_sentences=separate_sentences, separate_words=separate_words)
-        if _random:
-            self.random = _random
-        else:
-            self.random = random.Random()
+                separate_sentences=separate_sentences, separate_words=separate_words,
+                rng=rng if rng is not None else _random)
 
         self.indent_unit = (separate_words or u"") * 2
 
+    @property
+    def random(self):
+        """ older name for `rng`
+        """
+        return self.rng
+
+    @random.setter
+    def random(self, rng):
+        self.rng = rng
+
     def _random_indent(self):
         """ newline + 0-8 * (2 spaces). i.e. default: {0, 2 ... 16} spaces
         """
-        separator = (self.indent_unit) * self.random.randint(0, 8)
+        separator = (self.indent_unit) * self.rng.randint(0, 8)
         return separator
 
     def between_sentences(self):
@@ -213,7 +253,8 @@ class JoinerNLTKWithRandomIndent(JoinerNLTK):
 class JoinerNLTKWithRandomEnjambment(JoinerNLTKWithRandomIndent):
     """ want funkier pseudopoetry? don't just indent, enjamb! in addition to indenting, breaks sentences
 
-        >>> joiner = JoinerNLTKWithRandomEnjambment(_random=random.Random(52))
+        >>> import random
+        >>> joiner = JoinerNLTKWithRandomEnjambment(rng=random.Random(52))
         >>> # note, the <BLANKLINE> below is a doctest thing, in real output it would be real blank line
         >>> print joiner.join([["Expect", "some", "intense"], ["Indents", "and", "enjamb-", "ments"]])
         Expect some
@@ -222,12 +263,12 @@ class JoinerNLTKWithRandomEnjambment(JoinerNLTKWithRandomIndent):
                         Indents and enjamb-
         <BLANKLINE>
               ments
-        >>> joiner = JoinerNLTKWithRandomEnjambment(_random=random.Random(3))
+        >>> joiner = JoinerNLTKWithRandomEnjambment(rng=3)
         >>> print joiner.join([["Random", "runs"], ["How", "fun,", "how", "fun", "&", "done"]])
         Random runs
                 How fun, how fun
                       & done
-        >>> joiner = JoinerNLTKWithRandomEnjambment(_random=random.Random(5))
+        >>> joiner = JoinerNLTKWithRandomEnjambment(rng=5)
         >>> print joiner.join([["We", "should", ","], ["still", ",", "not", "have", "space", "around", "punct", "."]])
         We should,
                     still, not have space around
@@ -236,9 +277,9 @@ class JoinerNLTKWithRandomEnjambment(JoinerNLTKWithRandomIndent):
         >>> assert joiner.join([[""]]) == ""
     """
 
-    def __init__(self, separate_sentences="\n", separate_words=" ", _random=None):
+    def __init__(self, separate_sentences="\n", separate_words=" ", rng=None, _random=None):
         super(JoinerNLTKWithRandomEnjambment, self).__init__(
-                separate_sentences=separate_sentences, separate_words=separate_words, _random=_random)
+                separate_sentences=separate_sentences, separate_words=separate_words, rng=rng, _random=_random)
 
         self.enjambment_chance = 0.2
         self.enjambment_extra_line_break_choices = [1, 1, 2]
@@ -248,8 +289,8 @@ class JoinerNLTKWithRandomEnjambment(JoinerNLTKWithRandomIndent):
         :return:
         """
         extra_whitespace = u""
-        if self.random.random() < self.enjambment_chance:
-            maybe_newline = self._sentence_separator * self.random.choice(self.enjambment_extra_line_break_choices)
+        if self.rng.random() < self.enjambment_chance:
+            maybe_newline = self._sentence_separator * self.rng.choice(self.enjambment_extra_line_break_choices)
             extra_whitespace = maybe_newline + self._random_indent().lstrip(self._sentence_separator)
 
         if extra_whitespace:
@@ -271,5 +312,17 @@ joiner_classes_by_nickname = {
 JOINER_NICKNAMES = joiner_classes_by_nickname.keys()
 
 
-def create_joiner(nickname):
-    return joiner_classes_by_nickname[nickname]()
+def create_joiner(nickname, rng=None):
+    return joiner_classes_by_nickname[nickname](rng=rng)
+
+
+def nickname_of(joiner):
+    """ :return: the nickname to create_joiner() another one of the same kind as `joiner` with (None if it's not ours)
+
+        >>> nickname_of(create_joiner("random_enjamb")), nickname_of(object())
+        ('random_enjamb', None)
+    """
+    for nickname, joiner_class in joiner_classes_by_nickname.iteritems():
+        if joiner.__class__ is joiner_class:
+            return nickname
+    return None
@@ -22,7 +22,8 @@ import nltk
 from nltk.tokenize.casual import TweetTokenizer
 
 from presswork.text import clean
-from presswork.text.grammar.containers import SentencesAsWordLists, WordList
+from presswork.text import timings
+from presswork.text.grammar.containers import CompactSentencesAsWordLists, SentencesAsWordLists, WordList
 
 logger = logging.getLogger('presswork')
 
@@ -47,7 +48,17 @@ class BaseWordTokenizer(object):
 
 class BaseSentenceTokenizer(object):
     """ base class for sentence tokenizer(text); biased towards SentencesAsWordLists.
+
+    `container_class` decides what tokenize() returns; anything that can be constructed from an iterable of
+    word-lists is OK. For big corpora, CompactSentencesAsWordLists takes a fraction of the memory. (it's also what
+    create_sentence_tokenizer(compact=True) and create_text_maker(compact_corpus=True) set up.)
+
+        >>> sentence_tokenizer = SentenceTokenizerWhitespace()
+        >>> sentence_tokenizer.container_class = CompactSentencesAsWordLists
+        >>> sentence_tokenizer.tokenize(u"compact is better" + chr(10) + u"than sparse")
+        CompactSentencesAsWordLists([[u'compact', u'is', u'better'], [u'than', u'sparse']])
     """
+    container_class = SentencesAsWordLists
 
     def __init__(self, word_tokenizer):
         self._word_tokenizer = None
@@ -56,10 +67,35 @@ class BaseSentenceTokenizer(object):
 
     def tokenize(self, text):
         """ take string/unicode, tokenize into list-of-lists: [ [word, word, ...], [word, word, ...], ... ]
+
+        each WordList is unwrapped as soon as the word tokenizer has sanity-checked it, so the container ends up
+        holding plain lists. (saves a wrapper per sentence, and lets strict consumers like markovify take it as-is.)
+
+            >>> sentences = SentenceTokenizerWhitespace().tokenize(u"plain lists" + chr(10) + u"all the way down")
+            >>> [type(word_list) for word_list in sentences.data]
+            [<type 'list'>, <type 'list'>]
+
         :rtype: presswork.text.grammar.containers.SentencesAsWordLists
         """
-        sentences = [self.word_tokenizer.tokenize(sentence) for sentence in self._tokenize_to_sentence_strings(text)]
-        return SentencesAsWordLists(sentences)
+        if timings.is_enabled():
+            return self._tokenize_timed(text)
+        word_tokenize = self.word_tokenizer.tokenize
+        return self.container_class(
+                _unwrap_word_list(word_tokenize(sentence)) for sentence in self._tokenize_to_sentence_strings(text))
+
+    def _tokenize_timed(self, text):
+        """ same as tokenize(), but in 2 passes, so the sentence & word tokenizers can be timed separately
+        """
+        with timings.stage('split_sentences') as timer:
+            sentence_strings = list(self._tokenize_to_sentence_strings(text))
+            timer.count(items=len(sentence_strings), chars=len(text))
+
+        with timings.stage('tokenize_words') as timer:
+            word_tokenize = self.word_tokenizer.tokenize
+            sentences = self.container_class(
+                    _unwrap_word_list(word_tokenize(sentence)) for sentence in sentence_strings)
+            timer.count(items=sum(len(word_list) for word_list in sentences))
+        return sentences
 
     def _tokenize_to_sentence_strings(self, text):
         """ take string/unicode, tokenize into sentence-strings, return list of strings where each is a 'sentence'
@@ -198,6 +234,11 @@ class SentenceTokenizerNLTK(BaseSentenceTokenizer):
         return self.strategy.tokenize(text)
 
 
+def _unwrap_word_list(word_list):
+    unwrap = getattr(word_list, "unwrap", None)
+    return unwrap() if unwrap is not None else word_list
+
+
 # ===============================================================
 
 tokenizer_classes_by_nickname = {
@@ -209,5 +250,13 @@ tokenizer_classes_by_nickname = {
 TOKENIZER_NICKNAMES = tokenizer_classes_by_nickname.keys()
 
 
-def create_sentence_tokenizer(nickname):
-    return tokenizer_classes_by_nickname[nickname]()
+def create_sentence_tokenizer(nickname, compact=False):
+    """ :param compact: tokenize to CompactSentencesAsWordLists (a fraction of the memory), not SentencesAsWordLists
+
+        >>> create_sentence_tokenizer("just_whitespace", compact=True).tokenize(u"compact is better")
+        CompactSentencesAsWordLists([[u'compact', u'is', u'better']])
+    """
+    sentence_tokenizer = tokenizer_classes_by_nickname[nickname]()
+    if compact:
+        sentence_tokenizer.container_class = CompactSentencesAsWordLists
+    return sentence_tokenizer
@@ -23,17 +23,238 @@ Why it's kept around:
     * this whole repository is just for fun, this file included :)
 
 """
+import collections
 import logging
-import pprint
 import random
+from array import array
 
 from presswork import constants
+from presswork.text.markov import tracing
+from presswork.text.markov.flat import FlatChain
 
 logger = logging.getLogger("presswork")
 
 # By using empty string as start-of-sentence-marker, we can avoid special handling for this token later.
 START_SYMBOL = u""
 END_SYMBOL = u""
+# (so it's the only word that's false. test words with `not word`, not `word == END_SYMBOL`: tokens can be byte strings,
+# and comparing non-ASCII bytes with unicode warns - UnicodeWarning - on every comparison)
+
+
+class CrudeMarkovModel(dict):
+    """ the model: a dict of { n-gram : [ possibility, possibility ...], ... }, plus what generation needs up front
+
+    ngram_size and start_state are set once, when the model is built; state_count and is_empty are O(1).
+    (generation used to infer all of this from `model.keys()` - which copies every key, every make_sentences() call.)
+
+    after building, analyze() works out which states can still reach the end of a sentence, and how soon.
+    generation uses that to steer clear of dead ends, and to finish sentences within max_loops_per_sentence:
+        * steps_to_end: {state: fewest words to generate from there, up to & including END_SYMBOL}.
+            states that can't reach END_SYMBOL at all ("doomed") are left out.
+        * viable_followers: {state: the followers which don't lead to a doomed state}. only for states where that
+            isn't *all* of them, which in a freshly built model is none; see doomed_states
+
+        >>> model = crude_markov_chain([["A", "tokenized", "sentence."]], ngram_size=2)
+        >>> model.ngram_size, model.start_state, model.state_count, model.is_empty
+        (2, (u'', u''), 4, False)
+        >>> model[model.start_state]
+        ['A']
+        >>> crude_markov_chain([[]], ngram_size=3).is_empty
+        True
+    """
+
+    def __init__(self, transitions=(), ngram_size=constants.DEFAULT_NGRAM_SIZE):
+        super(CrudeMarkovModel, self).__init__(transitions)
+        self.ngram_size = ngram_size
+        self.start_state = ngram_for_sentence_start(ngram_size)
+        self.steps_to_end = {}
+        self.viable_followers = {}
+        self._analyzed_state_count = 0
+        if self:
+            self.analyze()
+
+    @classmethod
+    def from_dict(cls, model, ngram_size=None):
+        """ wrap a plain dict model, such as one built by an older version or loaded from elsewhere. (copies it)
+
+            >>> CrudeMarkovModel.from_dict({(u'', u''): [u'hi'], (u'', u'hi'): [u'']}).ngram_size
+            2
+        """
+        if ngram_size is None:
+            ngram_size = _ngram_size_of(model)
+        return cls(model, ngram_size=ngram_size)
+
+    def analyze(self):
+        """ (re)compute steps_to_end and viable_followers. call again after changing the model. O(transitions)
+
+            >>> model = CrudeMarkovModel({(u'',): [u'go', u'loop'], (u'go',): [u''], (u'loop',): [u'loop']}, 1)
+            >>> sorted(model.steps_to_end.items())
+            [((u'',), 2), ((u'go',), 1)]
+            >>> model.viable_followers, model.doomed_states
+            ({(u'',): [u'go']}, [(u'loop',)])
+        """
+        steps_to_end = {}
+        predecessors = collections.defaultdict(list)
+        for state, followers in self.iteritems():
+            for word in set(followers):
+                if not word:
+                    steps_to_end[state] = 1
+                else:
+                    next_state = state[1:] + (word,)
+                    if next_state in self:
+                        predecessors[next_state].append(state)
+
+        # breadth-first, backwards from the end of sentence: so the 1st time we get to a state is the shortest way
+        frontier = list(steps_to_end)
+        while frontier:
+            next_frontier = []
+            for state in frontier:
+                steps = steps_to_end[state] + 1
+                for predecessor in predecessors.get(state, ()):
+                    if predecessor not in steps_to_end:
+                        steps_to_end[predecessor] = steps
+                        next_frontier.append(predecessor)
+            frontier = next_frontier
+
+        viable_followers = {}
+        for state, followers in self.iteritems():
+            if state not in steps_to_end:
+                continue  # (doomed anyway; generation won't come here, unless it must start here)
+            viable = [word for word in followers if not word or (state[1:] + (word,)) in steps_to_end]
+            if len(viable) != len(followers):
+                viable_followers[state] = viable
+
+        self.steps_to_end = steps_to_end
+        self.viable_followers = viable_followers
+        self._analyzed_state_count = len(self)
+
+    def freeze(self):
+        """ make the followers (and viable_followers) tuples, instead of lists: for a model that's done changing.
+
+        a tuple of strings is something Python's cyclic GC can stop tracking, after 1 collection; a list, it walks
+        every time. (in a forked process, every object the GC walks gets written to, which un-shares its memory page.
+        see text_makers.prepare_for_fork.) tuples are a bit smaller, too. after this, don't change the model in place.
+
+            >>> model = crude_markov_chain([["A", "tokenized", "sentence."]], ngram_size=2)
+            >>> model.freeze()
+            >>> model[model.start_state]
+            ('A',)
+        """
+        for state, followers in self.iteritems():
+            self[state] = tuple(followers)
+        self.viable_followers = {state: tuple(viable) for state, viable in self.viable_followers.iteritems()}
+
+    def transition_counts(self):
+        """ :return: the model as {state: {follower: times seen}}. (see `pruning`)
+
+            >>> dict(crude_markov_chain([["a"], ["a"]], ngram_size=1).transition_counts()[(u'',)])
+            {'a': 2}
+        """
+        return {state: collections.Counter(followers) for state, followers in self.iteritems()}
+
+    @classmethod
+    def from_transition_counts(cls, transitions, ngram_size):
+        """ build (and analyze) a model from {state: {follower: times seen}}, as from transition_counts()
+        """
+        return cls(((state, [follower for follower, count in counts.iteritems() for _ in xrange(count)])
+                    for state, counts in transitions.iteritems()), ngram_size=ngram_size)
+
+    @property
+    def doomed_states(self):
+        """ states from which the end of a sentence can't be reached. O(states)
+        """
+        return [state for state in self if state not in self.steps_to_end]
+
+    @property
+    def state_count(self):
+        return len(self)
+
+    @property
+    def is_empty(self):
+        return is_empty_model(self)
+
+    def __repr__(self):
+        return "{}(<{} states>, ngram_size={!r})".format(self.__class__.__name__, self.state_count, self.ngram_size)
+
+
+class FlatCrudeMarkovModel(object):
+    """ a CrudeMarkovModel packed into flat arrays (see markov.flat), to generate from. read-only.
+    it's all numbers & bytes, so it can be shared between processes (see presswork.text.shared_models).
+    generates just what the model it's made from would.
+
+        >>> model = crude_markov_chain([["A", "tokenized", "sentence."]], ngram_size=2)
+        >>> flat_model = FlatCrudeMarkovModel.from_model(model)
+        >>> flat_model.state_count, flat_model.start_state
+        (4, (u'', u''))
+        >>> list(iter_make_sentences(flat_model, count=1)) == list(iter_make_sentences(model, count=1))
+        True
+
+    the parts, all in the order of the states in `followers` (see FlatChain.state_number):
+        * followers: a FlatChain of each state's followers (repeats & all, like the lists in a CrudeMarkovModel)
+        * viable_starts, viable_ids: a state's viable followers (ids) are viable_ids[viable_starts[i]:
+            viable_starts[i + 1]]. (empty for states that don't have any set apart, so all followers are viable)
+        * steps_to_end: as in CrudeMarkovModel; 0 for doomed states
+    """
+    ARRAY_NAMES = ('viable_starts', 'viable_ids', 'steps_to_end')
+
+    def __init__(self, followers, viable_starts, viable_ids, steps_to_end, ngram_size):
+        self.followers = followers
+        self.viable_starts = viable_starts
+        self.viable_ids = viable_ids
+        self.steps_to_end = steps_to_end
+        self.ngram_size = ngram_size
+        self.start_state = ngram_for_sentence_start(ngram_size)
+
+    @classmethod
+    def from_model(cls, model):
+        """ :param model: a CrudeMarkovModel
+        """
+        if model._analyzed_state_count != len(model):
+            model.analyze()
+        followers = FlatChain(model)
+        viable_starts = array(FlatChain.OFFSET_TYPECODE, [0])
+        viable_ids = array(FlatChain.WORD_ID_TYPECODE)
+        steps_to_end = array('i')
+        for order, state, key in followers.iter_states():
+            words = followers.state_words(order, key)
+            viable_ids.extend(followers.word_id(word) for word in model.viable_followers.get(words, ()))
+            viable_starts.append(len(viable_ids))
+            steps_to_end.append(model.steps_to_end.get(words, 0))
+        return cls(followers, viable_starts, viable_ids, steps_to_end, model.ngram_size)
+
+    def arrays(self):
+        """ :return: {name: array} of the parts that aren't the `followers` FlatChain
+        """
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    def transition_counts(self):
+        """ :return: the model as {state: {follower: times seen}}, like CrudeMarkovModel.transition_counts()
+        """
+        return self.followers.transitions()
+
+    def itervalues(self):
+        """ :return: (generator) each state's followers, as a list (like a CrudeMarkovModel's values)
+        """
+        flat = self.followers
+        for order, state, key in flat.iter_states():
+            yield [flat.word(word_id) for word_id, weight in flat.followers(order, state)]
+
+    def freeze(self):
+        pass  # (already is)
+
+    @property
+    def state_count(self):
+        return len(self.followers)
+
+    @property
+    def is_empty(self):
+        return is_empty_model(self)
+
+    def __len__(self):
+        return len(self.followers)
+
+    def __repr__(self):
+        return "{}(<{} states>, ngram_size={!r})".format(self.__class__.__name__, self.state_count, self.ngram_size)
 
 
 def crude_markov_chain(sentences_as_word_lists, ngram_size=constants.DEFAULT_NGRAM_SIZE, ):
@@ -43,10 +264,10 @@ def crude_markov_chain(sentences_as_word_lists, ngram_size=constants.DEFAULT_NGR
         like [ [word, word, ...], [word, word, ...], ... ]
     :param ngram_size: the N in N-gram, AKA state size or window size. same as in general markov chains.
         2 or 3 are commonly used for text generation. higher than that can
-    :return: a dict: { n-gram : [ possibility, possibility ...], ... }. Feed this to iter_make_sentences
-        can be serialized to JSON, if you want to save a model for re-use.
+    :return: a CrudeMarkovModel, i.e. a dict: { n-gram : [ possibility, possibility ...], ... }.
+        Feed this to iter_make_sentences
     """
-    model = {}
+    model = CrudeMarkovModel(ngram_size=ngram_size)
 
     if not sentences_as_word_lists:
         return model
@@ -69,84 +290,163 @@ def crude_markov_chain(sentences_as_word_lists, ngram_size=constants.DEFAULT_NGR
                 # Re: memory usage -- see note in module docstring. (left unoptimized)
                 model[ngram].append(next_word)
 
-    if logger.level == logging.DEBUG:
-        try:
-            logger.debug(u'model=\n{}'.format(pprint.pformat(model, width=2)))
-        except:
-            logger.exception(u'hit exception while attempting to dump the model to debug-log. swallowing')
+    model.analyze()
+
+    trace = tracing.get_tracer('crude')
+    if trace:
+        trace('model_built', ngram_size=ngram_size, states=len(model), model=model)
 
     return model
 
 
 def iter_make_sentences(
-        crude_markov_model, ngram_size=constants.DEFAULT_NGRAM_SIZE, count=100, max_loops_per_sentence=25):
+        crude_markov_model, ngram_size=constants.DEFAULT_NGRAM_SIZE, count=100, max_loops_per_sentence=25, rng=None):
     """ The fun part! Generate probable sentences based on a model. Bare-essentials/crude implementation.
 
-    :param crude_markov_model: a model i.e. from crude_markov_chain() function
+    each sentence ends when END_SYMBOL is drawn (it is included, as the last word). sentences get at most
+    max_loops_per_sentence + 1 words; using the model's analysis (see CrudeMarkovModel), generation only takes
+    paths that can end a sentence, and when running out of words, only those that can end it in time. so
+    sentences only get cut off when there's no way to finish them within the limit.
+
+    :param crude_markov_model: a model i.e. from crude_markov_chain() function. (a plain dict works too, but
+        it will get copied to a CrudeMarkovModel, every call. so does a FlatCrudeMarkovModel, without copying)
     :param ngram_size: N in N-gram, AKA state size or window size. same as elsewhere. must match ngram size of model.
+    :param rng: (optional) random.Random to draw from. (if not given, the global `random`)
     :return: (generator) yields lists-of-words.
     """
+    # (tracing is looked up once, here; in the loop, it's just a check of a local, so it's ~free when turned off)
+    trace = tracing.get_tracer('crude')
+
     if is_empty_model(crude_markov_model):
-        logger.debug(u'is_empty_model({!r}) => True, short-circuit & return empty sentence'.format(crude_markov_model))
+        if trace:
+            trace('empty_model', model=crude_markov_model)
         yield []
         raise StopIteration()
 
-    _model_ngram_size = len(crude_markov_model.keys()[0])
-    if _model_ngram_size != ngram_size:
-        logger.error(u"make_sentences ngram_size={}, but model ngram_size={!r}".format(ngram_size, _model_ngram_size))
-        raise ValueError(u"ngram_size must match ngram_size of model.")
-
-    current_ngram = None
-    sentence = []
-    end_sentence = False
+    model = crude_markov_model
+    if not isinstance(model, (CrudeMarkovModel, FlatCrudeMarkovModel)):
+        model = CrudeMarkovModel.from_dict(model)
+    elif isinstance(model, CrudeMarkovModel) and model._analyzed_state_count != len(model):
+        model.analyze()
 
-    _sentences_counter = 0
-    _per_sentence_loop_counter = 0
-
-    while _sentences_counter < count:
-        logger.debug(u'current sentence = {}, i (sentence#) = {}, per_sentence_loop_counter={}'.format(
-                sentence, _sentences_counter, _per_sentence_loop_counter))
+    if model.ngram_size != ngram_size:
+        logger.error(u"make_sentences ngram_size={}, but model ngram_size={!r}".format(ngram_size, model.ngram_size))
+        raise ValueError(u"ngram_size must match ngram_size of model.")
 
-        if not current_ngram:
-            current_ngram = ngram_for_sentence_start(ngram_size)
+    if isinstance(model, FlatCrudeMarkovModel):
+        for sentence in _iter_make_sentences_from_flat(model, count, max_loops_per_sentence, rng or random, trace):
+            yield sentence
+        return
+
+    start_state = model.start_state
+    steps_to_end = model.steps_to_end
+    viable_followers = model.viable_followers
+    max_words = max_loops_per_sentence + 1
+    too_far = max_words + 1
+    choice = (rng or random).choice
+
+    for sentence_number in xrange(0, count):
+        sentence = []
+        state = start_state
+        words_left = max_words
+
+        while words_left:
+            if trace:
+                trace('step', sentence=list(sentence), sentence_number=sentence_number, words_left=words_left)
+
+            followers = viable_followers.get(state) or model.get(state)
+            if not followers:
+                break  # (dead end: only in a doomed part of the model)
+
+            next_word = choice(followers)
+            if next_word and steps_to_end.get(state[1:] + (next_word,), too_far) >= words_left:
+                # it can't end in time that way. so pick again, from the followers that can (if any can)
+                in_time = [word for word in followers if not word or
+                           steps_to_end.get(state[1:] + (word,), too_far) < words_left]
+                if in_time:
+                    next_word = choice(in_time)
 
-        try:
-            next_word_options = crude_markov_model[current_ngram]
-            next_word = random.choice(next_word_options)
             sentence.append(next_word)
-            current_ngram = current_ngram[1:] + (next_word,)
-        except (KeyError, IndexError):
-            # when we hit a 'dead end' that's alright, we just consider that the end of the 'sentence'
-            end_sentence = True
+            words_left -= 1
+            if not next_word:
+                break
+            state = state[1:] + (next_word,)
 
-        if _per_sentence_loop_counter >= max_loops_per_sentence:
-            end_sentence = True
+        if trace:
+            trace('sentence_end', sentence_number=sentence_number, length=len(sentence),
+                  complete=bool(sentence) and not sentence[-1])
+        yield sentence
 
-        if end_sentence:
-            _sentences_counter += 1
-            _per_sentence_loop_counter = 0
-            current_ngram = None
-            end_sentence = False
 
-            yield sentence
-            sentence = []
-        else:
-            _per_sentence_loop_counter += 1
+def _iter_make_sentences_from_flat(model, count, max_loops_per_sentence, rng, trace):
+    """ iter_make_sentences(), on a FlatCrudeMarkovModel: word ids & state keys, instead of words & tuples.
+    (the same draws, in the same order, from the same followers: so, the same sentences)
+    """
+    flat = model.followers
+    ngram_size = model.ngram_size
+    follower_ids = flat.follower_ids
+    viable_starts, viable_ids, steps_to_end = model.viable_starts, model.viable_ids, model.steps_to_end
+    end = flat.word_id(END_SYMBOL)
+    start_key = flat.state_key([flat.word_id(word) for word in model.start_state])
+    max_words = max_loops_per_sentence + 1
+    too_far = max_words + 1
+    choice, random_ = rng.choice, rng.random
+
+    def steps_from(key):
+        state = flat.find_state(ngram_size, key)
+        return (steps_to_end[flat.state_number(ngram_size, state)] or too_far) if state >= 0 else too_far
+
+    for sentence_number in xrange(0, count):
+        sentence = []
+        key = start_key
+        words_left = max_words
+
+        while words_left:
+            if trace:
+                trace('step', sentence=[flat.word(word_id) for word_id in sentence], sentence_number=sentence_number,
+                      words_left=words_left)
+
+            state = flat.find_state(ngram_size, key)
+            if state < 0:
+                break  # (dead end: only in a doomed part of the model)
+            number = flat.state_number(ngram_size, state)
+            start, stop = viable_starts[number], viable_starts[number + 1]
+            followers = viable_ids
+            if start == stop:
+                start, stop = flat.follower_range(ngram_size, state)
+                followers = follower_ids
+
+            # (what choice() does - without copying out the followers, which can be many: the start state has them all)
+            next_word = followers[start + int(random_() * (stop - start))]
+            if next_word != end and steps_from(flat.next_key(key, ngram_size, next_word)) >= words_left:
+                in_time = [word for word in followers[start:stop] if word == end or
+                           steps_from(flat.next_key(key, ngram_size, word)) < words_left]
+                if in_time:
+                    next_word = choice(in_time)
+
+            sentence.append(next_word)
+            words_left -= 1
+            if next_word == end:
+                break
+            key = flat.next_key(key, ngram_size, next_word)
 
-    raise StopIteration()
+        if trace:
+            trace('sentence_end', sentence_number=sentence_number, length=len(sentence),
+                  complete=bool(sentence) and sentence[-1] == end)
+        yield [flat.word(word_id) for word_id in sentence]
 
 
 def is_empty_model(model):
-    """ Returns True if model is 'empty'
+    """ Returns True if model is 'empty'. O(1)
     """
-    if not model:
-        return True
+    # 1 state i.e. {('', ..): ['', ..]} (when input is empty string we get this model, and it is best to short-circuit)
+    return len(model) <= 1
 
-    if len(model.keys()) == 1:
-        # i.e. {('', ..): ['', ..]} (when input is empty string we get this model, and it is best to short-circuit)
-        return True
 
-    return False
+def _ngram_size_of(model):
+    """ infer ngram size from any one key. (O(1): `next(iter(...))`, unlike `.keys()[0]` which copies all keys)
+    """
+    return len(next(iter(model))) if model else constants.DEFAULT_NGRAM_SIZE
 
 
 def ngram_for_sentence_start(ngram_size):
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+""" a trained model packed into flat arrays of numbers: for sharing 1 model between forked processes
+
+a model kept as dicts of tuples of strings is millions of small Python objects, and *reading* one writes to it:
+looking a state up, or going over its followers, bumps reference counts, on the state, the words, the numbers.
+in a forked worker, each of those writes un-shares (copies) a page of memory - so a worker generating from a model
+it shares with its parent soon has a copy of most of it. (see text_makers.prepare_for_fork)
+
+a FlatChain holds the same model, {state: {follower: weight}}, without Python objects to write to:
+    * words are ids. the vocabulary is 1 string (all the words, UTF-8, end to end) + an array of where each starts.
+    * states are numbers: the ids of their words, as digits, in base <vocabulary size>. 1 sorted array of those
+        numbers per state length; looking a state up is a binary search. moving to the next state is arithmetic.
+        so there's a limit: <vocabulary size> ** <state length> must fit in an unsigned long (2**64, on 64-bit
+        Linux & Mac). that's ~65k words at 4 per state, ~2.6M at 3; but only ~7k at 5, ~1.6k at 6. bigger models
+        raise FlatChainTooBig. (prepare_for_fork then leaves them as they are; shared models can't take them)
+    * followers of state i are at [starts[i], starts[i + 1]) in 1 array of word ids; the weights, and running
+        totals of them (to draw a follower with), are in arrays alongside.
+
+generating creates the objects it needs (ids, keys, words) as it goes, and throws them away; the model itself is only
+ever read. the arrays are compact, too: the model takes a fraction of the memory that the dicts do.
+
+it's all numbers & bytes, so it can also live outside of Python's heap: arrays() & from_arrays() take it apart and put
+it back together around other buffers (such as views of shared memory; see presswork.text.shared_models).
+
+    >>> flat = FlatChain({(u"a", u"b"): {u"c": 2, u"d": 1}, (u"b", u"c"): {u"": 1}})
+    >>> key = flat.state_key([flat.word_id(u"a"), flat.word_id(u"b")])
+    >>> state = flat.find_state(2, key)
+    >>> [(flat.word(word_id), weight) for word_id, weight in flat.followers(2, state)]
+    [(u'c', 2.0), (u'd', 1.0)]
+    >>> flat.word(flat.draw(2, state, 0.5)), flat.word(flat.draw(2, state, 0.9))
+    (u'c', u'd')
+    >>> flat.find_state(2, flat.next_key(key, 2, flat.word_id(u"c"))) >= 0
+    True
+    >>> sorted(flat.transitions().items()) == [((u'a', u'b'), {u'c': 2, u'd': 1}), ((u'b', u'c'), {u'': 1})]
+    True
+"""
+import bisect
+from array import array
+
+
+class FlatChainTooBig(ValueError):
+    """ raised if a model can't be packed: its states, as numbers, wouldn't fit in the arrays (see FlatChain.MAX_KEYS)
+    """
+
+
+class FlatChain(object):
+    """ {state: {follower: weight}}, packed into flat arrays. read-only. see module docstring
+    """
+    WORD_ID_TYPECODE = 'i'
+    OFFSET_TYPECODE = 'l'
+    STATE_KEY_TYPECODE = 'L'
+    WEIGHT_TYPECODE = 'd'
+
+    # how many different state keys there can be: <vocabulary size> ** <longest state> can't be more than this
+    MAX_KEYS = 2 ** (8 * array(STATE_KEY_TYPECODE).itemsize)
+
+    def __init__(self, transitions):
+        """
+        :param transitions: {state: {follower: weight}}. states are tuples of words (of any lengths, > 0).
+            followers keep the order they have in each dict - draw() goes by that order, as the dict's owner would.
+            (followers can also be a list of words, which may repeat, like the crude model keeps them: each one is
+            then a follower of weight 1, in that order)
+        """
+        vocabulary = sorted(set(word for state, weights in transitions.iteritems()
+                                for word in state + tuple(weights)))
+        ids_by_word = {word: word_id for word_id, word in enumerate(vocabulary)}
+        encoded = [_encode(word) for word in vocabulary]
+        self._words = "".join(encoded)
+        self._word_starts = array(self.OFFSET_TYPECODE, [0])
+        for word in encoded:
+            self._word_starts.append(self._word_starts[-1] + len(word))
+
+        self.radix = max(len(vocabulary), 1)
+        max_order = max(len(state) for state in transitions) if transitions else 0
+        max_key = self.radix ** max_order
+        if max_key > self.MAX_KEYS:
+            raise FlatChainTooBig("{} words, {} per state: too many to pack each state into 1 number".format(
+                    len(vocabulary), max_order))
+        self._moduli = [self.radix ** order for order in xrange(max_order + 1)]
+
+        states_by_order = {}
+        for state, weights in transitions.iteritems():
+            key = self.state_key([ids_by_word[word] for word in state])
+            states_by_order.setdefault(len(state), []).append((key, weights))
+
+        self._state_keys = {}
+        self._follower_starts = {}
+        self._follower_ids = array(self.WORD_ID_TYPECODE)
+        self._weights = array(self.WEIGHT_TYPECODE)
+        self._cumulative_weights = array(self.WEIGHT_TYPECODE)
+        for order, states in sorted(states_by_order.iteritems()):
+            states.sort(key=lambda (key, weights): key)
+            self._state_keys[order] = array(self.STATE_KEY_TYPECODE, (key for key, weights in states))
+            starts = self._follower_starts[order] = array(self.OFFSET_TYPECODE, [len(self._follower_ids)])
+            for key, weights in states:
+                total = 0
+                for follower, weight in _iter_weights(weights):
+                    total += weight
+                    self._follower_ids.append(ids_by_word[follower])
+                    self._weights.append(weight)
+                    self._cumulative_weights.append(total)
+                starts.append(len(self._follower_ids))
+        self._state_offsets = self._offsets_of_orders()
+
+    # names of the arrays that hold a FlatChain (see arrays()): 1 each, and 1 per state length (order) each
+    ARRAY_NAMES = ('_words', '_word_starts', '_follower_ids', '_weights', '_cumulative_weights')
+    ARRAY_BY_ORDER_NAMES = ('_state_keys', '_follower_starts')
+
+    def arrays(self):
+        """ :return: what it takes to rebuild this FlatChain with from_arrays(): (radix, {name: array}).
+            names are ARRAY_NAMES, and 'name:order' for ARRAY_BY_ORDER_NAMES. (_words is a str, of UTF-8; the rest are
+            arrays, of the *_TYPECODEs)
+        """
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        for name in self.ARRAY_BY_ORDER_NAMES:
+            for order, by_order in getattr(self, name).iteritems():
+                arrays["{}:{}".format(name, order)] = by_order
+        return self.radix, arrays
+
+    @classmethod
+    def from_arrays(cls, radix, arrays):
+        """ :return: a FlatChain around `arrays` (as from arrays()) - not copies of them. so, these can be views of
+            memory from elsewhere: anything that slices & indexes like the originals (such as ctypes arrays)
+        """
+        flat = cls.__new__(cls)
+        flat.radix = radix
+        for name in cls.ARRAY_BY_ORDER_NAMES:
+            setattr(flat, name, {})
+        for name, values in arrays.iteritems():
+            name, _, order = name.partition(":")
+            if order:
+                getattr(flat, name)[int(order)] = values
+            else:
+                setattr(flat, name, values)
+        max_order = max(flat._state_keys) if flat._state_keys else 0
+        flat._moduli = [radix ** order for order in xrange(max_order + 1)]
+        flat._state_offsets = flat._offsets_of_orders()
+        return flat
+
+    def _offsets_of_orders(self):
+        offsets, offset = {}, 0
+        for order, keys in sorted(self._state_keys.iteritems()):
+            offsets[order] = offset
+            offset += len(keys)
+        return offsets
+
+    def word_id(self, word):
+        """ :return: id of `word`, or None if it isn't in the vocabulary. O(log(vocabulary)), for occasional use
+        """
+        lo, hi = 0, len(self._word_starts) - 1
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.word(middle) < word:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo if lo < len(self._word_starts) - 1 and self.word(lo) == word else None
+
+    def word(self, word_id):
+        return self._words[self._word_starts[word_id]:self._word_starts[word_id + 1]].decode('utf-8')
+
+    def state_key(self, word_ids):
+        """ :return: the number standing for the state made of these word ids (its key, for find_state)
+        """
+        key = 0
+        for word_id in word_ids:
+            key = key * self.radix + word_id
+        return key
+
+    def next_key(self, key, order, word_id):
+        """ :return: the key of the state after `key` (which has `order` words), once `word_id` follows it
+        """
+        return (key % self._moduli[order - 1]) * self.radix + word_id
+
+    def suffix_key(self, key, order):
+        """ :return: the key of the state of the last `order` words of the state `key`
+        """
+        return key % self._moduli[order]
+
+    def find_state(self, order, key):
+        """ :return: index of the state with this key (among states of `order` words), or -1 if there isn't one
+        """
+        keys = self._state_keys.get(order)
+        if keys is None:
+            return -1
+        i = bisect.bisect_left(keys, key)
+        return i if i < len(keys) and keys[i] == key else -1
+
+    def state_number(self, order, state):
+        """ :return: the state's place among all states, counting shorter states first: 0 to len(self) - 1.
+            (for keeping other things about states, in arrays alongside; in the order of iter_states())
+        """
+        return self._state_offsets[order] + state
+
+    def follower_range(self, order, state):
+        """ :return: (start, stop) of the followers of state (an index from find_state), in the follower arrays
+        """
+        starts = self._follower_starts[order]
+        return starts[state], starts[state + 1]
+
+    def followers(self, order, state):
+        """ :return: list of (word id, weight), for the followers of a state
+        """
+        start, stop = self.follower_range(order, state)
+        return zip(self._follower_ids[start:stop], self._weights[start:stop])
+
+    def draw(self, order, state, sample):
+        """ :return: id of a follower of the state, drawn with probability proportional to its weight
+        :param sample: a random number in [0, 1), such as from rng.random()
+
+        (the same draw as markovify's: the follower whose running total is the 1st to go past sample * total)
+        """
+        start, stop = self.follower_range(order, state)
+        cumulative = self._cumulative_weights
+        return self._follower_ids[bisect.bisect(cumulative, sample * cumulative[stop - 1], start, stop)]
+
+    @property
+    def cumulative_weights(self):
+        """ running totals of the weights, restarting at each state. (for callers drawing in their own way)
+        """
+        return self._cumulative_weights
+
+    @property
+    def weights(self):
+        return self._weights
+
+    @property
+    def follower_ids(self):
+        return self._follower_ids
+
+    def iter_states(self):
+        """ :return: (generator) (order, state index, state key) of every state
+        """
+        for order, keys in sorted(self._state_keys.iteritems()):
+            for state, key in enumerate(keys):
+                yield order, state, key
+
+    def state_words(self, order, key):
+        """ :return: the state with this key, as a tuple of words
+        """
+        word_ids = []
+        for _ in xrange(order):
+            key, word_id = divmod(key, self.radix)
+            word_ids.append(word_id)
+        return tuple(self.word(word_id) for word_id in reversed(word_ids))
+
+    def transitions(self):
+        """ :return: the model as a dict again: {state: {follower: weight}}. (whole-number weights come back as ints)
+        """
+        transitions = {}
+        for order, state, key in self.iter_states():
+            weights = transitions[self.state_words(order, key)] = {}
+            for word_id, weight in self.followers(order, state):
+                # (a follower can come up more than once, if built from a list of followers: they add up)
+                word = self.word(word_id)
+                weights[word] = weights.get(word, 0) + weight
+            for word, weight in weights.iteritems():
+                weights[word] = _int_if_whole(weight)
+        return transitions
+
+    def __len__(self):
+        return sum(len(keys) for keys in self._state_keys.itervalues())
+
+
+class FlatStateValues(object):
+    """ {state: number}, for the states of a FlatChain: the numbers in an array alongside it (see state_number)
+
+        >>> flat = FlatChain({(u"a",): {u"b": 1}, (u"b",): {u"": 1}})
+        >>> totals = FlatStateValues(flat, [2.0, 5.0])
+        >>> totals.get((u"b",)), totals.get((u"c",)), totals.get((u"c",), 0)
+        (5.0, None, 0)
+    """
+
+    def __init__(self, flat, values):
+        self.flat = flat
+        self.values = values
+
+    def get(self, state, default=None):
+        flat = self.flat
+        word_ids = [flat.word_id(word) for word in state]
+        if None in word_ids:
+            return default
+        i = flat.find_state(len(state), flat.state_key(word_ids))
+        return self.values[flat.state_number(len(state), i)] if i >= 0 else default
+
+
+def _iter_weights(followers):
+    """ :return: (follower, weight) pairs, from a dict of {follower: weight}, or a list of followers (weight 1 each)
+    """
+    return followers.iteritems() if isinstance(followers, dict) else ((follower, 1) for follower in followers)
+
+
+def _encode(word):
+    return word.encode('utf-8') if isinstance(word, unicode) else word
+
+
+def _int_if_whole(number):
+    return int(number) if number == int(number) else number
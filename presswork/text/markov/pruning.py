@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+""" pruning trained models: drop rare transitions (& the states left with none), to shrink a model before serving it
+
+in a model trained on natural text, most states are singletons - seen once, with one follower, seen once. they take
+most of the memory, but they rarely come up in generation (and when they do, they mostly reproduce the input verbatim).
+
+each strategy keeps its model its own way, so each TextMaker adapts its model to & from one common shape,
+`{state: {follower: count}}`, and prune_transitions() does the pruning on that. policy:
+    * min_count: drop followers seen fewer than this many times
+    * top_k: keep only the k most frequent followers of each state (ties go to the follower that sorts first)
+    * a state left with no followers is dropped
+    * for strategies which can't back off to a shorter state (`next_state` given), that cascades: followers that lead to
+        a dropped state are dropped too, and so are states which can no longer reach the end of a sentence, or which
+        can no longer be reached from the start. so generation can't walk into a dead end that pruning made.
+
+        >>> END = u""
+        >>> transitions = {
+        ...     (u"",): {u"the": 5, u"a": 1},
+        ...     (u"the",): {u"end": 4, u"cat": 1},
+        ...     (u"a",): {u"end": 1},
+        ...     (u"cat",): {END: 1},
+        ...     (u"end",): {END: 5},
+        ... }
+        >>> pruned = prune_transitions(transitions, min_count=2, start_state=(u"",), end=END, next_state=shift_state)
+        >>> sorted(pruned.items())
+        [((u'',), {u'the': 5}), ((u'end',), {u'': 5}), ((u'the',), {u'end': 4})]
+        >>> sorted(prune_transitions(transitions, top_k=1, start_state=(u"",), end=END, next_state=shift_state))
+        [(u'',), (u'end',), (u'the',)]
+
+    the memory budget (`max_bytes`) is up to the caller, which can measure the real model: see BaseTextMaker.prune()
+"""
+import collections
+
+
+class PruningError(ValueError):
+    """ raise if pruning would leave a model which can't make any sentence at all (there'd be nothing to start from)
+    """
+
+
+class PruningReport(collections.namedtuple('PruningReport', [
+        'states_before', 'states_after', 'transitions_before', 'transitions_after',
+        'bytes_before', 'bytes_after', 'min_count', 'top_k'])):
+    """ what pruning did. a "transition" is 1 (state, follower) pair; bytes are as measured by `deep_getsizeof`
+
+        >>> report = PruningReport(10, 4, 20, 5, 4000, 1000, min_count=2, top_k=None)
+        >>> report.states_removed, report.transitions_removed, report.bytes_saved
+        (6, 15, 3000)
+        >>> print report
+        pruned (min_count=2, top_k=None): removed 6 of 10 states, 15 of 20 transitions; 4000 -> 1000 bytes (-75.0%)
+    """
+    __slots__ = ()
+
+    @property
+    def states_removed(self):
+        return self.states_before - self.states_after
+
+    @property
+    def transitions_removed(self):
+        return self.transitions_before - self.transitions_after
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_before - self.bytes_after
+
+    def __str__(self):
+        return ("pruned (min_count={0.min_count}, top_k={0.top_k}): "
+                "removed {0.states_removed} of {0.states_before} states, "
+                "{0.transitions_removed} of {0.transitions_before} transitions; "
+                "{0.bytes_before} -> {0.bytes_after} bytes ({1:+.1%})").format(
+                self, -float(self.bytes_saved) / self.bytes_before if self.bytes_before else 0.0)
+
+
+def prune_transitions(transitions, min_count=None, top_k=None, start_state=None, end=None, next_state=None):
+    """ apply the pruning policy (see module docstring) to `transitions`. does not change the input; returns a new dict
+
+    :param transitions: {state: {follower: count}}
+    :param min_count: (optional) drop followers seen fewer than this many times
+    :param top_k: (optional) keep at most this many followers per state
+    :param start_state: where generation starts. if that doesn't survive pruning, raises PruningError
+    :param end: the follower which means "end of sentence"
+    :param next_state: (optional) function of (state, follower) => the state generation goes to next. give this for
+        strategies that can't back off to a shorter state, to cascade the pruning (see module docstring)
+    :rtype: dict
+    """
+    kept = {}
+    for state, counts in transitions.iteritems():
+        followers = [(follower, count) for follower, count in counts.iteritems()
+                     if min_count is None or count >= min_count]
+        if top_k is not None and len(followers) > top_k:
+            followers = sorted(followers, key=_most_frequent_first)[:top_k]
+        if followers:
+            kept[state] = dict(followers)
+
+    if next_state is not None:
+        kept = _without_dead_ends(kept, start_state, end, next_state)
+
+    if start_state is not None and start_state not in kept:
+        raise PruningError("pruning (min_count={!r}, top_k={!r}) would leave nothing to start a sentence from".format(
+                min_count, top_k))
+    return kept
+
+
+def shift_state(state, follower):
+    """ the usual `next_state` for prune_transitions: drop the oldest word of the state, append the follower
+    """
+    return state[1:] + (follower,)
+
+
+def count_transitions(transitions):
+    """
+        >>> count_transitions({(u"a",): {u"b": 2, u"c": 1}, (u"b",): {u"": 2}})
+        3
+    """
+    return sum(len(counts) for counts in transitions.itervalues())
+
+
+def _most_frequent_first(follower_and_count):
+    follower, count = follower_and_count
+    return -count, follower
+
+
+def _without_dead_ends(transitions, start_state, end, next_state):
+    """ keep only states reachable from start_state which can reach the end; and followers that lead to those
+    """
+    can_end = set()
+    predecessors = collections.defaultdict(list)
+    for state, counts in transitions.iteritems():
+        for follower in counts:
+            if follower == end:
+                can_end.add(state)
+            else:
+                predecessors[next_state(state, follower)].append(state)
+
+    frontier = list(can_end)
+    while frontier:
+        state = frontier.pop()
+        for predecessor in predecessors.get(state, ()):
+            if predecessor not in can_end:
+                can_end.add(predecessor)
+                frontier.append(predecessor)
+
+    reachable = set()
+    frontier = [start_state] if start_state in can_end else []
+    reachable.update(frontier)
+    while frontier:
+        state = frontier.pop()
+        for follower in transitions[state]:
+            if follower != end:
+                following = next_state(state, follower)
+                if following in can_end and following not in reachable:
+                    reachable.add(following)
+                    frontier.append(following)
+
+    return {
+        state: {follower: count for follower, count in transitions[state].iteritems()
+                if follower == end or next_state(state, follower) in reachable}
+        for state in reachable
+    }
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" size and shape of a trained model: how many states & transitions, how branchy, how much memory
+
+every strategy keeps its model its own way, so each TextMaker hands over what's needed - the distinct followers of
+each state, and the objects holding the model - and model_stats() does the counting. (see BaseTextMaker.stats())
+
+    * states: distinct states (n-grams) in the model. pymc also keeps states of every shorter length, to back off to
+    * transitions: distinct (state, follower) pairs
+    * vocabulary: distinct words the model can generate (not counting the end-of-sentence marker)
+    * mean_branching, max_branching: distinct followers per state
+    * memory_bytes: memory used by the model, including everything it holds. estimated, by sampling, unless exact
+        (see utils.estimate_deep_getsizeof and utils.deep_getsizeof)
+
+        >>> stats = model_stats([{u"b": 2, u"c": 1}, {u"": 3}, [u"", u"", u"c"]], end=u"", model=None)
+        >>> stats.states, stats.transitions, stats.vocabulary, stats.max_branching
+        (3, 5, 2, 2)
+        >>> print stats.report()
+        states                       3
+        transitions                  5
+        vocabulary                   2
+        mean branching            1.67
+        max branching                2
+        memory (estimated)        0.0B
+"""
+import collections
+
+from presswork.utils import deep_getsizeof, estimate_deep_getsizeof
+
+
+class ModelStats(collections.namedtuple('ModelStats', [
+        'states', 'transitions', 'vocabulary', 'mean_branching', 'max_branching', 'memory_bytes', 'memory_is_exact'])):
+    """ size and shape of a trained model; see module docstring
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return ("{0.states} states, {0.transitions} transitions, vocabulary of {0.vocabulary}, "
+                "branching {0.mean_branching:.2f} mean / {0.max_branching} max, {1} {2}").format(
+                self, _format_bytes(self.memory_bytes), "memory" if self.memory_is_exact else "memory (estimated)")
+
+    def report(self):
+        """ :return: the stats as a plaintext table
+        """
+        rows = [
+            (u"states", u"{}".format(self.states)),
+            (u"transitions", u"{}".format(self.transitions)),
+            (u"vocabulary", u"{}".format(self.vocabulary)),
+            (u"mean branching", u"{:.2f}".format(self.mean_branching)),
+            (u"max branching", u"{}".format(self.max_branching)),
+            (u"memory" if self.memory_is_exact else u"memory (estimated)", _format_bytes(self.memory_bytes)),
+        ]
+        return u"\n".join(u"{:<20}{:>10}".format(name, value) for name, value in rows)
+
+
+def model_stats(followers_by_state, end, model, exact_memory=False):
+    """
+    :param followers_by_state: iterable of: the followers of each state. a collection of *distinct* followers (such as
+        a dict of {follower: count}), or a list/tuple which may repeat followers (like the crude model keeps them).
+    :param end: the follower which means "end of sentence" (not counted in the vocabulary)
+    :param model: the object(s) holding the model, to measure for memory_bytes
+    :param exact_memory: if True, walk the whole model to measure its memory, instead of estimating from a sample.
+    :rtype: ModelStats
+    """
+    states = transitions = max_branching = 0
+    vocabulary = set()
+    for followers in followers_by_state:
+        if isinstance(followers, (list, tuple)):
+            followers = set(followers)
+        branching = len(followers)
+        states += 1
+        transitions += branching
+        if branching > max_branching:
+            max_branching = branching
+        vocabulary.update(followers)
+    vocabulary.discard(end)
+
+    if model is None:
+        memory_bytes = 0
+    else:
+        memory_bytes = deep_getsizeof(model) if exact_memory else estimate_deep_getsizeof(model)
+
+    return ModelStats(
+            states=states,
+            transitions=transitions,
+            vocabulary=len(vocabulary),
+            mean_branching=float(transitions) / states if states else 0.0,
+            max_branching=max_branching,
+            memory_bytes=memory_bytes,
+            memory_is_exact=exact_memory)
+
+
+def _format_bytes(count):
+    """
+        >>> _format_bytes(512), _format_bytes(2048), _format_bytes(5 * 1024 ** 3)
+        (u'512.0B', u'2.0KB', u'5.0GB')
+    """
+    for unit in (u"B", u"KB", u"MB"):
+        if abs(count) < 1024.0:
+            return u"{:.1f}{}".format(count, unit)
+        count /= 1024.0
+    return u"{:.1f}GB".format(count)
@@ -1,8 +1,12 @@
 """ adapters for the Markovify lib. consider this class private, and instead use TextMaker interface!
 """
+import bisect
+import random
+
 import markovify
 
 from presswork import constants
+from presswork.text.markov.flat import FlatChain
 
 
 class Disabled(ValueError):
@@ -44,6 +48,9 @@ class MarkovifyLite(markovify.Text):
 
         self.chain = chain or markovify.Chain(self.parsed_sentences, state_size)
 
+        # once flatten()ed: the model, as a FlatChain (and self.chain has no model)
+        self.flat = None
+
         # The "rejoined_text" variable is checked in make_sentences -> test_sentence_output, which
         # "assesses the novelty of sentences". This is a very cool feature, but so far it depends on the
         # 'eager' stringification that we are trying to get away from. For now, we'll disable it.
@@ -68,12 +75,103 @@ class MarkovifyLite(markovify.Text):
         """
         return words
 
+    @property
+    def begin_state(self):
+        return (markovify.chain.BEGIN,) * self.chain.state_size
+
+    def transition_counts(self):
+        """ :return: the model as {state: {follower: times seen}} - which is just how markovify keeps it (not a copy).
+        (unless it's been flattened; then it's rebuilt from the FlatChain)
+        """
+        flat = self.flat
+        return flat.transitions() if flat is not None else self.chain.model
+
+    def flatten(self, flat=None):
+        """ move the model into a FlatChain (see `flat`), for sharing it with forked processes. generates the same.
+
+        :param flat: (optional) a FlatChain to generate from instead, such as one attached from shared memory
+            (see presswork.text.shared_models). (then the current model is just dropped)
+        """
+        self.flat = flat if flat is not None else FlatChain(self.chain.model)
+        self.chain = markovify.Chain(None, self.chain.state_size, model={self.begin_state: {markovify.chain.END: 1}})
+
+    def load_transition_counts(self, transitions):
+        """ replace the model with {state: {follower: times seen}}, as from transition_counts() (or pruned from it)
+
+        swaps in a whole new chain (rather than changing the model & the begin state cache 1 by 1), so a walk()
+        going on in another thread sees the old chain or the new one, never half of each.
+        """
+        self.chain = markovify.Chain(None, self.chain.state_size, model=transitions)
+        self.flat = None
+
     def generate_corpus(self, text):
         raise Disabled("disabled in this adapter; tokenize beforehand, pass to `parsed_sentences` in constructor")
 
-    def make_sentence(self, init_state=None, **kwargs):
-        kwargs['test_output'] = kwargs.get('test_output', False)
-        return super(MarkovifyLite, self).make_sentence(init_state, **kwargs)
+    def make_sentence(self, init_state=None, rng=None, **kwargs):
+        """ same as markovify.Text.make_sentence(), except: it can draw from a given `rng` (random.Random),
+        instead of the global `random`; and test_output is off by default (see test_sentence_output)
+        """
+        tries = kwargs.get('tries', markovify.text.DEFAULT_TRIES)
+        max_words = kwargs.get('max_words', None)
+        if kwargs.get('test_output', False):
+            self.test_sentence_output()
+
+        if init_state is None:
+            prefix = []
+        else:
+            prefix = list(init_state[1:]) if init_state[0] == markovify.chain.BEGIN else list(init_state)
+
+        for _ in xrange(tries):
+            words = prefix + self.walk(init_state, rng=rng)
+            if max_words is None or len(words) <= max_words:
+                return self.word_join(words)
+        return None
+
+    def walk(self, init_state=None, rng=None):
+        """ same as markovify.Chain.walk(), except it can draw from a given `rng` (random.Random)
+
+        :return: list of words, from init_state (or the beginning of a sentence) to the end of the sentence
+        """
+        rng = rng or random
+        if self.flat is not None:
+            return self._walk_flat(self.flat, init_state, rng)
+
+        chain = self.chain
+        model = chain.model
+        begin_state = self.begin_state
+        state = init_state or begin_state
+        words = []
+        while True:
+            if state == begin_state:
+                choices, cumdist = chain.begin_choices, chain.begin_cumdist
+            else:
+                choices, weights = zip(*model[state].items())
+                cumdist = list(markovify.chain.accumulate(weights))
+            word = choices[bisect.bisect(cumdist, rng.random() * cumdist[-1])]
+            if word == markovify.chain.END:
+                return words
+            words.append(word)
+            state = state[1:] + (word,)
+
+    def _walk_flat(self, flat, init_state, rng):
+        """ walk(), on the FlatChain. (the same draws, from the same model: so, the same words)
+        """
+        state_size = self.chain.state_size
+        word_ids = [flat.word_id(word) for word in (init_state or self.begin_state)]
+        if None in word_ids:
+            raise KeyError(init_state)
+        end = flat.word_id(markovify.chain.END)
+        key = flat.state_key(word_ids)
+        words = []
+        while True:
+            state = flat.find_state(state_size, key)
+            if state < 0:
+                raise KeyError(flat.state_words(state_size, key))
+            word_id = flat.draw(state_size, state, rng.random())
+            if word_id == end:
+                return words
+            words.append(flat.word(word_id))
+            key = flat.next_key(key, state_size, word_id)
 
     def test_sentence_output(self, *args):
         """ used by 'assessing the noevelty of generated sentences', very cool feature, but disabled for now
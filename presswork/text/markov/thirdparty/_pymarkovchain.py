@@ -18,6 +18,8 @@ Markovify implementation is preferable for most uses but this implementation is
 from __future__ import division
 
 from presswork import constants
+from presswork.text.markov import tracing
+from presswork.text.markov.flat import FlatChain
 
 try:
     # try to use cPickle for better performance (python2)
@@ -25,6 +27,8 @@ try:
 except ImportError:  # pragma: no cover
     import pickle
 
+from array import array
+import bisect
 from collections import defaultdict
 import logging
 import os
@@ -34,6 +38,12 @@ import warnings
 
 SPECIAL_TOKEN = u''
 
+# generation guards (the original had none; it ran until it happened to draw the end of sentence). see __init__
+DEFAULT_MAX_WORDS_PER_SENTENCE = 100
+# off by default: in natural text, states legitimately come up again in 1 sentence (at window=1, a limit of 3 cut ~6%
+# of sentences from the senate bills fixture short). the word limit alone bounds a sentence that goes in circles
+DEFAULT_MAX_STATE_VISITS_PER_SENTENCE = None
+
 
 def _db_factory():
     """ DB data structure: dict like  {word_sequence: {next_word: probability}}
@@ -53,6 +63,16 @@ def _one():
     return 1.0
 
 
+def _whole_if_close(count):
+    """ undo floating point error, so counts that were whole numbers come back as such
+
+        >>> _whole_if_close(2.9999999999997), _whole_if_close(2.5)
+        (3, 2.5)
+    """
+    whole = int(round(count))
+    return whole if abs(count - whole) < 1e-6 else count
+
+
 class EndOfChainException(Exception):
     pass
 
@@ -64,15 +84,33 @@ class PyMarkovChainForked(object):
 
     See module header for notes on AUTHORSHIP and CAVEATS.
     """
+    SPECIAL_TOKEN = SPECIAL_TOKEN
 
     def __init__(
             self,
             db_file_path=None,
             window=constants.DEFAULT_NGRAM_SIZE,
+            max_words_per_sentence=DEFAULT_MAX_WORDS_PER_SENTENCE,
+            max_state_visits_per_sentence=DEFAULT_MAX_STATE_VISITS_PER_SENTENCE,
     ):
+        """
+        :param max_words_per_sentence: end a sentence once it is this long, even without reaching the end of sentence.
+            (same idea as `max_loops_per_sentence` in the crude strategy.) None for no limit
+        :param max_state_visits_per_sentence: end a sentence once it is going in circles - once the same state
+            (the last `window` words) comes up this many times in 1 sentence. None (the default) for no limit.
+            without these, cyclic input (refrains; or text where the end of sentence is rarely drawn) can make
+            one sentence run for a very long time. max_words_per_sentence is enough to stop that; this stops it
+            sooner, but can also cut ordinary sentences short (common words come up again), so set it with care.
+        """
         self.window = window
+        self.max_words_per_sentence = max_words_per_sentence
+        self.max_state_visits_per_sentence = max_state_visits_per_sentence
 
         self.db = None
+        # {word_sequence: sum of its counts}, from before normalizing. (so counts can be recovered, to prune by count)
+        self.state_totals = {}
+        # once flatten()ed: the db, as a FlatChain (and self.db is empty)
+        self.flat = None
         self.db_file_path = db_file_path
         if self.db_file_path is not None:
             self.db_load()
@@ -128,9 +166,101 @@ class PyMarkovChainForked(object):
             for nextword in self.db[word]:
                 wordsum += self.db[word][nextword]
             if wordsum != 0:
+                self.state_totals[word] = wordsum
                 for nextword in self.db[word]:
                     self.db[word][nextword] /= wordsum
 
+    def freeze(self):
+        """ once trained, make the db plain dicts - so generating only reads it, and many threads can do so at once.
+        (a defaultdict inserts a key on any lookup that misses: a write, even when just reading.) after this,
+        markov_chain() can't add to the db anymore; load_transition_counts() can still replace it.
+
+            >>> pymc = PyMarkovChainForked(window=1)
+            >>> pymc.markov_chain([["a", "b"]])
+            >>> pymc.freeze()
+            >>> type(pymc.db), type(pymc.db[("a",)])
+            (<type 'dict'>, <type 'dict'>)
+        """
+        self.db = {word_sequence: dict(probabilities) for word_sequence, probabilities in self.db.iteritems()}
+
+    def flatten(self, flat=None, state_totals=None):
+        """ move the db into a FlatChain (see `flat`), for sharing it with forked processes. generates the same
+        (barring the odd difference in floating point rounding, adding up probabilities vs. subtracting them)
+
+        :param flat: (optional) a FlatChain of a db to generate from instead, such as one attached from shared memory
+            (see presswork.text.shared_models). (then the current db is just dropped)
+        :param state_totals: (with `flat`) its state_totals: a flat.FlatStateValues, as from flat_state_totals()
+        """
+        if flat is None:
+            flat = FlatChain(self._db)
+        else:
+            self.state_totals = state_totals
+        self.flat = flat
+        self.db = {}
+
+    def flat_state_totals(self, flat):
+        """ :return: state_totals, as an array alongside `flat` (a FlatChain of the db): in the order of its states,
+            0 where unknown. (see flat.FlatStateValues)
+        """
+        state_totals = self.state_totals
+        return array('d', (state_totals.get(flat.state_words(order, key), 0)
+                           for order, state, key in flat.iter_states()))
+
+    @property
+    def _db(self):
+        """ the db, as a dict, whether it's been flattened or not
+        """
+        flat = self.flat
+        return flat.transitions() if flat is not None else self.db
+
+    def transition_counts(self):
+        """ :return: the model as {word_sequence: {next_word: times seen}}, recovered from probabilities & state_totals
+
+        (the original starts each count at 1 - see _default_word_probability_dict - so that 1 is taken off again.
+        words with probability 0, i.e. the placeholder for the beginning of a sentence, are left out. counts are whole
+        numbers, except after merging models with fractional weights; see text_makers.merge_text_makers)
+
+            >>> pymc = PyMarkovChainForked(window=1)
+            >>> pymc.markov_chain([["a", "b"], ["a", "c"]])
+            >>> sorted(pymc.transition_counts()[("a",)].items())
+            [('b', 1), ('c', 1)]
+        """
+        transitions = {}
+        for word_sequence, probabilities in self._db.iteritems():
+            total = self.state_totals.get(word_sequence)
+            if not total:
+                if any(probabilities.itervalues()):
+                    raise ValueError("counts unknown for {!r} (was the db loaded from a file?), can't recover them"
+                                     .format(word_sequence))
+                continue
+            transitions[word_sequence] = {
+                next_word: _whole_if_close(probability * total - 1)
+                for next_word, probability in probabilities.iteritems() if probability}
+        return transitions
+
+    def iter_followers(self):
+        """ :return: (generator) the next words of each word sequence. (leaving out the placeholder w/ probability 0)
+        """
+        for word_sequence, probabilities in self._db.iteritems():
+            if word_sequence == self._special_ngram:
+                yield [next_word for next_word, probability in probabilities.iteritems() if probability]
+            else:
+                yield probabilities
+
+    def load_transition_counts(self, transitions):
+        """ replace the db with one re-normalized from {word_sequence: {next_word: times seen}} (see transition_counts).
+        the new db is frozen already (see freeze), and swapped in whole.
+        """
+        db = {}
+        state_totals = {}
+        for word_sequence, counts in transitions.iteritems():
+            wordsum = sum(counts.itervalues()) + len(counts)
+            state_totals[word_sequence] = wordsum
+            db[word_sequence] = {next_word: (count + 1) / wordsum for next_word, count in counts.iteritems()}
+        self.db = db
+        self.flat = None
+        self.state_totals = state_totals
+
     def db_dump(self):
         warnings.warn("Features of PyMarkovChainFork managing its own persistence are deprecated.")
         with open(self.db_file_path, 'wb') as dbfile:
@@ -141,33 +271,145 @@ class PyMarkovChainForked(object):
         warnings.warn("Features of PyMarkovChainFork managing its own persistence are deprecated.")
         os.unlink(self.db_file_path)
 
-    def make_sentences_list(self, number):
+    def make_sentences_list(self, number, rng=None):
+        """ :param rng: (optional) random.Random to draw from. (if not given, the global `random`)
+        """
         seed = self._special_ngram      # (removed ability to pass in custom seed; was not in use by presswork)
+        trace = tracing.get_tracer('pymc')
+        rng = rng or random
+
+        flat = self.flat
+        generate = self._generate_sentence_as_list if flat is None else self._generate_sentence_from_flat
 
         sentences = []
         for _ in range(0, number):
-            sentences.append(self._generate_sentence_as_list(seed))
+            sentences.append(generate(seed, trace=trace, rng=rng))
 
         return sentences
 
-    def _generate_sentence_as_list(self, seed):
-        """ (Comment from original:) Accumulate the generated sentence with a given single word as a seed """
-        next_word = self._next_word(seed)
+    def _generate_sentence_as_list(self, seed, trace=None, rng=random):
+        """ (Comment from original:) Accumulate the generated sentence with a given single word as a seed
+
+        ends at the end of sentence, like the original; or early, see `max_words_per_sentence`,
+        `max_state_visits_per_sentence` in __init__.
+
+            >>> import random; random.seed(0)
+            >>> pymc = PyMarkovChainForked(window=2, max_state_visits_per_sentence=None, max_words_per_sentence=5)
+            >>> pymc.markov_chain([["round", "and"] * 100])
+            >>> pymc._generate_sentence_as_list(pymc._special_ngram)
+            [u'', 'round', 'and', 'round', 'and', 'round']
+            >>> pymc.max_words_per_sentence, pymc.max_state_visits_per_sentence = None, 2
+            >>> pymc._generate_sentence_as_list(pymc._special_ngram)
+            [u'', 'round', 'and', 'round', 'and']
+        """
+        max_words = self.max_words_per_sentence
+        max_state_visits = self.max_state_visits_per_sentence
+        window = self.window
+        state_visits = {}
+
+        next_word = self._next_word(seed, rng)
         sentence = list(seed) if seed else []
+        word_count = 0
+        end = 'end_of_sentence'
         while next_word:
             sentence.append(next_word)
-            next_word = self._next_word(sentence)
+            word_count += 1
+            if max_words is not None and word_count >= max_words:
+                end = 'max_words'
+                break
+
+            # only the last `window` words matter to _next_word(). (passing the whole sentence, like the original did,
+            # makes every word cost O(sentence length), because it strips words 1 at a time until it's a known state)
+            state = tuple(sentence[-window:])
+            if max_state_visits is not None:
+                state_visits[state] = visits = state_visits.get(state, 0) + 1
+                if visits >= max_state_visits:
+                    end = 'cycle'
+                    break
+
+            next_word = self._next_word(state, rng)
+
+        if trace:
+            trace('sentence_end', length=word_count, end=end)
         return sentence
 
-    def _next_word(self, last_words):
+    def _generate_sentence_from_flat(self, seed, trace=None, rng=random):
+        """ _generate_sentence_as_list(), on the FlatChain: with word ids, and states as keys (see `flat`)
+        """
+        flat = self.flat
+        max_words = self.max_words_per_sentence
+        max_state_visits = self.max_state_visits_per_sentence
+        window = self.window
+        state_visits = {}
+        special = flat.word_id(SPECIAL_TOKEN)
+        if special is None:
+            # (an empty db: there's nothing to follow the seed)
+            if trace:
+                trace('sentence_end', length=0, end='end_of_sentence')
+            return list(seed)
+
+        word_ids = [flat.word_id(word) for word in seed]
+        state_order, state_key = len(word_ids), flat.state_key(word_ids)
+        next_word = self._next_word_from_flat(state_order, state_key, special, rng, is_seed=True)
+        word_count = 0
+        end = 'end_of_sentence'
+        while next_word != special:
+            word_ids.append(next_word)
+            word_count += 1
+            if max_words is not None and word_count >= max_words:
+                end = 'max_words'
+                break
+
+            if state_order < window:
+                state_order += 1
+                state_key = flat.state_key(word_ids[-state_order:])
+            else:
+                state_key = flat.next_key(state_key, state_order, next_word)
+            if max_state_visits is not None:
+                # (keys of states of different lengths can be the same number, so those are told apart)
+                visit_key = state_key if state_order == window else (state_order, state_key)
+                state_visits[visit_key] = visits = state_visits.get(visit_key, 0) + 1
+                if visits >= max_state_visits:
+                    end = 'cycle'
+                    break
+
+            next_word = self._next_word_from_flat(state_order, state_key, special, rng)
+
+        if trace:
+            trace('sentence_end', length=word_count, end=end)
+        return [flat.word(word_id) for word_id in word_ids]
+
+    def _next_word_from_flat(self, order, key, special, rng, is_seed=False):
+        """ _next_word(), on the FlatChain. :return: word id
+        """
+        flat = self.flat
+        state = flat.find_state(order, key)
+        while state < 0:
+            order -= 1
+            if is_seed or not order:
+                return special
+            key = flat.suffix_key(key, order)
+            state = flat.find_state(order, key)
+
+        start, stop = flat.follower_range(order, state)
+        sample = rng.random()
+        # (same as _next_word: the 1st word whose probability, added to those before it, is at least the sample)
+        i = bisect.bisect_left(flat.cumulative_weights, sample, start, stop)
+        if i < stop:
+            return flat.follower_ids[i]
+        weights = flat.weights
+        best = max(xrange(start, stop), key=lambda j: (weights[j], -j)) if stop > start else None
+        return flat.follower_ids[best] if best is not None and weights[best] > 0 else special
+
+    def _next_word(self, last_words, rng=random):
         last_words = tuple(last_words)
         if last_words != self._special_ngram:
             while last_words not in self.db:
                 last_words = last_words[1:]
                 if not last_words:
                     return SPECIAL_TOKEN
-        probmap = self.db[last_words]
-        sample = random.random()
+        probmap = self.db.get(last_words, ())  # (not `self.db[...]`: reading must not insert, see freeze)
+        sample = rng.random()
         # (Comment from original:) since rounding errors might make us miss out on some words
         maxprob = 0.0
         maxprobword = SPECIAL_TOKEN
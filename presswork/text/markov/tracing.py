@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+""" tracing for the markov engines: structured events from inside the hot loops, costing ~nothing when off
+
+tracing is on when the "presswork.trace" logger is enabled for DEBUG. (by default it is not; see log/logging.yaml)
+
+engines ask for a tracer once, up front, *outside* their loops. when tracing is off, they get None, so each call site
+in a loop costs just a check of a local variable - no formatting, no logger calls:
+
+    >>> import logging
+    >>> disabled = logging.root.manager.disable; logging.disable(logging.NOTSET)   # (restored below)
+    >>> assert get_tracer('crude') is None   # off by default
+    >>> with capture_trace_events() as events:
+    ...     trace = get_tracer('crude')
+    ...     if trace:
+    ...         trace('step', sentence_number=0, next_word=u'foo')
+    >>> events
+    [TraceEvent('crude', 'step', {'next_word': u'foo', 'sentence_number': 0})]
+    >>> print events[0]
+    crude step next_word=u'foo' sentence_number=0
+    >>> logging.disable(disabled)
+
+events are logged as DEBUG records on the "presswork.trace" logger; the TraceEvent itself is on the record, as
+`record.trace_event`, for handlers that want the structure. (formatting to a message only happens if a handler
+actually formats the record; big values like whole models are abbreviated in the message.)
+"""
+import contextlib
+import logging
+from repr import Repr
+
+TRACE_LOGGER_NAME = "presswork.trace"
+
+logger = logging.getLogger(TRACE_LOGGER_NAME)
+
+_abbreviated = Repr()
+_abbreviated.maxstring = _abbreviated.maxother = 80
+
+
+class TraceEvent(object):
+    """ one structured event: which engine, what happened, and the details (`fields`, a dict)
+    """
+    __slots__ = ('engine', 'event', 'fields')
+
+    def __init__(self, engine, event, fields):
+        self.engine = engine
+        self.event = event
+        self.fields = fields
+
+    def __unicode__(self):
+        return u" ".join([self.engine, self.event] + [
+            u"{}={}".format(name, _abbreviated.repr(value)) for name, value in sorted(self.fields.items())])
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+    def __repr__(self):
+        return "TraceEvent({!r}, {!r}, {!r})".format(self.engine, self.event, self.fields)
+
+
+def get_tracer(engine):
+    """ :return: None if tracing is off. otherwise, a function `trace(event, **fields)` which logs a TraceEvent
+
+    call this once, before a loop, not inside it. (so turning tracing on/off takes effect on the next call)
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return None
+
+    def trace(event, **fields):
+        trace_event = TraceEvent(engine, event, fields)
+        logger.debug(u"%s", trace_event, extra={'trace_event': trace_event})
+
+    return trace
+
+
+class _TraceEventCollector(logging.Handler):
+    def __init__(self, events):
+        super(_TraceEventCollector, self).__init__(level=logging.DEBUG)
+        self.events = events
+
+    def emit(self, record):
+        trace_event = getattr(record, 'trace_event', None)
+        if trace_event is not None:
+            self.events.append(trace_event)
+
+
+@contextlib.contextmanager
+def capture_trace_events(events=None):
+    """ turn tracing on within the `with` block, collecting TraceEvents into a list (yielded) instead of logging them
+    """
+    events = [] if events is None else events
+    with trace_to(_TraceEventCollector(events)):
+        yield events
+
+
+@contextlib.contextmanager
+def trace_to(handler):
+    """ turn tracing on within the `with` block, with trace records going to `handler` only (not the usual handlers)
+    """
+    previous_level, previous_propagate = logger.level, logger.propagate
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    try:
+        yield handler
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(previous_level)
+        logger.propagate = previous_propagate
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+""" training & generating off the caller's thread, for event loops (or anything else that must not block)
+
+training on a big input takes seconds; generating lots of sentences can, too. in an event loop, that's seconds of
+nothing else getting done. this hands that work to an executor (default: a small thread pool) and returns
+futures (`concurrent.futures.Future`) - which event loops know how to wait on, without blocking:
+    * asyncio: `await asyncio.wrap_future(future)`. trollius: `yield From(asyncio.wrap_future(future))`.
+    * tornado: `yield future`, in a coroutine. twisted: `Deferred.fromFuture(future)`, or a done callback.
+
+    >>> import logging; logging.disable(logging.CRITICAL)
+    >>> future = create_text_maker(strategy='crude', input_text=u"Foo is better than bar. Bar is better than baz.")
+    >>> text_maker = future.result()
+    >>> batches = [batch_future.result() for batch_future in iter_sentence_futures(text_maker, 25, batch_size=10)]
+    >>> [len(batch) for batch in batches]
+    [10, 10, 5]
+
+generating is handed over in bounded batches (iter_sentence_futures): each is quick, so the caller can do other
+things (or stop) between them, and results come in as they're ready. training is 1 piece of work, on another thread.
+
+threads, not processes: the trained model stays in this process, ready to use. it means the thread running the
+event loop still shares the GIL with the training thread: while a big model trains, the loop usually gets to run
+within a fraction of a millisecond, though now and then a longer call (such as 1 regex on a long sentence, in a
+tokenizer) holds it up, for 10s of ms. (a loop *running* the training would be held up for all of it: seconds.)
+"""
+import threading
+
+from concurrent import futures
+
+from presswork.text import randomness
+from presswork.text import text_makers
+
+# sentences per batch, for iter_sentence_futures. (~10ms of work or less, for any strategy, on typical input)
+DEFAULT_BATCH_SIZE = 100
+
+# threads in the default executor. (training & generating hold the GIL, so more threads wouldn't get more done)
+DEFAULT_MAX_WORKERS = 2
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def default_executor():
+    """ :return: the executor used when none is given: a thread pool, shared, made on first use
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = futures.ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS)
+        return _default_executor
+
+
+def create_text_maker(executor=None, **kwargs):
+    """ like text_makers.create_text_maker(), but on the executor
+
+    :return: future of the TextMaker (trained, if input_text was given)
+    :rtype: concurrent.futures.Future
+    """
+    return (executor or default_executor()).submit(text_makers.create_text_maker, **kwargs)
+
+
+def input_text(text_maker, input_text, executor=None):
+    """ text_maker.input_text(input_text), on the executor. (don't use text_maker until it's done)
+
+    :return: future of what input_text() returns
+    :rtype: concurrent.futures.Future
+    """
+    return (executor or default_executor()).submit(text_maker.input_text, input_text)
+
+
+def iter_sentence_futures(text_maker, count, batch_size=DEFAULT_BATCH_SIZE, rng=None, executor=None):
+    """ make `count` sentences on the executor, in batches of up to batch_size
+
+    each batch is handed to the executor when the generator gets to it - so, if the caller waits on each batch
+    before going on, there's only ever 1 batch in the executor; and stopping early leaves no work behind.
+    each batch draws from its own substream of `rng` (split off in order), so the output doesn't depend on how many
+    batches run at once.
+
+    :param rng: seed or random.Random to split the substreams from. default: the TextMaker's rng (for this thread)
+    :return: (generator) futures, each of a batch of sentences (SentencesAsWordLists), in order
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1, got {!r}".format(batch_size))
+
+    executor = executor or default_executor()
+    rng = text_maker.rng if rng is None else randomness.make_rng(rng)
+    for start in xrange(0, count, batch_size):
+        substream, = randomness.split_rng(rng, 1)
+        yield executor.submit(text_maker.make_sentences, min(batch_size, count - start), rng=substream)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+""" generating lots of sentences on several cores: forked worker processes, sharing 1 trained model
+
+generation is CPU-bound, and in 1 process, on 1 core (threads can share a model, but not the GIL). so for bulk jobs
+(millions of sentences), make_sentences(count, workers=N) forks N worker processes instead. (or `presswork -j`.)
+
+    * the model isn't copied, pickled, or reloaded: the workers are forked after training, so they start out with it.
+        (pages are shared copy-on-write; CPython's reference counting dirties some of them, as a worker reads them.)
+    * the count is cut into chunks of CHUNK_SIZE sentences, each generated with its own rng substream
+        (see randomness.split_rng) - by whichever worker is free.
+    * results come back chunk by chunk, in order (iter_sentence_chunks); each chunk as soon as it's ready, after all
+        the chunks before it.
+
+so the output only depends on the rng and the count - not on the number of workers, nor the scheduling:
+
+    >>> import logging; logging.disable(logging.CRITICAL)
+    >>> from presswork.text import text_makers
+    >>> text_maker = text_makers.create_text_maker(input_text=u"Foo is better than bar. Bar is better than baz.")
+    >>> (make_sentences(text_maker, 25, workers=2, rng=3, chunk_size=10) ==
+    ...  make_sentences(text_maker, 25, workers=1, rng=3, chunk_size=10))
+    True
+
+needs `os.fork` (so, not on Windows).
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+
+from presswork.text import randomness
+from presswork.text.grammar.containers import SentencesAsWordLists
+
+logger = logging.getLogger("presswork")
+
+# sentences per chunk: small enough to spread the work & to start streaming soon, big enough that the per-chunk cost
+# (a task sent to a worker, sentences pickled back) stays small next to generating them
+CHUNK_SIZE = 2000
+
+# TextMakers that workers about to be forked will need, by id. (set just before forking; the workers inherit them.)
+_text_makers_for_workers = {}
+_text_makers_for_workers_lock = threading.Lock()
+
+
+def make_sentences(text_maker, count, workers, rng=None, chunk_size=CHUNK_SIZE):
+    """ :return: `count` sentences from a trained `text_maker`, generated by `workers` processes. (see module docstring)
+        :rtype: presswork.text.grammar.containers.SentencesAsWordLists
+    """
+    sentences = []
+    for chunk in iter_sentence_chunks(text_maker, count, workers, rng=rng, chunk_size=chunk_size):
+        sentences.extend(chunk)
+    return SentencesAsWordLists(sentences)
+
+
+def iter_sentence_chunks(text_maker, count, workers, rng=None, chunk_size=CHUNK_SIZE):
+    """ :return: (generator) `count` sentences from a trained `text_maker`, as lists of sentences (up to chunk_size
+        each), in order. the work is spread over `workers` forked processes. (with workers=1, it's all done right
+        here, but the same way: so the output is the same.)
+
+    :param rng: seed or random.Random to split the substreams from. default: the TextMaker's rng (for this thread)
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1, got {!r}".format(workers))
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1, got {!r}".format(chunk_size))
+    if workers > 1 and not text_maker.is_locked:
+        raise ValueError("nothing to generate from yet! call input_text() first")
+
+    chunk_counts = [chunk_size] * (count // chunk_size) + ([count % chunk_size] if count % chunk_size else [])
+    substreams = randomness.split_rng(text_maker.rng if rng is None else randomness.make_rng(rng), len(chunk_counts))
+
+    workers = min(workers, len(chunk_counts))
+    if workers <= 1:
+        for chunk_count, substream in itertools.izip(chunk_counts, substreams):
+            yield _make_chunk(text_maker, chunk_count, substream)
+        return
+
+    if not hasattr(os, 'fork'):
+        raise NotImplementedError("generating with worker processes needs os.fork(), which isn't available here")
+
+    key = id(text_maker)
+    with _text_makers_for_workers_lock:
+        _text_makers_for_workers[key] = text_maker
+        try:
+            pool = multiprocessing.Pool(processes=workers)
+        finally:
+            del _text_makers_for_workers[key]
+
+    logger.debug("generating {} sentences in {} chunks, with {} worker processes".format(
+            count, len(chunk_counts), workers))
+    try:
+        for chunk in pool.imap(_make_chunk_in_worker, [(key, chunk_count, substream) for chunk_count, substream
+                                                       in itertools.izip(chunk_counts, substreams)]):
+            yield chunk
+        pool.close()
+    finally:
+        # (if the caller stops early, or a worker fails, don't leave the rest of the workers generating)
+        pool.terminate()
+        pool.join()
+
+
+def _make_chunk(text_maker, count, rng):
+    return text_maker._make_sentences(count, rng).unwrap(copy=False)
+
+
+def _make_chunk_in_worker(task):
+    key, count, rng = task
+    return _make_chunk(_text_makers_for_workers[key], count, rng)
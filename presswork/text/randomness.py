@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+""" random number generators ("rng") for text making: one per TextMaker & joiner, seedable, and splittable
+
+generation & the random joiners draw only from their own rng - a `random.Random` - never from the global `random`.
+so a seed makes a TextMaker reproducible, and nothing is shared between instances (or workers) unless you share it.
+
+for parallel work, split_rng() makes independent substreams from one rng: give each worker its own, and the combined
+output is reproducible, however the work gets scheduled.
+
+threads sharing a TextMaker (or joiner) don't share its rng, either: see ThreadRngs.
+
+    >>> substreams = split_rng(make_rng(42), 3)
+    >>> again = split_rng(make_rng(42), 3)
+    >>> [substream.random() for substream in substreams] == [substream.random() for substream in again]
+    True
+    >>> len(set(substream.random() for substream in substreams))
+    3
+"""
+import random
+import thread
+import threading
+
+# bits of seed for each substream (Mersenne Twister has a huge state; 128 bits makes collisions a non-issue)
+_SUBSTREAM_SEED_BITS = 128
+
+
+def make_rng(seed_or_rng=None):
+    """
+    :param seed_or_rng: a `random.Random` (or anything like it) to use as-is; or else a seed (any hashable) for a new
+        `random.Random`. None seeds from the OS, as random.Random() does.
+
+        >>> make_rng(1).random() == make_rng(1).random()
+        True
+        >>> rng = random.Random(1)
+        >>> make_rng(rng) is rng
+        True
+    """
+    if callable(getattr(seed_or_rng, 'random', None)):
+        return seed_or_rng
+    return random.Random(seed_or_rng)
+
+
+def split_rng(rng, count):
+    """ :return: list of `count` new, independent rngs, seeded from `rng` (which advances). deterministic: rngs in
+        the same state split into the same substreams.
+    """
+    return [random.Random(rng.getrandbits(_SUBSTREAM_SEED_BITS)) for _ in xrange(count)]
+
+
+class ThreadRngs(object):
+    """ an rng for each thread: the thread that made this gets `rng` itself; any other thread gets its own substream.
+
+    so threads sharing 1 TextMaker never draw from the same rng. (a random.Random is safe to share, in that it won't
+    break; but then every draw is a hand-off between threads, and what each thread gets depends on the timing.)
+
+    each thread's substream is split off `rng` (see split_rng) on the thread's first draw. so given a seed, the set of
+    substreams is reproducible, though which thread gets which one depends on the scheduling - to decide that too, pass
+    each worker its own rng instead. (splitting draws from `rng`: so if the thread that made this draws at the same
+    time as others start, its own draws depend on the timing, too.)
+
+        >>> rngs = ThreadRngs(make_rng(3))
+        >>> rngs.get() is rngs.rng
+        True
+        >>> other_threads = []
+        >>> worker = threading.Thread(target=lambda: other_threads.append(rngs.get()))
+        >>> worker.start(); worker.join()
+        >>> other_threads[0] is rngs.rng
+        False
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self._owner = thread.get_ident()
+        self._split_lock = threading.Lock()
+        self._local = threading.local()
+
+    def get(self):
+        """ :return: the rng for the current thread
+        """
+        if thread.get_ident() == self._owner:
+            return self.rng
+        rng = getattr(self._local, 'rng', None)
+        if rng is None:
+            with self._split_lock:
+                rng = self._local.rng = split_rng(self.rng, 1)[0]
+        return rng
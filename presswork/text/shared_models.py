@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+""" trained models in shared memory: published by 1 process, generated from by any number of others
+
+a server with several worker processes (Flask app workers, several `presswork serve`s, ...) would otherwise have each
+one train, or load, its own copy of every model: N times the startup time, N times the memory. instead:
+    * 1 loader process trains (or loads) a model, and publish()es it under a name: the model, packed into flat arrays
+        (see markov.flat), written to a file in /dev/shm - which is memory, not disk.
+    * workers attach() to it by name: they map the file into memory, and generate straight from it. the model isn't
+        copied, or unpickled, or rebuilt: the pages are the same pages, in every process.
+    * publishing again under the same name (say, once the corpus is retrained) swaps the model atomically: the new
+        file is written aside, then renamed over the old one. SharedModel picks up the new model when it's next used;
+        whatever is generating from the old one already, finishes on the old one.
+    * an old model is freed once nothing uses it: SharedModel lets go of it when its last user is done, and the OS
+        keeps a replaced file's memory for as long as some process still has it mapped (and no longer).
+
+    >>> import logging, shutil, tempfile; logging.disable(logging.CRITICAL)
+    >>> from presswork.text import text_makers
+    >>> directory = tempfile.mkdtemp()
+    >>> text_maker = text_makers.create_text_maker(strategy='crude', input_text=u"Foo is better than bar.")
+    >>> path = publish(text_maker, "foo", directory=directory)
+    >>> attached = attach("foo", directory=directory)
+    >>> print attached.join(attached.make_sentences(1))
+    Foo is better than bar.
+    >>> shutil.rmtree(directory)
+
+an attached TextMaker generates just what the published one would, with the same rng. it's trained & locked, like a
+loaded one (see text_makers.load_text_maker); its stats, saving, etc work as usual. (pruning or merging it gives an
+in-process model, as usual, so that's best done before publishing.)
+
+the files are local to the machine (and go away on reboot, from /dev/shm). they're only as safe as the directory:
+workers trust what's in it, as they trust model files. needs mmap & ctypes (so, CPython), and a POSIX rename.
+
+a model has to fit in markov.flat's layout to be published: <vocabulary size> ** <ngram size> can't be more than
+FlatChain.MAX_KEYS (2**64, on 64-bit Linux). for a big corpus, that's ngram sizes up to ~3 or 4. a model that doesn't
+fit raises ModelTooBigToPublish - it can still be served the usual way, by each process loading its own copy.
+"""
+import contextlib
+import ctypes
+import cPickle
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from array import array
+
+from presswork.text import text_makers
+from presswork.text.markov.flat import FlatChain
+from presswork.text.markov.flat import FlatChainTooBig
+
+SHARED_MODEL_HEADER = "presswork shared model\n"
+SHARED_MODEL_FORMAT_VERSION = 1
+
+# /dev/shm is memory (tmpfs) on Linux; elsewhere, the temp directory is the nearest thing (files there are cached)
+DEFAULT_DIRECTORY = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+_METADATA_LENGTH = struct.Struct("<Q")
+_ALIGNMENT = 8
+
+_CTYPES_BY_TYPECODE = {
+    'c': ctypes.c_char, 'i': ctypes.c_int, 'l': ctypes.c_long, 'L': ctypes.c_ulong, 'd': ctypes.c_double}
+_TYPECODES_BY_CTYPE = {ctype: typecode for typecode, ctype in _CTYPES_BY_TYPECODE.iteritems()}
+
+
+def shared_model_path(name, directory=None):
+    """ :return: the path of the file a model published as `name` is in
+
+        >>> shared_model_path("bills", directory="/dev/shm")
+        '/dev/shm/presswork-bills.model'
+    """
+    if not _NAME_PATTERN.match(name):
+        raise ValueError("model names can only have letters, digits, '_', '-', '.' (not first); got {!r}".format(name))
+    return os.path.join(directory or DEFAULT_DIRECTORY, "presswork-{}.model".format(name))
+
+
+def publish(text_maker, name, directory=None):
+    """ put a trained TextMaker's model in shared memory, as `name`. replaces whatever was published as `name`, at once.
+
+    :param directory: where the file goes. default: DEFAULT_DIRECTORY. (publishers & workers must agree on it)
+    :return: the path of the file
+    :raises ModelTooBigToPublish: if the model's vocabulary is too big, for its ngram size (see module docstring)
+    """
+    if not text_maker.is_locked:
+        raise ValueError("can only publish a trained TextMaker (call input_text() first)")
+    path = shared_model_path(name, directory)
+
+    try:
+        model_parts = text_maker._shared_model_parts()
+    except FlatChainTooBig as e:
+        raise ModelTooBigToPublish("model {!r} is too big to publish ({}). try a smaller ngram size".format(name, e))
+
+    parts, arrays = {}, []
+    for part_name, part in sorted(model_parts.iteritems()):
+        if isinstance(part, FlatChain):
+            radix, flat_arrays = part.arrays()
+            parts[part_name] = radix
+            arrays.extend((part_name, array_name, values) for array_name, values in sorted(flat_arrays.iteritems()))
+        else:
+            parts[part_name] = None
+            arrays.append((part_name, None, part))
+
+    layout, offset = [], 0
+    for part_name, array_name, values in arrays:
+        typecode = _typecode_of(values)
+        layout.append((part_name, array_name, typecode, offset, len(values)))
+        offset = _aligned(offset + len(values) * ctypes.sizeof(_CTYPES_BY_TYPECODE[typecode]))
+
+    metadata = cPickle.dumps({
+        'version': SHARED_MODEL_FORMAT_VERSION,
+        'generation': _generation_of(path) + 1,
+        'strategy': text_maker.NICKNAME,
+        'ngram_size': text_maker.ngram_size,
+        'sentence_tokenizer': text_maker.sentence_tokenizer,
+        'parts': parts,
+        'layout': layout,
+    }, cPickle.HIGHEST_PROTOCOL)
+
+    # written aside, then renamed into place: so anyone opening `path` gets the old model or the new one, whole
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SHARED_MODEL_HEADER)
+            f.write(_METADATA_LENGTH.pack(len(metadata)))
+            f.write(metadata)
+            data_start = _aligned(f.tell())
+            for (part_name, array_name, values), (_, _, _, offset, _) in zip(arrays, layout):
+                f.write("\0" * (data_start + offset - f.tell()))
+                f.write(buffer(values))
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+def unpublish(name, directory=None):
+    """ take down the model published as `name`. (processes that have it attached can keep using it, until they let go)
+    """
+    os.remove(shared_model_path(name, directory))
+
+
+def attach(name, directory=None, joiner=None, rng=None):
+    """ :return: a TextMaker, generating from the model published as `name`, in shared memory. (see module docstring)
+        it stays on that model, even if another is published as `name` later; for following along, see SharedModel.
+
+    :param joiner: (optional) a joiner, or a nickname, like for create_text_maker(). (the joiner isn't published)
+    :param rng: (optional) seed, or random.Random, like for create_text_maker()
+    """
+    text_maker, generation, identity = _attach_file(shared_model_path(name, directory), joiner, rng)
+    return text_maker
+
+
+class ModelTooBigToPublish(ValueError):
+    """ raised by publish() if the model doesn't fit in shared memory's layout (see module docstring)
+    """
+
+
+class SharedModel(object):
+    """ a model published as `name`, attached - and attached again, each time it's published again.
+
+        >>> import logging, shutil, tempfile; logging.disable(logging.CRITICAL)
+        >>> directory = tempfile.mkdtemp()
+        >>> path = publish(text_makers.create_text_maker(input_text=u"Foo is better than bar."), "foo", directory)
+        >>> shared_model = SharedModel("foo", directory=directory)
+        >>> with shared_model.text_maker() as text_maker:
+        ...     print text_maker.join(text_maker.make_sentences(1))
+        Foo is better than bar.
+        >>> path = publish(text_makers.create_text_maker(input_text=u"Bar is better than baz."), "foo", directory)
+        >>> with shared_model.text_maker() as text_maker:
+        ...     print text_maker.join(text_maker.make_sentences(1))
+        Bar is better than baz.
+        >>> shared_model.generation
+        2
+        >>> shutil.rmtree(directory)
+
+    each text_maker() checks if the model has been published again (that's 1 os.stat) and if so, attaches the new one;
+    from then on, text_maker() gives the new one. (if it's been unpublished, it goes on with the one it has.)
+    users of an old one keep it until they're done with it (the `with` block ends); then it's let go.
+    (in_use tells how many users each model has.) thread-safe.
+    """
+
+    def __init__(self, name, directory=None, joiner=None, rng=None):
+        """
+        :param joiner: (optional) a joiner, or a nickname, for each attached TextMaker. (see attach)
+        :param rng: (optional) seed, or random.Random, for each attached TextMaker
+        """
+        self.name = name
+        self.path = shared_model_path(name, directory)
+        self._joiner = joiner
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._current = None
+        self._retired = []
+        self.refresh()
+
+    def refresh(self):
+        """ attach the model again, if it's been published again since last time. (text_maker() calls this)
+
+        :return: True if it was. (if it's been unpublished, the model attached already is kept: False)
+        """
+        try:
+            identity = _identity(os.stat(self.path))
+        except OSError:
+            if self._current is None:
+                raise
+            return False
+        with self._lock:
+            if self._current is not None and self._current.identity == identity:
+                return False
+            text_maker, generation, identity = _attach_file(self.path, self._joiner, self._rng)
+            if self._current is not None:
+                if self._current.users:
+                    self._retired.append(self._current)
+            self._current = _Attached(text_maker, generation, identity)
+            return True
+
+    @contextlib.contextmanager
+    def text_maker(self):
+        """ context manager: the TextMaker of the latest model published as `name` (see class docstring)
+        """
+        self.refresh()
+        with self._lock:
+            attached = self._current
+            attached.users += 1
+        try:
+            yield attached.text_maker
+        finally:
+            with self._lock:
+                attached.users -= 1
+                if not attached.users and attached in self._retired:
+                    self._retired.remove(attached)
+
+    @property
+    def generation(self):
+        """ how many times the model has been published (as of the one attached now): 1, 2, ...
+        """
+        return self._current.generation
+
+    @property
+    def in_use(self):
+        """ {generation: users}, of the models still attached: the latest one, and older ones still in use
+        """
+        with self._lock:
+            return {attached.generation: attached.users for attached in self._retired + [self._current]}
+
+
+class _Attached(object):
+    def __init__(self, text_maker, generation, identity):
+        self.text_maker = text_maker
+        self.generation = generation
+        self.identity = identity
+        self.users = 0
+
+
+def _attach_file(path, joiner, rng):
+    """ :return: (TextMaker, generation, identity) for the model file at `path`
+    """
+    with open(path, 'rb') as f:
+        metadata, data_start = _read_metadata(f, path)
+        identity = _identity(os.fstat(f.fileno()))
+        # (ACCESS_COPY: private to this process, so ctypes can view it - but never written to, so it stays shared)
+        memory = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    flat_arrays, parts = {}, {}
+    for part_name, array_name, typecode, offset, length in metadata['layout']:
+        values = _view(memory, data_start + offset, typecode, length)
+        if array_name is None:
+            parts[part_name] = values
+        else:
+            flat_arrays.setdefault(part_name, {})[array_name] = values
+    for part_name, radix in metadata['parts'].iteritems():
+        if radix is not None:
+            parts[part_name] = FlatChain.from_arrays(radix, flat_arrays[part_name])
+
+    text_maker = text_makers.create_text_maker(
+            strategy=metadata['strategy'],
+            sentence_tokenizer=metadata['sentence_tokenizer'],
+            joiner=joiner,
+            ngram_size=metadata['ngram_size'],
+            rng=rng)
+    text_maker._attach_shared_model_parts(parts)
+    text_maker._lock()
+    return text_maker, metadata['generation'], identity
+
+
+def _read_metadata(f, path):
+    """ :return: (metadata, where the arrays start), from the model file `f`. (raises ValueError if it isn't one)
+    """
+    if f.read(len(SHARED_MODEL_HEADER)) != SHARED_MODEL_HEADER:
+        raise ValueError("not a presswork shared model: {}".format(path))
+    length, = _METADATA_LENGTH.unpack(f.read(_METADATA_LENGTH.size))
+    metadata = cPickle.loads(f.read(length))
+    if metadata.get('version') != SHARED_MODEL_FORMAT_VERSION:
+        raise ValueError("shared model {} has format version {!r}, expected {!r}. publish it again".format(
+                path, metadata.get('version'), SHARED_MODEL_FORMAT_VERSION))
+    return metadata, _aligned(f.tell())
+
+
+def _generation_of(path):
+    """ :return: the generation of the model published at `path`, or 0 if there isn't one (or it can't be read)
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _read_metadata(f, path)[0]['generation']
+    except (IOError, OSError, ValueError, EOFError, cPickle.UnpicklingError, struct.error):
+        return 0
+
+
+def _view(memory, offset, typecode, length):
+    """ :return: the array at `offset` in `memory`: not a copy, a view. (it keeps `memory` alive, as long as it's used)
+    """
+    if not length:
+        return "" if typecode == 'c' else array(typecode)
+    return (_CTYPES_BY_TYPECODE[typecode] * length).from_buffer(memory, offset)
+
+
+def _typecode_of(values):
+    if isinstance(values, str):
+        return 'c'
+    if isinstance(values, array):
+        return values.typecode
+    return _TYPECODES_BY_CTYPE[values._type_]   # (an attached model's array, being published again)
+
+
+def _identity(stat_result):
+    """ what tells a file apart from the one that replaced it (at the same path)
+    """
+    return stat_result.st_dev, stat_result.st_ino
+
+
+def _aligned(offset):
+    return offset + (-offset % _ALIGNMENT)
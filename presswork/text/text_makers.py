@@ -55,18 +55,34 @@ design notes -- TextMaker and its collaborators
     * What about the collaborators? See `grammar` package, starting with grammar.__init__
 
 """
+import copy
+import cPickle
+import gc
 import logging
 
+import markovify
+
 from presswork import constants
 from presswork.text import clean
+from presswork.text import parallel
+from presswork.text import randomness
+from presswork.text import timings
 from presswork.text.grammar import joiners, tokenizers
-from presswork.text.grammar.containers import SentencesAsWordLists
+from presswork.text.grammar.containers import CompactSentencesAsWordLists, SentencesAsWordLists
 from presswork.text.markov import _crude_markov
+from presswork.text.markov import pruning
+from presswork.text.markov import stats
+from presswork.text.markov.flat import FlatChain, FlatStateValues
 from presswork.text.markov.thirdparty._markovify import MarkovifyLite
+from presswork.text.markov.thirdparty import _pymarkovchain
 from presswork.text.markov.thirdparty._pymarkovchain import PyMarkovChainForked
+from presswork.utils import deep_getsizeof
 
 logger = logging.getLogger("presswork")
 
+# sentences per piece of text, for iter_text(): ~ms to make, join & proofread, so the 1st piece is ready soon
+TEXT_CHUNK_SIZE = 100
+
 
 class BaseTextMaker(object):
     """ common-denominator interface for making text from a generative model - so far, from markov chain models
@@ -80,10 +96,17 @@ class BaseTextMaker(object):
         causes issues. additionally, changing ngram_size after calling input_text() could cause astonishment.
         Instead of allowing for some cases and denying for others, we just keep it consistent and safe.
 
+    Q:  Can threads share 1 TextMaker?
+    A:  Yes, once it's locked: make_sentences(), join() and proofread() can be called from many threads at once.
+        the locked model is read-only - generating never writes to it (not even by auto-vivifying a key) - and each
+        thread draws from its own rng (see `randomness.ThreadRngs`). prune() replaces the model whole, so threads
+        still generating get the old model or the new one, never a mix; but if that matters, don't prune while serving.
+
     See also: overall design notes at the header of the module, which covers TextMakers as well as collaborators.
     """
+    _WHOLE_NUMBER_COUNTS_ONLY = False
 
-    def __init__(self, ngram_size=constants.DEFAULT_NGRAM_SIZE, sentence_tokenizer=None, joiner=None):
+    def __init__(self, ngram_size=constants.DEFAULT_NGRAM_SIZE, sentence_tokenizer=None, joiner=None, rng=None):
         """
         :param ngram_size: N-gram size aka state size - see general Markov Chain info for explanation -
             this needs to be known both at the generate/load of the model (i.e. markov chain),
@@ -98,6 +121,9 @@ class BaseTextMaker(object):
 
         :param joiner: if not given, uses a default. this can be one of the joiners from the `grammar` package.
             or anything that implements `.join()` for a list of word-lists (same structure as sentence_tokenizer)
+
+        :param rng: (optional) seed, or random.Random, for generation to draw from. if not given, seeded from the OS.
+            each TextMaker has its own; none of them use the global `random`. (see `randomness`)
         """
         self._ngram_size = ngram_size
 
@@ -122,17 +148,58 @@ class BaseTextMaker(object):
         # Currently only plan to have the 1 strategy for proofreader, so not exposing via argument for now
         self.proofreader = clean.OutputProofreader()
 
+        self.rng = rng
+
         self._locked = False
 
-    def make_sentences(self, count):
+    @property
+    def rng(self):
+        """ the rng to draw from, in this thread. (see `randomness.ThreadRngs`)
+        """
+        return self._thread_rngs.get()
+
+    @rng.setter
+    def rng(self, rng):
+        self._thread_rngs = randomness.ThreadRngs(randomness.make_rng(rng))
+
+    def make_sentences(self, count, rng=None, workers=None):
         """ Do the thing! After TextMaker has been trained from input_text(), we can generate new sentences from it.
 
+        * base class make_sentences() is public and handles what is same for all variants (such as timing).
+        * each subclass implements _make_sentences(), private, implements the strategy. (may just adapt/forward)
+
         :param count: How many sentences to generate
+        :param rng: (optional) seed, or random.Random, to draw from for just this call, instead of self.rng (this
+            thread's rng).
+            for example, to generate in parallel, reproducibly: give each worker a substream, see randomness.split_rng.
+
+            >>> text_maker = create_text_maker(input_text=u"Foo is better than bar. Foo is better than baz.")
+            >>> substreams = randomness.split_rng(randomness.make_rng(7), 3)
+            >>> again = randomness.split_rng(randomness.make_rng(7), 3)
+            >>> ([text_maker.make_sentences(5, rng=substream) for substream in substreams] ==
+            ...  [text_maker.make_sentences(5, rng=substream) for substream in again])
+            True
+
+        :param workers: (optional) generate in this many forked worker processes, sharing the model - for big counts.
+            the output only depends on the rng & count, not on the number of workers: without workers, the same
+            chunks are generated right here, from the same substreams. (see `parallel` for details)
+
+            >>> text_maker.make_sentences(5, rng=3) == text_maker.make_sentences(5, rng=3, workers=2)
+            True
+
         :return: Sentences! Structured as a list of word-lists (list of token-lists).
             (Fun fact: The `set()` of tokens generated, will be a subset of the tokens from the input.)
         :rtype: presswork.text.grammar.containers.SentencesAsWordLists
         """
-        return NotImplementedError()
+        with timings.stage('generate') as timer:
+            sentences = parallel.make_sentences(self, count, workers=workers or 1, rng=rng)
+            timer.count(items=len(sentences))
+        return sentences
+
+    def _make_sentences(self, count, rng):
+        """ generate `count` sentences from the model, drawing from `rng`. (private; should contain the impl/adapter.)
+        """
+        raise NotImplementedError()
 
     def input_text(self, input_text):
         """ build a fresh model from input text. (does not generate text - call make_sentences() to generate text.)
@@ -149,12 +216,20 @@ class BaseTextMaker(object):
         if self.is_locked:
             raise TextMakerIsLockedException("locked! has input_text() already been called? (can only be called once)")
 
-        input_text = clean.CleanInputString(input_text)
+        with timings.stage('clean') as timer:
+            input_text = clean.CleanInputString(input_text)
+            timer.count(chars=len(input_text))
+
         sentences_as_word_lists = self.sentence_tokenizer.tokenize(input_text)
 
-        self._input_text(sentences_as_word_lists)
+        with timings.stage('build_model') as timer:
+            self._input_text(sentences_as_word_lists)
+            timer.count(items=len(sentences_as_word_lists))
         self._lock()
 
+        _log_model(self, u"{} built model, from {} sentences".format(
+                self.__class__.__name__, len(sentences_as_word_lists)))
+
         return sentences_as_word_lists
 
     def _input_text(self, sentences_as_word_lists):
@@ -165,6 +240,122 @@ class BaseTextMaker(object):
         """
         raise NotImplementedError()
 
+    def prune(self, min_count=None, top_k=None, max_bytes=None):
+        """ shrink the trained model by dropping rare transitions, and states left with none. (see `pruning` module)
+
+        * base class prune() is public and handles the policy & the memory budget, same for all variants.
+        * each subclass adapts its model to & from {state: {follower: count}}: _transition_counts(),
+            _load_transition_counts(); and _prune_transitions() applies pruning.prune_transitions() as fits it.
+
+            >>> lines = ["Simple is better than complex.", "Complex is better than complicated.",
+            ...          "Simple is better than complex.", "Flat is better than nested."]
+            >>> text_maker = create_text_maker(input_text=chr(10).join(lines), strategy="crude")
+            >>> report = text_maker.prune(min_count=2)
+            >>> report.states_removed, report.transitions_removed, report.bytes_saved > 0
+            (6, 10, True)
+            >>> print text_maker.join(text_maker.make_sentences(1))
+            Simple is better than complex.
+
+        :param min_count: (optional) drop transitions seen fewer than this many times
+        :param top_k: (optional) keep only this many of the most frequent followers of each state
+        :param max_bytes: (optional) memory budget for the model. after applying min_count & top_k, if the model is
+            still bigger, min_count is raised (step by step) until it fits - or until raising it any further would
+            leave nothing to generate from, in which case the model is left as small as it could get (with a warning).
+        :return: what was removed, and the memory saved
+        :rtype: presswork.text.markov.pruning.PruningReport
+        """
+        if not self.is_locked:
+            raise ValueError("nothing to prune yet! call input_text() first")
+
+        transitions = self._transition_counts()
+        states_before, transitions_before = len(transitions), pruning.count_transitions(transitions)
+        bytes_before = self._model_size()
+
+        pruned = self._prune_transitions(transitions, min_count=min_count, top_k=top_k)
+        self._load_transition_counts(pruned)
+        bytes_after = self._model_size()
+
+        while max_bytes is not None and bytes_after > max_bytes:
+            # skip straight to the next count that would actually remove something
+            next_min_count = min(count for counts in pruned.itervalues() for count in counts.itervalues()) + 1
+            try:
+                pruned = self._prune_transitions(transitions, min_count=next_min_count, top_k=top_k)
+            except pruning.PruningError:
+                logger.warning("could not prune model to fit in {} bytes, got it down to {} bytes (min_count={})"
+                               .format(max_bytes, bytes_after, min_count))
+                break
+            min_count = next_min_count
+            self._load_transition_counts(pruned)
+            bytes_after = self._model_size()
+
+        report = pruning.PruningReport(
+                states_before, len(pruned), transitions_before, pruning.count_transitions(pruned),
+                bytes_before, bytes_after, min_count=min_count, top_k=top_k)
+        logger.info(str(report))
+        return report
+
+    def _transition_counts(self):
+        """ :return: the model as {state: {follower: times seen}}. (private; adapter to the strategy's model)
+        """
+        raise NotImplementedError()
+
+    def _load_transition_counts(self, transitions):
+        """ replace the model with one built from {state: {follower: times seen}}. (private; adapter)
+        """
+        raise NotImplementedError()
+
+    def _prune_transitions(self, transitions, min_count, top_k):
+        """ pruning.prune_transitions(), with whatever the strategy needs. (private; adapter)
+        """
+        raise NotImplementedError()
+
+    def stats(self, exact_memory=False):
+        """ size & shape of the trained model: states, transitions, vocabulary, branching, memory. (see `stats` module)
+
+        by default the memory is estimated from a sample; exact_memory=True walks the whole model instead. either way,
+        counting states, transitions & branching walks all of it - a noticeable fraction of training, for a big model.
+        so it's on request only: `--stats` on the CLI, or this. (input_text() logs the stats at DEBUG, not at INFO)
+
+            >>> text_maker = create_text_maker(input_text="Foo is better than bar.", strategy="crude", ngram_size=2)
+            >>> model_stats = text_maker.stats()
+            >>> model_stats.states, model_stats.transitions, model_stats.vocabulary, model_stats.max_branching
+            (6, 6, 5, 1)
+            >>> assert model_stats.memory_bytes > 0
+
+        :rtype: presswork.text.markov.stats.ModelStats
+        """
+        if not self.is_locked:
+            raise ValueError("no model yet! call input_text() first")
+        return self._stats(exact_memory=exact_memory)
+
+    def _stats(self, exact_memory):
+        """ stats.model_stats(), with what the strategy keeps in its model. (private; adapter)
+        """
+        raise NotImplementedError()
+
+    def _model_objects(self):
+        """ :return: the object(s) holding the model, to measure its memory. (private; adapter)
+        """
+        raise NotImplementedError()
+
+    def _model_size(self):
+        return deep_getsizeof(self._model_objects())
+
+    def _prepare_for_fork(self):
+        """ put the model in a layout that reading it doesn't write to. (private; adapter. see prepare_for_fork)
+        """
+
+    def _shared_model_parts(self):
+        """ :return: {name: FlatChain or array}: the model, as flat parts that can be put in shared memory.
+            (private; adapter. see shared_models)
+        """
+        raise NotImplementedError()
+
+    def _attach_shared_model_parts(self, parts):
+        """ generate from `parts`, as from _shared_model_parts() - but views of shared memory, now. (private; adapter)
+        """
+        raise NotImplementedError()
+
     def join(self, sentences_as_word_lists):
         """ join back together to a string. convenience method, that simply forwards to `self.joiner.join()`
 
@@ -185,6 +376,33 @@ class BaseTextMaker(object):
         """
         return self.proofreader.proofread(text)
 
+    def iter_text(self, count, rng=None, joiner=None, chunk_size=TEXT_CHUNK_SIZE):
+        """ make `count` sentences, and join & proofread them, a chunk (of up to chunk_size sentences) at a time -
+        for streaming: the 1st piece of text is ready after 1 chunk, however big the count, and there's never more
+        than 1 chunk of sentences (or text) held at once.
+
+        the pieces add up to the whole text: each piece after the 1st starts with the joiner's between_sentences().
+        the sentences are the same as from parallel.iter_sentence_chunks (each chunk has its own substream of `rng`),
+        so they only depend on the rng, count & chunk size.
+
+            >>> import logging; logging.disable(logging.CRITICAL)
+            >>> text_maker = create_text_maker(strategy='crude', input_text=u"Foo is better than bar.", rng=1)
+            >>> pieces = list(text_maker.iter_text(5, chunk_size=2))
+            >>> len(pieces), u"".join(pieces).count(u"better")
+            (3, 5)
+            >>> list(text_maker.iter_text(5, rng=3, chunk_size=2)) == list(text_maker.iter_text(5, rng=3, chunk_size=2))
+            True
+
+        :param rng: seed or random.Random to split the substreams from. default: the TextMaker's rng (for this thread)
+        :param joiner: (optional) joiner to join with, instead of self.joiner
+        :return: (generator) pieces of text (unicode), in order
+        """
+        joiner = joiner or self.joiner
+        for i, chunk in enumerate(parallel.iter_sentence_chunks(self, count, workers=1, rng=rng,
+                                                                chunk_size=chunk_size)):
+            text = self.proofread(joiner.join(chunk))
+            yield text if i == 0 else (joiner.between_sentences() or u"") + text
+
     @property
     def ngram_size(self):
         return self._ngram_size
@@ -224,18 +442,63 @@ class TextMakerPyMarkovChain(BaseTextMaker):
     NICKNAME = 'pymc'
 
     def __init__(self, *args, **kwargs):
+        """ same as BaseTextMaker, plus these (optional) keyword arguments - see PyMarkovChainForked:
+
+        :param max_words_per_sentence: end a sentence once it's this long. default 100; None for no limit
+        :param max_state_visits_per_sentence: end a sentence once it's going in circles - once the same state comes
+            up this many times in it. default None (off): it can cut ordinary sentences short too
+        """
+        max_words_per_sentence = kwargs.pop(
+                'max_words_per_sentence', _pymarkovchain.DEFAULT_MAX_WORDS_PER_SENTENCE)
+        max_state_visits_per_sentence = kwargs.pop(
+                'max_state_visits_per_sentence', _pymarkovchain.DEFAULT_MAX_STATE_VISITS_PER_SENTENCE)
         super(TextMakerPyMarkovChain, self).__init__(*args, **kwargs)
         self.strategy = PyMarkovChainForked(
                 window=self.ngram_size,
-                db_file_path=None)
+                db_file_path=None,
+                max_words_per_sentence=max_words_per_sentence,
+                max_state_visits_per_sentence=max_state_visits_per_sentence)
 
     def _input_text(self, sentences_as_word_lists):
+        self.strategy.window = self.ngram_size   # (ngram_size can still be changed after __init__, until now)
         self.strategy.markov_chain(sentences_as_word_lists)
+        self.strategy.freeze()
 
-    def make_sentences(self, count):
-        result = self.strategy.make_sentences_list(number=count)
+    def _make_sentences(self, count, rng):
+        result = self.strategy.make_sentences_list(number=count, rng=rng)
         return SentencesAsWordLists(result)
 
+    def _transition_counts(self):
+        return self.strategy.transition_counts()
+
+    def _load_transition_counts(self, transitions):
+        self.strategy.load_transition_counts(transitions)
+
+    def _prune_transitions(self, transitions, min_count, top_k):
+        # no cascading here: when a state is missing, pymc backs off to a shorter one (or ends the sentence)
+        return pruning.prune_transitions(
+                transitions, min_count=min_count, top_k=top_k, start_state=self.strategy._special_ngram)
+
+    def _stats(self, exact_memory):
+        return stats.model_stats(self.strategy.iter_followers(), end=self.strategy.SPECIAL_TOKEN,
+                                 model=self._model_objects(), exact_memory=exact_memory)
+
+    def _model_objects(self):
+        flat = self.strategy.flat
+        return (flat if flat is not None else self.strategy.db), self.strategy.state_totals
+
+    def _prepare_for_fork(self):
+        _flatten(self.strategy)
+
+    def _shared_model_parts(self):
+        flat = self.strategy.flat
+        if flat is None:
+            flat = FlatChain(self.strategy.db)
+        return {'chain': flat, 'state_totals': self.strategy.flat_state_totals(flat)}
+
+    def _attach_shared_model_parts(self, parts):
+        self.strategy.flatten(parts['chain'], state_totals=FlatStateValues(parts['chain'], parts['state_totals']))
+
 
 class TextMakerCrude(BaseTextMaker):
     """ text maker using homegrown 'crude' implementation
@@ -243,20 +506,53 @@ class TextMakerCrude(BaseTextMaker):
     For most usages, the other strategies should be preferred. (why keep it around? see _crude_markov module header.)
     """
     NICKNAME = 'crude'
+    _WHOLE_NUMBER_COUNTS_ONLY = True   # (the model repeats a follower in a list, as many times as it was seen)
 
     def __init__(self, *args, **kwargs):
         super(TextMakerCrude, self).__init__(*args, **kwargs)
         self.strategy = _crude_markov
-        self._model = {}
+        self._model = self.strategy.CrudeMarkovModel(ngram_size=self.ngram_size)
 
     def _input_text(self, sentences_as_word_lists):
         self._model = self.strategy.crude_markov_chain(sentences_as_word_lists, ngram_size=self.ngram_size)
 
-    def make_sentences(self, count):
+    def _make_sentences(self, count, rng):
         iter_sentences_of_words = self.strategy.iter_make_sentences(
-                crude_markov_model=self._model, ngram_size=self.ngram_size, count=count)
+                crude_markov_model=self._model, ngram_size=self.ngram_size, count=count, rng=rng)
         return SentencesAsWordLists(iter_sentences_of_words)
 
+    def _transition_counts(self):
+        return self._model.transition_counts()
+
+    def _load_transition_counts(self, transitions):
+        self._model = self.strategy.CrudeMarkovModel.from_transition_counts(transitions, ngram_size=self.ngram_size)
+
+    def _prune_transitions(self, transitions, min_count, top_k):
+        return pruning.prune_transitions(
+                transitions, min_count=min_count, top_k=top_k, start_state=self._model.start_state,
+                end=self.strategy.END_SYMBOL, next_state=pruning.shift_state)
+
+    def _stats(self, exact_memory):
+        return stats.model_stats(self._model.itervalues(), end=self.strategy.END_SYMBOL,
+                                 model=self._model_objects(), exact_memory=exact_memory)
+
+    def _model_objects(self):
+        return self._model
+
+    def _prepare_for_fork(self):
+        self._model.freeze()
+
+    def _shared_model_parts(self):
+        model = self._model
+        if not isinstance(model, _crude_markov.FlatCrudeMarkovModel):
+            model = _crude_markov.FlatCrudeMarkovModel.from_model(model)
+        return dict(model.arrays(), followers=model.followers)
+
+    def _attach_shared_model_parts(self, parts):
+        self._model = _crude_markov.FlatCrudeMarkovModel(
+                parts['followers'], parts['viable_starts'], parts['viable_ids'], parts['steps_to_end'],
+                ngram_size=self.ngram_size)
+
 
 class TextMakerMarkovify(BaseTextMaker):
     """ text maker using `markovify` lib (behind an adapter). this is the first strategy to reach for!
@@ -279,23 +575,67 @@ class TextMakerMarkovify(BaseTextMaker):
 
     def _input_text(self, sentences_as_word_lists):
         # markovify is strict about its input being exactly `list` of `list` (duck typing not allowed), so we convert.
+        # (tokenizers hold plain lists inside their containers, so usually this hands over the very same list, no copy)
+        # markovify also holds on to its input. a compact corpus only gets unwrapped for training, and is what it holds.
+        corpus_to_hold = sentences_as_word_lists if isinstance(sentences_as_word_lists, CompactSentencesAsWordLists) \
+            else None
         if hasattr(sentences_as_word_lists, 'unwrap'):
-            sentences_as_word_lists = sentences_as_word_lists.unwrap()
+            sentences_as_word_lists = sentences_as_word_lists.unwrap(copy=False)
 
         if not sentences_as_word_lists:
             # 'empty' SentencesAsWordList could be [[]] or []; other strategies don't care. markovify rejects [] though
             sentences_as_word_lists = [[]]
 
         self.strategy = MarkovifyLite(
-                state_size=constants.DEFAULT_NGRAM_SIZE,
-                parsed_sentences=sentences_as_word_lists)
+                state_size=self.ngram_size,
+                chain=markovify.Chain(sentences_as_word_lists, self.ngram_size),
+                parsed_sentences=corpus_to_hold if corpus_to_hold is not None else sentences_as_word_lists)
 
-    def make_sentences(self, count):
+    def _make_sentences(self, count, rng):
         sentences = []
         for i in xrange(0, count):
-            sentences.append(self.strategy.make_sentence())
+            sentences.append(self.strategy.make_sentence(rng=rng))
         return SentencesAsWordLists(sentences)
 
+    def _transition_counts(self):
+        return self.strategy.transition_counts()
+
+    def _load_transition_counts(self, transitions):
+        if self.strategy is None:
+            # (not trained, so no strategy yet - see __init__. as when merging: build it from the counts instead)
+            self.strategy = MarkovifyLite(
+                    state_size=self.ngram_size, chain=markovify.Chain(None, self.ngram_size, model=transitions))
+        else:
+            self.strategy.load_transition_counts(transitions)
+
+    def _prune_transitions(self, transitions, min_count, top_k):
+        return pruning.prune_transitions(
+                transitions, min_count=min_count, top_k=top_k, start_state=self.strategy.begin_state,
+                end=markovify.chain.END, next_state=pruning.shift_state)
+
+    def _stats(self, exact_memory):
+        return stats.model_stats(self.strategy.transition_counts().itervalues(), end=markovify.chain.END,
+                                 model=self._model_objects(), exact_memory=exact_memory)
+
+    def _model_objects(self):
+        flat = self.strategy.flat
+        return flat if flat is not None else self.strategy.chain
+
+    def _prepare_for_fork(self):
+        # (markovify keeps the tokenized input text, but only needs it for what this adapter disables)
+        self.strategy.parsed_sentences = None
+        _flatten(self.strategy)
+
+    def _shared_model_parts(self):
+        flat = self.strategy.flat
+        return {'chain': flat if flat is not None else FlatChain(self.strategy.chain.model)}
+
+    def _attach_shared_model_parts(self, parts):
+        begin_state = (markovify.chain.BEGIN,) * self.ngram_size
+        self.strategy = MarkovifyLite(state_size=self.ngram_size, chain=markovify.Chain(
+                None, self.ngram_size, model={begin_state: {markovify.chain.END: 1}}))
+        self.strategy.flatten(parts['chain'])
+
 
 # ====================================================================================================
 
@@ -320,6 +660,9 @@ def create_text_maker(
         joiner=None,
         input_text=None,
         ngram_size=constants.DEFAULT_NGRAM_SIZE,
+        rng=None,
+        compact_corpus=False,
+        **text_maker_options
 ):
     """ Convenience factory to just "gimme a text maker" without knowing exact module layout. nicknames supported.
 
@@ -333,8 +676,23 @@ def create_text_maker(
     :param joiner: (optional) an instance of joiner - or a nickname such as 'just_whitespace', 'moses'
     :param input_text: (optional) the input text to load into the TextMaker class.
         (if not given, can be loaded later load it later.)
+    :param compact_corpus: (optional) tokenize the input text to a CompactSentencesAsWordLists, a fraction of the
+        memory. same sentences, same results; worth it for big corpora, and for long-lived text makers (markovify
+        holds on to the tokenized input). a sentence_tokenizer instance is copied, not changed.
+    :param text_maker_options: (optional) any more keyword arguments are for the strategy's class; such as pymc's
+        max_words_per_sentence, max_state_visits_per_sentence (see TextMakerPyMarkovChain)
+    :param rng: (optional) seed, or random.Random, for the TextMaker to draw from. a joiner created from a nickname
+        gets a substream of it. so with a seed, text making is reproducible end to end:
+
+        >>> def make_text(seed):
+        ...     text_maker = create_text_maker(input_text=u"Foo is better than bar. Bar is better than baz.",
+        ...                                    joiner="random_enjamb", rng=seed)
+        ...     return text_maker.join(text_maker.make_sentences(20))
+        >>> make_text(seed=3) == make_text(seed=3)
+        True
     """
-    text_maker_kwargs = {}
+    text_maker_kwargs = dict(text_maker_options)
+    rng = randomness.make_rng(rng)
 
     ngram_size = int(ngram_size)
 
@@ -347,26 +705,253 @@ def create_text_maker(
 
     if sentence_tokenizer:
         if isinstance(sentence_tokenizer, basestring) or hasattr(sentence_tokenizer, 'lower'):
-            sentence_tokenizer = tokenizers.create_sentence_tokenizer(sentence_tokenizer)
+            sentence_tokenizer = tokenizers.create_sentence_tokenizer(sentence_tokenizer, compact=compact_corpus)
+        elif compact_corpus:
+            sentence_tokenizer = copy.copy(sentence_tokenizer)
+            sentence_tokenizer.container_class = CompactSentencesAsWordLists
 
         text_maker_kwargs["sentence_tokenizer"] = sentence_tokenizer
+    elif compact_corpus:
+        # (same default as the TextMaker classes)
+        text_maker_kwargs["sentence_tokenizer"] = tokenizers.create_sentence_tokenizer("just_whitespace", compact=True)
 
     if joiner:
         if isinstance(joiner, basestring) or hasattr(joiner, 'lower'):
-            joiner = joiners.create_joiner(joiner)
+            joiner = joiners.create_joiner(joiner, rng=randomness.split_rng(rng, 1)[0])
 
         text_maker_kwargs["joiner"] = joiner
 
-    text_maker = ATextMakerClass(ngram_size=ngram_size, **text_maker_kwargs)
+    text_maker = ATextMakerClass(ngram_size=ngram_size, rng=rng, **text_maker_kwargs)
 
     if input_text is not None:
-        # CleanInputString 'memoizes' to avoid redundant cleaning - so it's no problem to call redundantly
-        input_text = clean.CleanInputString(input_text)
+        # (input_text() cleans the input, there's no need to here)
         text_maker.input_text(input_text)
 
     return text_maker
 
 
+def merge_text_makers(text_makers_to_merge, weights=None, joiner=None, rng=None):
+    """ combine trained TextMakers into a new one, as if it had been trained on all of their input text. no retraining:
+    it adds up the models' counts, so it costs time proportional to the size of the models, not of the input text.
+
+        >>> foo = create_text_maker(input_text="Foo is better than bar.", strategy="pymc")
+        >>> baz = create_text_maker(input_text="Baz is better than quux.", strategy="pymc")
+        >>> merged = merge_text_makers([foo, baz])
+        >>> for text in sorted(set(merged.join([sentence]) for sentence in merged.make_sentences(100))): print text
+        Baz is better than bar.
+        Baz is better than quux.
+        Foo is better than bar.
+        Foo is better than quux.
+
+    the TextMakers must all be trained, and all the same: same strategy, same ngram_size, same kind of tokenizer.
+    the new one gets the first one's tokenizer; and a joiner of its own, of the same kind as the first one's.
+
+    :param text_makers_to_merge: 2 or more trained TextMakers (1 is fine too; it gets copied)
+    :param weights: (optional) one per TextMaker: its counts are multiplied by this, before adding up. say, weights
+        [2, 1] to treat the 1st one's input text as if it was there twice. (for 'crude', only whole numbers)
+    :param joiner: (optional) a joiner, or a nickname, like for create_text_maker(). if not given, a new one of the
+        same kind as the first one's (or the default joiner, if that isn't one of the nicknamed kinds)
+    :param rng: (optional) seed, or random.Random, like for create_text_maker()
+    :return: a new TextMaker, trained and locked
+    """
+    text_makers_to_merge = list(text_makers_to_merge)
+    if not text_makers_to_merge:
+        raise ValueError("nothing to merge")
+    if weights is None:
+        weights = [1] * len(text_makers_to_merge)
+    else:
+        weights = list(weights)
+    _check_mergeable(text_makers_to_merge, weights)
+
+    merged_transitions = {}
+    for text_maker, weight in zip(text_makers_to_merge, weights):
+        for state, counts in text_maker._transition_counts().iteritems():
+            merged_counts = merged_transitions.get(state)
+            if merged_counts is None:
+                merged_transitions[state] = merged_counts = {}
+            for follower, count in counts.iteritems():
+                merged_counts[follower] = merged_counts.get(follower, 0) + count * weight
+
+    first = text_makers_to_merge[0]
+    merged = create_text_maker(
+            strategy=first.__class__,
+            sentence_tokenizer=first.sentence_tokenizer,
+            joiner=joiner or joiners.nickname_of(first.joiner),
+            ngram_size=first.ngram_size,
+            rng=rng)
+    merged._load_transition_counts(merged_transitions)
+    merged._lock()
+
+    _log_model(merged, u"merged {} models".format(len(text_makers_to_merge)))
+    return merged
+
+
+def _check_mergeable(text_makers_to_merge, weights):
+    first = text_makers_to_merge[0]
+    for text_maker in text_makers_to_merge:
+        if not text_maker.is_locked:
+            raise ValueError("can only merge trained TextMakers (call input_text() first)")
+        if text_maker.__class__ is not first.__class__:
+            raise ValueError("can't merge different strategies: {} and {}".format(
+                    first.__class__.__name__, text_maker.__class__.__name__))
+        if text_maker.ngram_size != first.ngram_size:
+            raise ValueError("can't merge models of different ngram_size: {} and {}".format(
+                    first.ngram_size, text_maker.ngram_size))
+        if _tokenizer_kind(text_maker) != _tokenizer_kind(first):
+            raise ValueError("can't merge models from different tokenizers: {} and {}".format(
+                    _tokenizer_kind(first), _tokenizer_kind(text_maker)))
+
+    if len(weights) != len(text_makers_to_merge):
+        raise ValueError("need 1 weight per TextMaker, got {} for {}".format(len(weights), len(text_makers_to_merge)))
+    if not all(weight > 0 for weight in weights):
+        raise ValueError("weights must be positive, got {!r}".format(weights))
+    if first._WHOLE_NUMBER_COUNTS_ONLY and not all(weight == int(weight) for weight in weights):
+        raise ValueError("{} models can only be merged with whole-number weights, got {!r}".format(
+                first.__class__.__name__, weights))
+
+
+def _tokenizer_kind(text_maker):
+    """ what decides how text was tokenized: the class of sentence tokenizer, and of the word tokenizer it uses
+    """
+    sentence_tokenizer = text_maker.sentence_tokenizer
+    return (sentence_tokenizer.__class__.__name__,
+            getattr(sentence_tokenizer, 'word_tokenizer', None).__class__.__name__)
+
+
+MODEL_FILE_HEADER = "presswork model\n"
+MODEL_FILE_FORMAT_VERSION = 1
+
+
+def save_text_maker(text_maker, filename):
+    """ save a trained TextMaker's model to a file, to load it later (load_text_maker) and generate, without retraining.
+
+        >>> import os, shutil, tempfile
+        >>> directory = tempfile.mkdtemp()
+        >>> filename = os.path.join(directory, "foo.model")
+        >>> save_text_maker(create_text_maker(input_text="Foo is better than bar.", strategy="crude"), filename)
+        >>> loaded = load_text_maker(filename)
+        >>> loaded.__class__.__name__, loaded.ngram_size, loaded.is_locked
+        ('TextMakerCrude', 2, True)
+        >>> print loaded.join(loaded.make_sentences(1))
+        Foo is better than bar.
+        >>> shutil.rmtree(directory)
+
+    what gets saved: the strategy, ngram_size, the sentence tokenizer (so a loaded model can still be merged with
+    others from the same kind of tokenizer), and the model, as {state: {follower: count}}. not the joiner: that's
+    given when loading, so the same model can be joined any way.
+
+    the file is a pickle: only load model files you trust.
+    """
+    if not text_maker.is_locked:
+        raise ValueError("can only save a trained TextMaker (call input_text() first)")
+
+    model_file_contents = {
+        'version': MODEL_FILE_FORMAT_VERSION,
+        'strategy': text_maker.NICKNAME,
+        'ngram_size': text_maker.ngram_size,
+        'sentence_tokenizer': text_maker.sentence_tokenizer,
+        'transitions': text_maker._transition_counts(),
+    }
+    with open(filename, 'wb') as f:
+        f.write(MODEL_FILE_HEADER)
+        cPickle.dump(model_file_contents, f, cPickle.HIGHEST_PROTOCOL)
+
+
+def load_text_maker(filename, joiner=None, rng=None):
+    """ load a TextMaker saved by save_text_maker(). it comes back trained (& locked), ready to make_sentences()
+
+    :param joiner: (optional) a joiner, or a nickname, like for create_text_maker()
+    :param rng: (optional) seed, or random.Random, like for create_text_maker()
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MODEL_FILE_HEADER)) != MODEL_FILE_HEADER:
+            raise ValueError("not a presswork model file: {}".format(filename))
+        model_file_contents = cPickle.load(f)
+
+    if model_file_contents.get('version') != MODEL_FILE_FORMAT_VERSION:
+        raise ValueError("model file {} has format version {!r}, expected {!r}. rebuild it from the input text".format(
+                filename, model_file_contents.get('version'), MODEL_FILE_FORMAT_VERSION))
+
+    text_maker = create_text_maker(
+            strategy=model_file_contents['strategy'],
+            sentence_tokenizer=model_file_contents['sentence_tokenizer'],
+            joiner=joiner,
+            ngram_size=model_file_contents['ngram_size'],
+            rng=rng)
+    text_maker._load_transition_counts(model_file_contents['transitions'])
+    text_maker._lock()
+
+    _log_model(text_maker, u"loaded model from {}".format(filename))
+    return text_maker
+
+
+def prepare_for_fork(*text_makers_to_prepare):
+    """ for a server that loads models, then forks worker processes (such as a pre-fork WSGI server, preloading):
+    call this once the models are loaded (and pruned, merged, etc), right before forking.
+
+    forked workers share the models' memory with the parent, copy-on-write: until a worker writes to a memory page,
+    it's not copied. reading a model writes, though! looking up a state, going over its followers, bumps reference
+    counts - on the state, the words, the numbers - and Python's cyclic GC walks (& marks) every object it tracks.
+    so a worker generating from a model soon has its own copy of most of it.
+
+    this puts the models in a layout that reading doesn't write to, where the strategy allows it:
+        * markovify, pymc: the model is packed into flat arrays of numbers (see markov.flat.FlatChain); generating
+            reads the arrays, and only creates (& writes to) the few objects it needs as it goes. it also takes a
+            fraction of the memory. (what isn't needed to generate is let go: the tokenized input, for markovify)
+        * crude: followers become tuples, not lists, so the GC stops walking them - but the states & words are
+            still Python objects, so this helps less
+        * then a full collection, once, here: so the GC stops tracking what it doesn't need to (it only finds out,
+            by collecting)
+    the output is the same as before (same rng, same sentences); so are transition counts, saving, stats.
+
+    measured on a 4MB input (ngram_size=2), a forked worker's private memory after 2k sentences, before -> after:
+    markovify 8.9MB -> 5.9MB, pymc 14.9MB -> 8.3MB, crude about the same (~40MB). (the rest is mostly the
+    interpreter's own objects, touched by any work at all.)
+
+        >>> text_maker = create_text_maker(input_text=u"Foo is better than bar.", strategy='crude')
+        >>> prepare_for_fork(text_maker)
+        >>> gc.is_tracked(text_maker._model[text_maker._model.start_state])
+        False
+
+    (this is as near as Python 2 gets to Python 3's gc.freeze() - which would also cover all the *other* objects)
+    """
+    for text_maker in text_makers_to_prepare:
+        if not text_maker.is_locked:
+            raise ValueError("nothing to prepare yet! call input_text() first")
+        text_maker._prepare_for_fork()
+    gc.collect()
+
+
+def _flatten(strategy):
+    """ strategy.flatten(), if the model can be flattened. (if not, it stays as it is, which works just the same)
+    """
+    if strategy.flat is not None:
+        return
+    try:
+        strategy.flatten()
+    except ValueError as e:
+        logger.warning(u"could not flatten the model, leaving it as it is: {}".format(e))
+
+
+def is_model_file(filename):
+    """ :return: True if `filename` is a model file saved by save_text_maker() (False for anything else, such as text)
+    """
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MODEL_FILE_HEADER)) == MODEL_FILE_HEADER
+    except IOError:
+        return False
+
+
+def _log_model(text_maker, message):
+    """ log `message` at INFO; with the model's stats at DEBUG only. (stats walk the whole model: for a big model,
+    that's a noticeable fraction of building it. use --stats, or text_maker.stats(), to see them otherwise)
+    """
+    logger.info(message)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(u"{}: {}".format(message, text_maker._stats(exact_memory=False)))
+
+
 class TextMakerIsLockedException(ValueError):
     """ raise if caller tries to mutate TextMaker input text/state size/ etc after it is already loaded & locked
     """
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+""" opt-in timing of each stage of the text pipeline: where does the time go, for a given input and strategy?
+
+the stages, in pipeline order (see STAGES):
+
+    * clean             - CleanInputString on the input text. chars = length of the cleaned text
+    * split_sentences   - sentence tokenizer splitting text to sentence-strings. items = sentences
+    * tokenize_words    - word tokenizer on each sentence-string. items = tokens
+    * build_model       - training the strategy on the tokenized text. items = sentences in
+    * generate          - make_sentences(). items = sentences out
+    * join              - joiner. items = sentences in, chars = length of the text out
+    * proofread         - OutputProofreader. chars = length of the text out
+
+nothing is timed unless some "sink" is listening. a sink is any callable that takes a StageTiming.
+TimingsRecorder is a sink which keeps them all, and can total them up and report. most convenient is collect_timings:
+
+    >>> import logging; logging.disable(logging.CRITICAL)
+    >>> from presswork.text import text_makers
+    >>> with collect_timings() as timings:
+    ...     text_maker = text_makers.create_text_maker(input_text=u"Foo is better than bar." + chr(10) + u"Bar is.")
+    ...     text = text_maker.proofread(text_maker.join(text_maker.make_sentences(3)))
+    >>> [timing.stage for timing in timings]
+    ['clean', 'split_sentences', 'tokenize_words', 'build_model', 'generate', 'join', 'proofread']
+    >>> totals = timings.totals()
+    >>> totals['split_sentences'].items, totals['tokenize_words'].items, totals['generate'].items
+    (2, 7, 3)
+    >>> assert totals['join'].chars == len(text)
+    >>> assert all(timing.seconds >= 0 for timing in timings)
+    >>> assert "tokenize_words" in timings.report()
+
+when disabled (no sinks), stage() hands back one shared no-op object, so an instrumented call site costs about
+one function call. either way, it yields something to call count() on, so call sites never need to check:
+
+    >>> with stage('generate') as timer:
+    ...     timer.count(items=3)
+    >>> stage('generate') is stage('join')
+    True
+
+(counts should be cheap, like len(). a count that costs something belongs in code that only runs if is_enabled(),
+like the sentence tokenizers' _tokenize_timed().)
+
+sinks are process-wide, like logging handlers: while one is added, it hears about all stages, from all threads.
+"""
+import collections
+import contextlib
+import logging
+import timeit
+
+logger = logging.getLogger("presswork")
+
+STAGES = ('clean', 'split_sentences', 'tokenize_words', 'build_model', 'generate', 'join', 'proofread')
+
+_sinks = []
+
+
+class StageTiming(collections.namedtuple('StageTiming', ['stage', 'seconds', 'items', 'chars'])):
+    """ what one run of one stage took. `items` and `chars` are None for stages that don't count them
+    """
+    __slots__ = ()
+
+    @property
+    def items_per_sec(self):
+        return self.items / self.seconds if (self.items is not None and self.seconds) else None
+
+    @property
+    def chars_per_sec(self):
+        return self.chars / self.seconds if (self.chars is not None and self.seconds) else None
+
+
+class _StageTimer(object):
+    """ times one stage, then hands the StageTiming to every sink. (only created when there is a sink)
+    """
+    __slots__ = ('stage', 'items', 'chars', '_start')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.items = None
+        self.chars = None
+        self._start = None
+
+    def count(self, items=None, chars=None):
+        if items is not None:
+            self.items = items
+        if chars is not None:
+            self.chars = chars
+
+    def __enter__(self):
+        self._start = timeit.default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = timeit.default_timer() - self._start
+        if exc_type is None:
+            emit(StageTiming(self.stage, seconds, self.items, self.chars))
+        return False
+
+
+class _NotTiming(object):
+    """ stand-in for _StageTimer when nothing is listening. does nothing
+    """
+    __slots__ = ()
+
+    def count(self, items=None, chars=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOT_TIMING = _NotTiming()
+
+
+def stage(name):
+    """ context manager timing the stage `name`; call `.count(items=..., chars=...)` on it, inside the block
+
+    :param name: one of STAGES (not enforced; sinks will get whatever name is given)
+    """
+    if not _sinks:
+        return _NOT_TIMING
+    return _StageTimer(name)
+
+
+def is_enabled():
+    return bool(_sinks)
+
+
+def emit(timing):
+    for sink in list(_sinks):
+        sink(timing)
+
+
+def add_sink(sink):
+    """ :param sink: any callable taking a StageTiming
+    """
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    _sinks.remove(sink)
+
+
+@contextlib.contextmanager
+def collect_timings(sink=None):
+    """ within the `with` block, time all stages, sending them to `sink` (default: a new TimingsRecorder, yielded)
+    """
+    if sink is None:
+        sink = TimingsRecorder()
+    add_sink(sink)
+    try:
+        yield sink
+    finally:
+        remove_sink(sink)
+
+
+def log_timing(timing):
+    """ sink that just logs each timing (at INFO)
+    """
+    logger.info(u"timing: {0.stage} took {0.seconds:.6f}s (items={0.items}, chars={0.chars})".format(timing))
+
+
+class TimingsRecorder(object):
+    """ sink that keeps every StageTiming it gets, in order. can total them per stage, and report as a table
+    """
+
+    def __init__(self):
+        self.timings = []
+
+    def __call__(self, timing):
+        self.timings.append(timing)
+
+    def __iter__(self):
+        return iter(self.timings)
+
+    def __len__(self):
+        return len(self.timings)
+
+    def totals(self):
+        """ :return: OrderedDict of {stage: StageTiming summed over every run of that stage}, in pipeline order
+        """
+        totals = collections.OrderedDict()
+        for timing in sorted(self.timings, key=_pipeline_order):
+            previous = totals.get(timing.stage)
+            if previous is None:
+                totals[timing.stage] = timing
+            else:
+                totals[timing.stage] = StageTiming(
+                        timing.stage, previous.seconds + timing.seconds,
+                        _add_counts(previous.items, timing.items), _add_counts(previous.chars, timing.chars))
+        return totals
+
+    def report(self):
+        """ :return: the per-stage totals as a plaintext table
+        """
+        lines = [u"{:<16}{:>12}{:>12}{:>14}{:>12}{:>14}".format(
+                u"stage", u"seconds", u"items", u"items/sec", u"chars", u"chars/sec")]
+        for timing in self.totals().values():
+            lines.append(u"{:<16}{:>12.6f}{:>12}{:>14}{:>12}{:>14}".format(
+                    timing.stage, timing.seconds,
+                    _format_count(timing.items), _format_count(timing.items_per_sec),
+                    _format_count(timing.chars), _format_count(timing.chars_per_sec)))
+        return u"\n".join(lines)
+
+
+def _pipeline_order(timing):
+    return STAGES.index(timing.stage) if timing.stage in STAGES else len(STAGES)
+
+
+def _add_counts(a, b):
+    if a is None or b is None:
+        return a if b is None else b
+    return a + b
+
+
+def _format_count(count):
+    return u"-" if count is None else u"{:.0f}".format(count)
@@ -1,4 +1,7 @@
 import collections
+import itertools
+import sys
+import types
 
 
 def iter_flatten(lst):
@@ -20,3 +23,115 @@ def iter_flatten(lst):
                 yield sub
         else:
             yield element
+
+
+def deep_getsizeof(obj, seen=None):
+    """ approximate memory used by `obj` and everything it holds, in bytes. (sys.getsizeof only counts the container)
+
+    walks containers (dicts incl. defaultdicts etc, lists, tuples, sets) and instances' `__dict__`; counts each object
+    once, even if it is referenced from many places (interned strings, say, or a state tuple reused as a key)
+
+    >>> import sys
+    >>> deep_getsizeof([]) == sys.getsizeof([])
+    True
+    >>> words = [u"a", u"b"]
+    >>> deep_getsizeof(words) == sys.getsizeof(words) + sys.getsizeof(u"a") + sys.getsizeof(u"b")
+    True
+    >>> deep_getsizeof([words, words]) == sys.getsizeof([words, words]) + deep_getsizeof(words)
+    True
+
+    :param seen: (optional) set of ids of objects already counted, to skip. (it gets updated)
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.iterkeys())
+            stack.extend(current.itervalues())
+        elif isinstance(current, _SEQUENCES_AND_SETS):
+            stack.extend(current)
+
+        if _has_instance_dict(current):
+            stack.append(current.__dict__)
+    return total
+
+
+def estimate_deep_getsizeof(obj, sample_size=1000):
+    """ estimate of deep_getsizeof(obj), walking only a sample of each big container. O(sample_size) per container
+    with more than sample_size items, instead of O(everything).
+
+    each big container gets its size, plus the sizes of the first `sample_size` of its items (in iteration order,
+    which for dicts & sets is roughly arbitrary) and all they hold, scaled up to all the items. objects in the sample
+    can be shared with items outside it - a word used in many states, say - so in there, each object counts only
+    1/(its reference count) of its size, per reference. (so objects referenced from *outside* obj - say the tokenized
+    input text, while it is still around - are only partly counted; deep_getsizeof counts them in full.)
+
+    >>> big = {(i, u"state"): [u"word", u"another", u"word"][:i % 3] for i in xrange(100000)}
+    >>> exact, estimate = deep_getsizeof(big), estimate_deep_getsizeof(big)
+    >>> assert abs(estimate - exact) < exact * 0.05, (estimate, exact)
+    >>> small = (big.keys()[0], [u"a"])
+    >>> estimate_deep_getsizeof(small) == deep_getsizeof(small)
+    True
+    """
+    return int(_estimate_deep_getsizeof(obj, sample_size, set()))
+
+
+def _estimate_deep_getsizeof(obj, sample_size, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    total = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        count, items = len(obj), itertools.chain.from_iterable(obj.iteritems())
+    elif isinstance(obj, _SEQUENCES_AND_SETS):
+        count, items = len(obj), iter(obj)
+    else:
+        count, items = 0, ()
+
+    if count > sample_size:
+        sampled = list(itertools.islice(items, sample_size * (2 if isinstance(obj, dict) else 1)))
+        total += _shared_getsizeof(sampled) * float(count) / sample_size
+    else:
+        total += sum(_estimate_deep_getsizeof(item, sample_size, seen) for item in items)
+
+    if _has_instance_dict(obj):
+        total += _estimate_deep_getsizeof(obj.__dict__, sample_size, seen)
+    return total
+
+
+def _shared_getsizeof(objects):
+    """ deep size of `objects` where each object counts 1/(its reference count) of its size, each time it's reached
+    """
+    total = 0.0
+    stack = list(objects)
+    del objects[:]  # (so the only extra references to them are the stack's)
+    while stack:
+        current = stack.pop()
+        # (references from here, that don't count: `current`, and getrefcount's own argument)
+        references = sys.getrefcount(current) - 2
+        total += float(sys.getsizeof(current)) / max(references, 1)
+
+        if isinstance(current, dict):
+            stack.extend(current.iterkeys())
+            stack.extend(current.itervalues())
+        elif isinstance(current, _SEQUENCES_AND_SETS):
+            stack.extend(current)
+
+        if _has_instance_dict(current):
+            stack.append(current.__dict__)
+    return total
+
+
+_SEQUENCES_AND_SETS = (list, tuple, set, frozenset, collections.deque)
+
+
+def _has_instance_dict(obj):
+    return hasattr(obj, '__dict__') and not isinstance(obj, (type, types.ModuleType)) and not callable(obj)
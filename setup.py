@@ -32,6 +32,9 @@ _requirements_server = [
 requirements = _requirements_cli + _requirements_server + [
     'PyYAML',
 
+    # concurrent.futures (backported), for handing work to executors - see presswork.text.offload
+    'futures==3.3.0',
+
     # Third party markov chain text generators
     # (No need to include PyMarkovChain here, is forked and inlined into this repository - PyMarkovChainFork)
     "markovify==0.6.0",
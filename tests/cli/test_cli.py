@@ -6,11 +6,14 @@ doesn't re-hash same checks from test_essentials_and_parity - moreso testing int
 text makers. as well as some behavior/interface aspects of the CLI.
 """
 
+import json
+
 import pytest
 from click.testing import CliRunner
 from mock import patch
 
 from presswork import cli
+from presswork.text import timings
 from presswork.text.grammar import joiners
 from presswork.text.grammar import tokenizers
 from tests import helpers
@@ -166,3 +169,159 @@ def test_cli_help(runner):
     help_result = runner.invoke(cli.main, ['--help'], catch_exceptions=False)
     assert help_result.exit_code == 0
     assert '--help' in help_result.output
+
+
+def test_cli_timings(runner):
+    stdin = "Foo is better than bar. Foo is better than baz."
+
+    result = runner.invoke(cli.main, input=stdin, args=['--timings'], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert 'better than' in result.output
+    for stage in timings.STAGES:
+        assert stage in result.output
+
+    # and without the flag, no timings
+    result = runner.invoke(cli.main, input=stdin, catch_exceptions=False)
+    assert result.exit_code == 0
+    assert 'tokenize_words' not in result.output
+
+
+def test_cli_stats(runner):
+    stdin = "Foo is better than bar. Foo is better than baz."
+
+    result = runner.invoke(cli.main, input=stdin, args=['--stats'], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert 'better than' in result.output
+    for row in ('states', 'transitions', 'vocabulary', 'mean branching', 'max branching', 'memory'):
+        assert row in result.output
+
+    result = runner.invoke(cli.main, input=stdin, catch_exceptions=False)
+    assert 'transitions' not in result.output
+
+
+def test_cli_generate_is_the_default_command(runner):
+    stdin = "Foo is better than bar. Foo is better than baz."
+
+    result = runner.invoke(cli.main, input=stdin, args=['generate', '-c', '3'], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert 'better than' in result.output
+
+
+def test_cli_serve(runner):
+    """ serve on stdin/stdout: requests in, responses out, 1 JSON object per line
+    """
+    requests = "\n".join([
+        json.dumps({"model": "bar", "count": 2, "id": 1}),
+        json.dumps({"model": "nope", "id": 2}),
+        json.dumps({"models": True}),
+    ])
+    with runner.isolated_filesystem():
+        with open("bar.txt", "w") as f:
+            f.write("Foo is better than bar. Foo is better than baz.")
+        with open("awesome.txt", "w") as f:
+            f.write("Everything is awesome.")
+
+        result = runner.invoke(cli.main, input=requests, catch_exceptions=False, args=[
+            'serve', '-m', 'bar=bar.txt', '--model', 'awesome=awesome.txt', '-s', 'crude'])
+
+    assert result.exit_code == 0
+    responses = [json.loads(line) for line in result.output.splitlines() if line.startswith("{")]
+    assert responses[0]["id"] == 1 and 'better than' in responses[0]["text"]
+    assert responses[1]["id"] == 2 and 'unknown model' in responses[1]["error"]
+    assert responses[2] == {"models": ["awesome", "bar"]}
+
+
+def test_cli_serve_needs_models(runner):
+    assert runner.invoke(cli.main, args=['serve']).exit_code == 2
+    assert runner.invoke(cli.main, args=['serve', '-m', 'no_filename']).exit_code == 2
+
+
+@pytest.mark.parametrize("strategy", ['markovify', 'pymc', 'crude'])
+def test_cli_build_then_generate_from_model(runner, strategy):
+    with runner.isolated_filesystem():
+        with open("input.txt", "w") as f:
+            f.write("Foo is better than bar. Foo is better than baz.")
+
+        result = runner.invoke(cli.main, catch_exceptions=False, args=[
+            'build', '-i', 'input.txt', '-s', strategy, '-n', '3', '-t', 'nltk', '-o', 'input.model', '--stats'])
+        assert result.exit_code == 0
+        assert 'transitions' in result.output
+
+        # no input text at all, this time; just the model
+        result = runner.invoke(cli.main, catch_exceptions=False, args=['-m', 'input.model', '-c', '20', '-j', 'nltk'])
+        assert result.exit_code == 0
+        assert result.output.count('is better than') == 20
+
+        # and serving it
+        result = runner.invoke(cli.main, catch_exceptions=False, input=json.dumps({"count": 2}), args=[
+            'serve', '-m', 'foo=input.model'])
+        response = json.loads([line for line in result.output.splitlines() if line.startswith("{")][0])
+        assert 'is better than' in response["text"]
+
+
+def test_cli_publish_then_serve_shared(runner, tmpdir):
+    with runner.isolated_filesystem():
+        with open("input.txt", "w") as f:
+            f.write("Foo is better than bar. Foo is better than baz.")
+
+        result = runner.invoke(cli.main, catch_exceptions=False, args=[
+            'publish', '-m', 'foo=input.txt', '-s', 'pymc', '--shared-directory', str(tmpdir)])
+        assert result.exit_code == 0
+        assert 'published model foo' in result.output
+
+        result = runner.invoke(cli.main, catch_exceptions=False, input=json.dumps({"model": "foo", "count": 2}), args=[
+            'serve', '--shared', 'foo', '--shared-directory', str(tmpdir)])
+        response = json.loads([line for line in result.output.splitlines() if line.startswith("{")][0])
+        assert response["text"].count('is better than') == 2
+
+        assert runner.invoke(cli.main, args=['serve', '--shared', 'nope', '--shared-directory', str(tmpdir)]
+                             ).exit_code == 2
+
+
+def test_cli_publish_too_big(runner, tmpdir):
+    with runner.isolated_filesystem():
+        with open("input.txt", "w") as f:
+            f.write(" ".join("w{}{}".format(i, "." if i % 20 == 19 else "") for i in xrange(2000)))
+
+        result = runner.invoke(cli.main, args=[
+            'publish', '-m', 'big=input.txt', '-n', '6', '-t', 'just_whitespace', '--shared-directory', str(tmpdir)])
+        assert result.exit_code == 2
+        assert 'too big to publish' in result.output
+
+
+def test_cli_generate_from_model_needs_a_model_file(runner):
+    with runner.isolated_filesystem():
+        with open("input.txt", "w") as f:
+            f.write("Foo is better than bar.")
+
+        assert runner.invoke(cli.main, args=['-m', 'input.txt']).exit_code == 2
+        assert runner.invoke(cli.main, args=['-m', 'missing.model']).exit_code == 2
+        assert runner.invoke(cli.main, args=['build', '-i', 'input.txt']).exit_code == 2   # (no -o)
+
+
+@pytest.mark.parametrize("strategy", ['markovify', 'pymc', 'crude'])
+def test_cli_seed(runner, strategy):
+    stdin = "Foo is better than bar. Bar is better than baz. Baz is better than foo."
+
+    def output(*args):
+        result = runner.invoke(cli.main, input=stdin, catch_exceptions=False, args=[
+            '-s', strategy, '-n', '1', '-j', 'random_enjamb', '-c', '30'] + list(args))
+        assert result.exit_code == 0
+        return result.output
+
+    assert output('--seed', '3') == output('--seed', '3')
+    assert output('--seed', '3') != output('--seed', '4')
+
+
+def test_cli_jobs(runner):
+    stdin = "Foo is better than bar. Bar is better than baz. Baz is better than foo."
+
+    def output(*args):
+        result = runner.invoke(cli.main, input=stdin, catch_exceptions=False, args=[
+            '-s', 'crude', '-n', '1', '-c', '5000', '--seed', '3'] + list(args))
+        assert result.exit_code == 0
+        return result.output
+
+    assert output('--jobs', '2') == output('--jobs', '1') == output()
+    assert output('--jobs', '2').count('better than') == 5000
+    assert runner.invoke(cli.main, input=stdin, args=['--jobs', '0']).exit_code != 0
@@ -127,6 +127,20 @@ def pytest_addoption(parser):
     parser.addoption("--runslow", action="store_true",
                      default=False, help="run slow tests")
 
+    # (for the benchmarks in tests/text/performance; those only run with --runslow)
+    parser.addoption("--bench-corpus-sizes", default="16KB,256KB",
+                     help="comma-separated corpus sizes for the pipeline benchmarks, such as 16KB,1MB,1GB")
+    parser.addoption("--bench-ngram-sizes", default="1,2,3,4,5,6",
+                     help="comma-separated ngram sizes for the pipeline benchmarks")
+    parser.addoption("--bench-baseline", default=".benchmarks/baseline.json",
+                     help="baseline JSON for the pipeline benchmarks' regression gate")
+    parser.addoption("--bench-compare", action="store_true", default=False,
+                     help="compare pipeline benchmarks against --bench-baseline; exit code 1 if any regressed")
+    parser.addoption("--bench-promote", action="store_true", default=False,
+                     help="store the pipeline benchmarks' results from this run in --bench-baseline")
+    parser.addoption("--bench-tolerance", default=0.10, type=float,
+                     help="relative slowdown (or peak memory growth) tolerated by --bench-compare; default 0.10")
+
 
 def pytest_collection_modifyitems(config, items):
     """ pytest hook such that some tests only run if `--runslow` is given. Performance tests, Hypothesis tests.
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+""" the JSON API: batches of jobs, against named or cached models; errors per job
+"""
+import json
+import threading
+
+import pytest
+
+from presswork import serving
+from presswork.flask_app import api
+from presswork.text import text_makers
+
+INPUT_TEXT = u"Foo is better than bar.\nBar is better than baz.\nBaz is better than foo.\n"
+
+
+@pytest.fixture()
+def testapp(monkeypatch):
+    from presswork.flask_app.app import app
+
+    monkeypatch.setattr(api, "model_cache", api.ModelCache())
+    app.testing = True
+    app.config['PRESSWORK_MODELS'] = {
+        "foo": text_makers.create_text_maker(
+                strategy='crude', sentence_tokenizer='just_whitespace', joiner='just_whitespace', input_text=INPUT_TEXT)
+    }
+    yield app.test_client()
+    app.config['PRESSWORK_MODELS'] = {}
+
+
+def _post(testapp, body):
+    response = testapp.post('/api/generate', data=json.dumps(body), content_type='application/json')
+    return response.status_code, json.loads(response.data)
+
+
+def test_batch_of_jobs(testapp):
+    status, body = _post(testapp, {"jobs": [
+        {"model": "foo", "count": 3, "id": "a"},
+        {"model": "foo", "count": 2, "format": "words"},
+        {"model": "foo", "count": 4, "format": "text"},
+        {"input_text": INPUT_TEXT, "strategy": "pymc", "tokenizer": "just_whitespace", "count": 5, "id": 7},
+    ]})
+    assert status == 200
+    first, second, third, fourth = body["results"]
+
+    assert first["id"] == "a" and first["model"] == "foo"
+    assert len(first["sentences"]) == 3 and all(u"is better than" in sentence for sentence in first["sentences"])
+    assert len(second["words"]) == 2 and second["words"][0][1:3] == [u"is", u"better"]
+    assert third["text"].count(u"is better than") == 4
+    assert fourth["id"] == 7 and len(fourth["model_key"]) == 40 and len(fourth["sentences"]) == 5
+
+
+def test_trained_models_are_cached(testapp, monkeypatch):
+    status, body = _post(testapp, {"jobs": [{"input_text": INPUT_TEXT, "strategy": "markovify"}]})
+    key = body["results"][0]["model_key"]
+
+    # the same text & options again, or the key: no training
+    monkeypatch.setattr(text_makers, "create_text_maker", None)
+    status, body = _post(testapp, {"jobs": [{"input_text": INPUT_TEXT, "strategy": "markovify", "count": 2},
+                                            {"model_key": key, "count": 3}]})
+    assert [len(result["sentences"]) for result in body["results"]] == [2, 3]
+    assert body["results"][1]["model_key"] == key
+
+    # dropped from the cache: then the text is needed again
+    for i in xrange(api.MAX_CACHED_MODELS):
+        api.model_cache.put(str(i), object())
+    status, body = _post(testapp, {"jobs": [{"model_key": key}]})
+    assert "send its input_text again" in body["results"][0]["error"]
+
+
+def test_seed_makes_the_same_output(testapp):
+    job = {"model": "foo", "count": 20, "seed": 3, "joiner": "random_enjamb", "format": "text"}
+    results = [_post(testapp, {"jobs": [job]})[1]["results"][0]["text"] for _ in xrange(2)]
+    assert results[0] == results[1]
+    assert _post(testapp, {"jobs": [dict(job, seed=4)]})[1]["results"][0]["text"] != results[0]
+
+
+@pytest.mark.parametrize('job, error', [
+    ({"model": "nope"}, "unknown model"),
+    ({}, "which model?"),
+    ({"model": "foo", "count": 0}, "count must be"),
+    ({"model": "foo", "count": "2"}, "count must be"),
+    ({"model": "foo", "format": "html"}, "format must be"),
+    ({"model": "foo", "joiner": "nope"}, "joiner must be"),
+    ({"model": "foo", "seed": 1.5}, "seed must be"),
+    ({"input_text": INPUT_TEXT, "strategy": "nope"}, "strategy must be"),
+    ({"input_text": INPUT_TEXT, "ngram_size": 0}, "ngram_size must be"),
+    ({"input_text": 5}, "input_text must be"),
+    ("foo", "must be a JSON object"),
+])
+def test_bad_jobs_get_errors_and_the_rest_go_on(testapp, job, error):
+    status, body = _post(testapp, {"jobs": [job, {"model": "foo"}]})
+    assert status == 200
+    assert error in body["results"][0]["error"]
+    assert len(body["results"][1]["sentences"]) == 1
+
+
+@pytest.mark.parametrize('body', [
+    [], {"jobs": "foo"}, {"jobs": [{"model": "foo"}] * (api.MAX_JOBS + 1)},
+    {"jobs": [{"model": "foo", "count": serving.MAX_COUNT}] * (api.MAX_SENTENCES // serving.MAX_COUNT + 1)},
+])
+def test_bad_requests_get_400(testapp, body):
+    status, response_body = _post(testapp, body)
+    assert status == 400 and response_body["error"]
+
+
+def test_not_json_gets_400(testapp):
+    response = testapp.post('/api/generate', data="foo", content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_models(testapp):
+    response = testapp.get('/api/models')
+    assert json.loads(response.data) == {"models": ["foo"]}
+
+
+def _stream(testapp, job):
+    response = testapp.post('/api/stream', data=json.dumps(job), content_type='application/json')
+    return response.status_code, [json.loads(line) for line in response.data.splitlines()]
+
+
+@pytest.mark.parametrize('output_format', api.FORMATS)
+def test_stream(testapp, output_format):
+    count = 2 * api.STREAM_CHUNK_SIZE + 5
+    status, lines = _stream(testapp, {"model": "foo", "count": count, "format": output_format, "id": 3})
+    assert status == 200
+    assert lines[0] == {"model": "foo", "count": count, "id": 3}
+    assert lines[-1] == {"done": True}
+    chunks = [line[output_format] for line in lines[1:-1]]
+    assert len(chunks) == 3
+    if output_format == 'text':
+        assert u"".join(chunks).count(u"is better than") == count
+    else:
+        assert sum(len(chunk) for chunk in chunks) == count
+
+
+def test_stream_with_seed_makes_the_same_output(testapp):
+    job = {"model": "foo", "count": 250, "seed": 3, "joiner": "random_enjamb", "format": "text"}
+    assert _stream(testapp, job) == _stream(testapp, job)
+    assert _stream(testapp, job) != _stream(testapp, dict(job, seed=4))
+
+
+def test_stream_makes_sentences_as_they_are_read(testapp, monkeypatch):
+    text_maker = testapp.application.config['PRESSWORK_MODELS']["foo"]
+    counts = []
+    make_sentences = text_maker._make_sentences
+    monkeypatch.setattr(text_maker, "_make_sentences", lambda count, rng: counts.append(count) or make_sentences(
+            count, rng))
+
+    response = testapp.post('/api/stream', data=json.dumps({"model": "foo", "count": api.MAX_STREAM_COUNT}),
+                            content_type='application/json')
+    lines = iter(response.response)
+    assert json.loads(next(lines))["count"] == api.MAX_STREAM_COUNT
+    assert len(json.loads(next(lines))["sentences"]) == api.STREAM_CHUNK_SIZE
+    assert counts == [api.STREAM_CHUNK_SIZE]
+
+    # (a client hanging up stops it)
+    response.close()
+    assert counts == [api.STREAM_CHUNK_SIZE]
+
+
+@pytest.mark.parametrize('job, error', [
+    ({"model": "nope"}, "unknown model"),
+    ({"model": "foo", "count": api.MAX_STREAM_COUNT + 1}, "count must be"),
+    ([{"model": "foo"}], "expected a JSON object"),
+])
+def test_bad_streams_get_400(testapp, job, error):
+    response = testapp.post('/api/stream', data=json.dumps(job), content_type='application/json')
+    assert response.status_code == 400 and error in json.loads(response.data)["error"]
+
+
+def _in_threads(count, target):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in xrange(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def _join_all(threads):
+    for thread in threads:
+        thread.join()
+
+
+def _wait_for_waiters(cache, count):
+    while cache.stats()["coalesced"] < count:
+        threading.Event().wait(0.001)
+
+
+def test_concurrent_requests_for_a_model_train_it_once():
+    cache, release, calls = api.ModelCache(), threading.Event(), []
+
+    def create():
+        calls.append(1)
+        release.wait()
+        return object()
+
+    threads, results = _in_threads(5, lambda: cache.get_or_create("key", create))
+    _wait_for_waiters(cache, 4)
+    assert cache.stats()["building"] == 1
+    release.set()
+    _join_all(threads)
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1 and cache.get("key") is results[0]
+    assert cache.stats() == {"builds": 1, "build_errors": 0, "hits": 0, "coalesced": 4, "timeouts": 0,
+                             "cached": 1, "building": 0}
+
+
+def test_errors_go_to_every_waiter_and_are_not_cached():
+    cache, release = api.ModelCache(), threading.Event()
+
+    def create():
+        release.wait()
+        raise ValueError("no good")
+
+    threads, results = _in_threads(3, lambda: cache.get_or_create("key", create))
+    _wait_for_waiters(cache, 2)
+    release.set()
+    _join_all(threads)
+
+    assert [unicode(result) for result in results] == [u"no good"] * 3
+    assert cache.stats()["build_errors"] == 1 and cache.get("key") is None
+    assert cache.get_or_create("key", lambda: "trained") == "trained"   # (tries again)
+
+
+def test_waiting_for_a_model_times_out():
+    cache, release = api.ModelCache(build_timeout=0.01), threading.Event()
+
+    def create():
+        release.wait()
+        return "trained"
+
+    threads, results = _in_threads(1, lambda: cache.get_or_create("key", create))
+    while not cache.stats()["building"]:
+        threading.Event().wait(0.001)
+
+    with pytest.raises(api.BuildTimeout):
+        cache.get_or_create("key", lambda: "again")
+    release.set()
+    _join_all(threads)
+    assert results == ["trained"] and cache.get_or_create("key", lambda: "again") == "trained"
+    assert cache.stats()["timeouts"] == 1
+
+
+def test_stats(testapp):
+    job = {"input_text": INPUT_TEXT, "tokenizer": "just_whitespace"}
+    _post(testapp, {"jobs": [job, job]})
+    response = testapp.get('/api/stats')
+    stats = json.loads(response.data)["model_cache"]
+    assert (stats["builds"], stats["hits"], stats["cached"]) == (1, 1, 1)
@@ -59,6 +59,25 @@ def test_index_submit_deterministic(testapp):
     assert "ensure test is valid - this is not in the response data" not in generated_text
 
 
+def test_index_submit_streamed(testapp):
+    """ streamed output: the same page, sent as the text is made """
+    input_text = 'This is a single sentence with all unique words'
+    response = testapp.post('/', data=dict(
+            input_text=input_text + '\n',
+            text_maker_strategy='crude',
+            tokenizer_strategy='just_whitespace',
+            joiner_strategy='just_whitespace',
+            ngram_size=2,
+            count_of_sentences_to_make=2 * text_makers.TEXT_CHUNK_SIZE + 5,
+            stream_output='y',
+    ))
+    assert response.status_code == 200
+    assert response.is_streamed
+
+    generated_text = _get_the_generated_text_from_exact_html_element(response)
+    assert generated_text.strip().split('\n') == [input_text] * (2 * text_makers.TEXT_CHUNK_SIZE + 5)
+
+
 @pytest.mark.parametrize('ngram_size', [2, 3])
 @pytest.mark.parametrize('tokenizer_strategy', tokenizers.TOKENIZER_NICKNAMES)
 @pytest.mark.parametrize('joiner_strategy', joiners.JOINER_NICKNAMES)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+""" warming up before taking traffic: tokenizers & corpora loaded up front, and /ready saying when that's done
+"""
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+from presswork import constants
+from presswork.flask_app import api
+from presswork.flask_app import warmup
+from presswork.text import clean
+from presswork.text import text_makers
+from tests import fixtures
+
+INPUT_TEXT = u"Foo is better than bar.\nBar is better than baz.\nBaz is better than foo.\n"
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    from presswork.flask_app.app import app
+
+    monkeypatch.setattr(api, "model_cache", api.ModelCache())
+    app.testing = True
+    app.config['PRESSWORK_MODELS'] = {}
+    yield app
+    app.config['PRESSWORK_MODELS'] = {}
+    app.config.pop('PRESSWORK_WARM_UP', None)
+
+
+def _ready(app):
+    response = app.test_client().get('/ready')
+    return response.status_code, json.loads(response.data)
+
+
+def test_ready_without_warm_up(app):
+    assert _ready(app) == (200, {"ready": True})
+
+
+def test_warm_up_loads_corpora(app, tmpdir):
+    corpus_directory = str(tmpdir.mkdir("corpora"))
+    text_maker = text_makers.create_text_maker(strategy='crude', input_text=INPUT_TEXT)
+    text_makers.save_text_maker(text_maker, os.path.join(corpus_directory, "foo.model"))
+    shutil.copy(fixtures.FILENAMES_NEWLINES[0], corpus_directory)
+    corpora = [corpus_directory, str(tmpdir.join("nope"))]
+
+    warm_up = warmup.WarmUp(corpora=corpora).run(app)
+    text_name = os.path.splitext(os.path.basename(fixtures.FILENAMES_NEWLINES[0]))[0]
+    assert sorted(app.config['PRESSWORK_MODELS']) == sorted(["foo", text_name])
+
+    status, body = _ready(app)
+    assert status == 200 and body == warm_up.status()
+    assert body["ready"] and sorted(body["models"]) == sorted(["foo", text_name])
+    assert body["errors"] == [u"{}: no such file or directory".format(corpora[1])]
+
+    # the API serves them by name; and the text is in the cache, as if it had been sent with the form's defaults
+    response = app.test_client().post('/api/generate', data=json.dumps({"jobs": [{"model": "foo"}]}),
+                                      content_type='application/json')
+    assert u"better than" in json.loads(response.data)["results"][0]["sentences"][0]
+    with open(fixtures.FILENAMES_NEWLINES[0], 'rb') as f:
+        input_text = clean.CleanInputString(f.read().decode('utf-8'))
+    key = api.ModelCache.key_for(input_text, text_makers.DEFAULT_TEXT_MAKER_NICKNAME, 'nltk',
+                                 constants.DEFAULT_NGRAM_SIZE)
+    assert api.model_cache.get(key) is app.config['PRESSWORK_MODELS'][text_name]
+
+
+def test_not_ready_while_warming_up_in_the_background(app, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+    warm_up_grammar = warmup.WarmUp._warm_up_grammar
+
+    def slow_warm_up_grammar(self):
+        entered.set()
+        release.wait()
+        warm_up_grammar(self)
+
+    monkeypatch.setattr(warmup.WarmUp, "_warm_up_grammar", slow_warm_up_grammar)
+
+    warm_up = warmup.WarmUp().start(app)
+    status, body = _ready(app)
+    assert status == 503 and not body["ready"] and body["stage"] in ("starting", "tokenizers & joiners")
+
+    assert entered.wait(timeout=60)
+    status, body = _ready(app)
+    assert status == 503 and body["stage"] == "tokenizers & joiners"
+
+    release.set()
+    assert warm_up.wait(timeout=60)
+    status, body = _ready(app)
+    assert status == 200 and body["ready"] and body["stage"] == "done"
+
+
+def test_a_failed_warm_up_is_never_ready(app, monkeypatch):
+    def broken_warm_up_grammar(self):
+        raise IOError("no punkt")
+
+    monkeypatch.setattr(warmup.WarmUp, "_warm_up_grammar", broken_warm_up_grammar)
+
+    warm_up = warmup.WarmUp().run(app)
+    assert warm_up.wait(timeout=0) and not warm_up.ready
+    status, body = _ready(app)
+    assert status == 503 and body["stage"] == "failed"
+    assert body["errors"] == [u"tokenizers & joiners: no punkt"]
@@ -1,14 +1,50 @@
+# -*- coding: utf-8 -*-
 """ utilities to help do comparisons in tests - esp. given that correct behavior here is (usually) not deterministic
+
+(and a few things shared by tests of models: a little input text, a trained TextMaker of it, reading memory usage)
 """
 import logging
 import re
 import string
 
 from presswork.text import clean
+from presswork.text import text_makers
 from presswork.utils import iter_flatten
 
 logger = logging.getLogger("presswork")
 
+ZEN_OF_PYTHON = (u"Beautiful is better than ugly. Explicit is better than implicit. Simple is better than complex. "
+                 u"Complex is better than complicated. Flat is better than nested. Sparse is better than dense. "
+                 u"Naïve is better than clever.")
+
+
+def create_trained(strategy, ngram_size=2, input_text=ZEN_OF_PYTHON):
+    """ :return: a TextMaker of `strategy`, trained (so, locked) on input_text
+    """
+    return text_makers.create_text_maker(strategy=strategy, input_text=input_text, ngram_size=ngram_size)
+
+
+def smaps_kb(path=None):
+    """ :return: {field: kB}, from /proc/self/smaps (Linux only): summed over this process' mappings - or if `path` is
+        given, only where the file at `path` is mapped. (fields such as 'Rss', 'Anonymous', 'Private_Dirty')
+    """
+    kb, in_mapping = {}, path is None
+    with open('/proc/self/smaps') as f:
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and ":" not in fields[0]:
+                in_mapping = path is None or fields[-1] == path
+            elif in_mapping and fields[0].endswith(':') and fields[-1] == 'kB':
+                kb[fields[0][:-1]] = kb.get(fields[0][:-1], 0) + int(fields[1])
+    return kb
+
+
+def private_kb():
+    """ :return: kB of this process' memory that isn't shared with any other (Linux only)
+    """
+    kb = smaps_kb()
+    return kb.get('Private_Dirty', 0) + kb.get('Private_Clean', 0)
+
 
 class WordSetComparison(object):
     """ Compares set-of-words in output text (generated) and input text (source text for model)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+""" Tests for the generation server: requests & responses, and the transports
+"""
+import json
+import os
+import shutil
+import socket
+import StringIO
+import tempfile
+import threading
+
+import pytest
+
+from presswork import serving
+from presswork.text import shared_models
+from presswork.text import text_makers
+
+INPUT_TEXT = u"Foo is better than bar.\nFoo is better than baz.\nEverything is awesome.\n"
+
+
+@pytest.fixture(scope='module')
+def model_server():
+    return serving.ModelServer({
+        strategy: text_makers.create_text_maker(
+                strategy=strategy, sentence_tokenizer='just_whitespace', joiner='just_whitespace',
+                input_text=INPUT_TEXT)
+        for strategy in text_makers.TEXT_MAKER_NICKNAMES
+    })
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_request_for_text(model_server, strategy):
+    response = model_server.handle({"model": strategy, "count": 20, "id": [1, "x"]})
+    assert response["id"] == [1, "x"]
+    assert response["model"] == strategy
+    lines = response["text"].splitlines()
+    assert len(lines) == 20
+    assert set(lines) <= set(INPUT_TEXT.splitlines())
+
+
+@pytest.mark.parametrize('bad_request, error', [
+    ({"model": "nope"}, "unknown model"),
+    ({"count": 1}, "which model?"),
+    ({"model": "crude", "count": 0}, "count must be"),
+    ({"model": "crude", "count": serving.MAX_COUNT + 1}, "count must be"),
+    ({"model": "crude", "count": "3"}, "count must be"),
+    ({"model": "crude", "count": True}, "count must be"),
+    ([1, 2], "must be a JSON object"),
+])
+def test_bad_requests_get_errors(model_server, bad_request, error):
+    response = model_server.handle(bad_request)
+    assert error in response["error"]
+    assert "text" not in response
+
+
+def test_internal_errors_are_answered_not_raised(model_server, monkeypatch):
+    def broken(count):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(model_server.text_makers_by_name["pymc"], "make_sentences", broken)
+    response = model_server.handle({"model": "pymc", "id": 1})
+    assert response["id"] == 1 and response["error"] == "internal error: boom"
+    assert "text" in model_server.handle({"model": "crude"})
+
+
+def test_only_model_is_the_default():
+    text_maker = text_makers.create_text_maker(strategy='crude', input_text=INPUT_TEXT)
+    response = serving.ModelServer({"only": text_maker}).handle({})
+    assert response["model"] == "only"
+    assert len(response["text"].splitlines()) == serving.DEFAULT_COUNT
+
+
+def test_models_must_be_trained():
+    with pytest.raises(ValueError):
+        serving.ModelServer({})
+    with pytest.raises(ValueError):
+        serving.ModelServer({"untrained": text_makers.create_text_maker()})
+
+
+def test_shared_models_are_served_and_swapped(tmpdir):
+    directory = str(tmpdir)
+    shared_models.publish(text_makers.create_text_maker(
+            strategy='crude', sentence_tokenizer='just_whitespace', input_text=u"foo bar baz"), "foo", directory)
+    model_server = serving.ModelServer({"foo": shared_models.SharedModel("foo", directory=directory)})
+    assert model_server.handle({"model": "foo"})["text"] == u"foo bar baz"
+
+    shared_models.publish(text_makers.create_text_maker(
+            strategy='pymc', sentence_tokenizer='just_whitespace', input_text=u"bar baz foo"), "foo", directory)
+    assert model_server.handle({"model": "foo"})["text"] == u"bar baz foo"
+
+
+def test_serve_lines(model_server):
+    requests = [
+        json.dumps({"model": "markovify", "count": 3, "id": 1}),
+        "",
+        "{not json",
+        json.dumps({"models": True, "id": 3}),
+    ]
+    output_file = StringIO.StringIO()
+    model_server.serve_lines(StringIO.StringIO("\n".join(requests) + "\n"), output_file)
+
+    responses = [json.loads(line) for line in output_file.getvalue().splitlines()]
+    assert len(responses) == 3
+    assert responses[0]["id"] == 1 and len(responses[0]["text"].splitlines()) == 3
+    assert "not valid JSON" in responses[1]["error"]
+    assert responses[2] == {"id": 3, "models": sorted(text_makers.TEXT_MAKER_NICKNAMES)}
+
+
+def test_serve_unix_socket(model_server):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "presswork.sock")
+    try:
+        server = serving.make_unix_socket_server(model_server, path)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        client_file = client.makefile('rw')
+        for i in range(3):
+            client_file.write(json.dumps({"model": "pymc", "count": 2, "id": i}) + "\n")
+            client_file.flush()
+            response = json.loads(client_file.readline())
+            assert response["id"] == i and len(response["text"].splitlines()) == 2
+        client_file.close()
+        client.close()
+
+        thread.join()
+        server.server_close()
+
+        # a leftover socket gets replaced, not refused
+        serving.make_unix_socket_server(model_server, path).server_close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_serve_unix_socket_serves_connections_at_once(model_server):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "presswork.sock")
+    server = serving.make_unix_socket_server(model_server, path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    idle_client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # the 1st client connects, and sends nothing ... the 2nd still gets answered
+        idle_client.connect(path)
+        client.connect(path)
+        client.settimeout(10)
+        client_file = client.makefile('rw')
+        client_file.write(json.dumps({"model": "crude", "count": 1, "id": "second"}) + "\n")
+        client_file.flush()
+        assert json.loads(client_file.readline())["id"] == "second"
+        client_file.close()
+    finally:
+        client.close()
+        idle_client.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory)
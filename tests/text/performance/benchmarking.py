@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+""" helpers for the pipeline benchmarks: synthetic corpora of any size, memoized pipeline stages, throughput & memory
+
+the benchmarks themselves are in `test_pipeline_benchmarks`; this module just keeps them short.
+"""
+import collections
+import contextlib
+import logging
+import re
+import resource
+import sys
+
+from presswork.text import clean
+from presswork.text import text_makers
+from presswork.text.markov import tracing
+from presswork.text.grammar import tokenizers
+from tests import fixtures
+from tests.text.performance import regressions
+
+_SIZE_SUFFIXES = collections.OrderedDict([('GB', 1024 ** 3), ('MB', 1024 ** 2), ('KB', 1024), ('B', 1)])
+_re_size = re.compile(r'^\s*(\d+)\s*(GB|MB|KB|B)?\s*$', flags=re.IGNORECASE)
+
+
+def parse_size(size):
+    """ parse human-friendly corpus sizes
+
+        >>> parse_size("16KB"), parse_size("1mb"), parse_size("2GB"), parse_size("100")
+        (16384, 1048576, 2147483648, 100)
+    """
+    match = _re_size.match(size)
+    if not match:
+        raise ValueError("could not parse size {!r}; expected something like 16KB, 1MB, 1GB".format(size))
+    number, suffix = match.groups()
+    return int(number) * _SIZE_SUFFIXES[(suffix or 'B').upper()]
+
+
+def parse_csv(value, parse=str):
+    return [parse(item) for item in value.split(",") if item.strip()]
+
+
+class _Memo(object):
+    """ tiny memo that only keeps the most recent few entries; corpora (and models of them) can be GBs
+    """
+
+    def __init__(self, max_entries=2):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, factory):
+        if key not in self._entries:
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+            self._entries[key] = factory()
+        return self._entries[key]
+
+
+_corpora = _Memo()
+_tokenized = _Memo()
+_text_makers = _Memo()
+
+
+def corpus_of_size(size_in_bytes):
+    """ raw (uncleaned) corpus of ~size_in_bytes, made by cycling through the plaintext fixtures line by line
+
+    it is repetitive, of course; but generated text is too, and what we are after here is throughput, not variety.
+    """
+
+    def build():
+        lines = []
+        for filename in sorted(fixtures.FILENAMES_ALL):
+            with open(filename, 'r') as f:
+                lines.extend(line for line in f.read().splitlines() if line.strip())
+
+        chunk = "\n".join(lines) + "\n"
+        repeats, remainder = divmod(size_in_bytes, len(chunk))
+        corpus = chunk * repeats + chunk[:remainder]
+        return corpus[:corpus.rfind("\n") + 1] or chunk
+
+    return _corpora.get(size_in_bytes, build)
+
+
+def tokenized_corpus(size_in_bytes, tokenizer_nickname):
+    def build():
+        text = clean.CleanInputString(corpus_of_size(size_in_bytes))
+        return tokenizers.create_sentence_tokenizer(tokenizer_nickname).tokenize(text)
+
+    return _tokenized.get((size_in_bytes, tokenizer_nickname), build)
+
+
+class AlreadyTokenized(object):
+    """ quacks like a sentence tokenizer, but just hands back sentences tokenized earlier. (isolates training time)
+    """
+
+    def __init__(self, sentences_as_word_lists):
+        self.sentences_as_word_lists = sentences_as_word_lists
+
+    def tokenize(self, text):
+        return self.sentences_as_word_lists
+
+
+def untrained_text_maker(size_in_bytes, tokenizer_nickname, strategy, ngram_size):
+    """ text maker whose input_text() skips straight to training, on the memoized tokenized corpus
+    """
+    return text_makers.create_text_maker(
+            strategy=strategy,
+            sentence_tokenizer=AlreadyTokenized(tokenized_corpus(size_in_bytes, tokenizer_nickname)),
+            ngram_size=ngram_size)
+
+
+def trained_text_maker(size_in_bytes, tokenizer_nickname, strategy, ngram_size):
+    def build():
+        text_maker = untrained_text_maker(size_in_bytes, tokenizer_nickname, strategy, ngram_size)
+        text_maker.input_text(u"")
+        return text_maker
+
+    return _text_makers.get((size_in_bytes, tokenizer_nickname, strategy, ngram_size), build)
+
+
+class _FormatAndDiscardHandler(logging.Handler):
+    def emit(self, record):
+        self.format(record)
+
+
+def tracing_formatted_and_discarded():
+    """ turn engine tracing on, with a handler that formats every event (like a real one would) but does no I/O
+    """
+    return tracing.trace_to(_FormatAndDiscardHandler(level=logging.DEBUG))
+
+
+@contextlib.contextmanager
+def nullcontext():
+    yield
+
+
+def count_tokens(sentences_as_word_lists):
+    return sum(len(word_list) for word_list in sentences_as_word_lists)
+
+
+def peak_rss_kb():
+    """ peak resident set size of this process so far, in KB. (it is a high-water mark: it only goes down if reset,
+    see reset_peak_rss)
+    """
+    peak = _proc_status_kb('VmHWM')
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak //= 1024  # macOS reports bytes, Linux reports KB
+    return peak
+
+
+def rss_kb():
+    """ resident set size of this process right now, in KB (None where that can't be read)
+    """
+    return _proc_status_kb('VmRSS')
+
+
+def reset_peak_rss():
+    """ reset the high-water mark of peak_rss_kb() to the current RSS, where the OS allows that (Linux 4.0+)
+
+    :return: True if it was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (IOError, OSError):
+        return False
+    return _proc_status_kb('VmHWM') is not None
+
+
+def _proc_status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+class StageMeasurement(object):
+    """ collects what one benchmark measured, and records it on the pytest-benchmark fixture's `extra_info`
+
+    pytest-benchmark writes `extra_info` into its JSON output (`--benchmark-json`, `--benchmark-autosave`),
+    so that is where these numbers end up, next to the timing stats. they (and the per-round timings) are also
+    collected for the regression gate, see `regressions`.
+    """
+
+    def __init__(self, benchmark, stage, **params):
+        self.benchmark = benchmark
+        self.benchmark.group = stage
+        self.info = dict(stage=stage, **params)
+        # a peak of this benchmark's own: reset the high-water mark, and measure from what's resident now. (where that
+        # can't be done, it's how much the process-wide peak rose - 0 for anything smaller than an earlier benchmark)
+        if reset_peak_rss():
+            self._rss_kb_before = rss_kb()
+        else:
+            self._rss_kb_before = peak_rss_kb()
+
+    def record(self, byte_count=None, token_count=None, sentence_count=None):
+        """ call after the benchmark has run. counts are per round (i.e. per call of the benchmarked function)
+        """
+        mean = self.benchmark.stats['mean'] if self.benchmark.stats else None
+        for name, count in (('bytes', byte_count), ('tokens', token_count), ('sentences', sentence_count)):
+            if count is None:
+                continue
+            self.info[name] = count
+            if mean:
+                self.info[name + '_per_sec'] = count / mean
+
+        peak = peak_rss_kb()
+        self.info['peak_rss_kb'] = peak
+        self.info['peak_rss_growth_kb'] = max(peak - self._rss_kb_before, 0)
+
+        self.benchmark.extra_info.update(self.info)
+        if self.benchmark.stats:
+            regressions.collected_results.append(
+                    regressions.make_result(dict(self.info), self.benchmark.stats.stats.data))
+        return self.info
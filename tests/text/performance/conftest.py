@@ -0,0 +1,69 @@
+""" parametrize the pipeline benchmarks from the command line; see `--bench-corpus-sizes`, `--bench-ngram-sizes`
+
+also hooks up the regression gate (`--bench-compare`, `--bench-promote`); see `regressions`.
+"""
+from . import benchmarking
+from . import regressions
+
+
+def pytest_generate_tests(metafunc):
+    if 'corpus_size' in metafunc.fixturenames:
+        sizes = benchmarking.parse_csv(metafunc.config.getoption("--bench-corpus-sizes"))
+        metafunc.parametrize('corpus_size', map(benchmarking.parse_size, sizes), ids=sizes)
+
+    if 'ngram_size' in metafunc.fixturenames:
+        ngram_sizes = benchmarking.parse_csv(metafunc.config.getoption("--bench-ngram-sizes"), int)
+        metafunc.parametrize('ngram_size', ngram_sizes)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """ compare against (and/or promote to) the baseline, once all the benchmarks have run.
+
+    (this runs before the terminal summary is written, so the outcome is stashed on config for that to report)
+    """
+    config = session.config
+    if hasattr(config, 'workerinput'):
+        # an xdist worker: it only has its own share of the results. the gate is for the whole run, so leave it be
+        return
+    results = regressions.collected_results
+    if not results:
+        return
+
+    baseline_path = config.getoption("--bench-baseline")
+    if config.getoption("--bench-compare"):
+        baseline = regressions.load_baseline(baseline_path)
+        found = regressions.find_regressions(baseline, results, config.getoption("--bench-tolerance"))
+        config._bench_comparison = (baseline_path, len([r for r in results if r['key'] in baseline]), found)
+        if found and session.exitstatus == 0:
+            session.exitstatus = 1
+
+    if config.getoption("--bench-promote"):
+        if exitstatus == 0:
+            regressions.promote_to_baseline(baseline_path, results)
+            config._bench_promoted = (baseline_path, len(results))
+        else:
+            config._bench_promoted = (baseline_path, None)
+
+
+def pytest_terminal_summary(terminalreporter):
+    config = terminalreporter.config
+
+    comparison = getattr(config, '_bench_comparison', None)
+    if comparison:
+        baseline_path, compared_count, found = comparison
+        terminalreporter.section("benchmark regressions vs. {}".format(baseline_path))
+        if not compared_count:
+            terminalreporter.write_line("nothing to compare: none of these benchmarks are in the baseline yet "
+                                        "(create it with --bench-promote)")
+        for regression in found:
+            terminalreporter.write_line(regressions.format_regression(regression), red=True)
+        if compared_count and not found:
+            terminalreporter.write_line("no regressions in {} benchmarks".format(compared_count), green=True)
+
+    promoted = getattr(config, '_bench_promoted', None)
+    if promoted:
+        baseline_path, promoted_count = promoted
+        if promoted_count is None:
+            terminalreporter.write_line("NOT promoting to baseline {}: this run had failures".format(baseline_path))
+        else:
+            terminalreporter.write_line("promoted {} benchmarks to baseline {}".format(promoted_count, baseline_path))
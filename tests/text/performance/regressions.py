@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+""" regression gate for the pipeline benchmarks: compare a run against a stored baseline, or promote it to baseline
+
+wired up to py.test in `conftest.py` (same folder); usage, after a run you are happy with:
+
+    $ py.test tests/text/performance --runslow --bench-promote              # store/refresh the baseline
+    $ py.test tests/text/performance --runslow --bench-compare              # exit code 1 if something regressed
+
+the baseline is plain JSON (default `.benchmarks/baseline.json`, see `--bench-baseline`), keyed per stage, strategy,
+tokenizer, joiner, ngram size and corpus size (and any other parameter in KEY_FIELDS). promoting only replaces
+the keys that were in the current run, so you can promote (or compare) a subset selected with `-k`.
+
+what counts as a regression:
+    * throughput: per-round time per unit of work (per token, or per byte/sentence where there are no tokens)
+        got slower by more than `--bench-tolerance`, AND a one-sided Welch's t-test on the rounds says the slowdown
+        is significant (p < SIGNIFICANCE_LEVEL). the per-unit normalization matters for 'generate', where
+        sentence lengths (so, work per round) vary from run to run.
+    * memory: the benchmark's own peak RSS growth (`peak_rss_growth_kb`: how far RSS peaked above where it was when
+        the benchmark started - not the process-wide peak, which is whatever the biggest benchmark so far left it at,
+        so it would depend on which ran, and in what order). there is only one reading per benchmark, so no
+        significance test is possible. instead, it must grow by more than `--bench-tolerance` AND by more than
+        MEMORY_NOISE_FLOOR_KB.
+
+(baselines are only meaningful on the machine they were made on. don't compare across machines.)
+(with xdist, e.g. `-n 6`, only the controller process compares or promotes - never the workers, each with its share.)
+"""
+import collections
+import json
+import math
+import os
+
+BASELINE_FORMAT_VERSION = 2
+SIGNIFICANCE_LEVEL = 0.05
+MEMORY_NOISE_FLOOR_KB = 4096
+
+# what identifies "the same benchmark" between runs; see result_key()
+KEY_FIELDS = ('strategy', 'tokenizer', 'joiner', 'ngram_size', 'corpus_bytes', 'tracing')
+
+Regression = collections.namedtuple('Regression', ['key', 'kind', 'baseline', 'current', 'change', 'p_value'])
+
+# filled in by StageMeasurement.record(), read by the conftest hooks at the end of the session
+collected_results = []
+
+
+def result_key(info):
+    """
+        >>> result_key({'stage': 'generate', 'strategy': 'pymc', 'ngram_size': 2, 'tokens_per_sec': 12.3})
+        'generate[strategy=pymc,ngram_size=2]'
+    """
+    return "{}[{}]".format(
+            info['stage'], ",".join("{}={}".format(field, info[field]) for field in KEY_FIELDS if field in info))
+
+
+def make_result(info, round_times):
+    """ from what one benchmark measured, make the record that goes into a baseline
+
+    :param info: the `extra_info` recorded by StageMeasurement
+    :param round_times: seconds taken by each round
+    """
+    unit = next((unit for unit in ('tokens', 'bytes', 'sentences') if info.get(unit)), None)
+    units_per_round = float(info[unit]) if unit else 1.0
+    return {
+        'key': result_key(info),
+        'info': info,
+        'unit': unit or 'round',
+        'seconds_per_unit': [seconds / units_per_round for seconds in round_times],
+        'peak_rss_growth_kb': info.get('peak_rss_growth_kb'),
+    }
+
+
+def load_baseline(path):
+    """ :return: dict of {key: result}; empty if there's no baseline at `path` yet
+        :raises ValueError: if the baseline is not JSON, or is in another format version
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        baseline = json.load(f)
+    version = baseline.get('version') if isinstance(baseline, dict) else None
+    if version != BASELINE_FORMAT_VERSION:
+        raise ValueError("baseline {} has format version {!r}, expected {!r}. re-create it with --bench-promote".format(
+                path, version, BASELINE_FORMAT_VERSION))
+    return baseline['results']
+
+
+def promote_to_baseline(path, results):
+    """ write results into the baseline at `path`, replacing those keys (other keys in the baseline are kept).
+    a baseline that can't be read, or is in another format version, is replaced outright. (that's how to re-create it)
+    """
+    try:
+        baseline = load_baseline(path)
+    except (IOError, ValueError):
+        baseline = {}
+    baseline.update((result['key'], result) for result in results)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump({'version': BASELINE_FORMAT_VERSION, 'results': baseline}, f, indent=2, sort_keys=True)
+    return baseline
+
+
+def find_regressions(baseline, results, tolerance):
+    """ compare results against baseline (results w/o a baseline are skipped; new benchmarks can't regress)
+
+        >>> baseline = {'x': {'key': 'x', 'seconds_per_unit': [1.0, 1.1, 0.9], 'peak_rss_growth_kb': 50000}}
+        >>> slower = {'key': 'x', 'seconds_per_unit': [2.0, 2.1, 1.9], 'peak_rss_growth_kb': 50000}
+        >>> [(r.kind, round(r.change, 2)) for r in find_regressions(baseline, [slower], tolerance=0.1)]
+        [('throughput', 1.0)]
+        >>> noisy = {'key': 'x', 'seconds_per_unit': [0.6, 1.9, 1.1], 'peak_rss_growth_kb': 50000}
+        >>> find_regressions(baseline, [noisy], tolerance=0.1)   # slower on average, but not significantly
+        []
+        >>> bigger = {'key': 'x', 'seconds_per_unit': [1.0, 1.1, 0.9], 'peak_rss_growth_kb': 100000}
+        >>> [(r.kind, r.baseline, r.current) for r in find_regressions(baseline, [bigger], tolerance=0.1)]
+        [('memory', 50000, 100000)]
+        >>> grew_a_little = dict(bigger, peak_rss_growth_kb=50000 + MEMORY_NOISE_FLOOR_KB - 1)
+        >>> find_regressions(baseline, [grew_a_little], tolerance=0.01)   # under the noise floor
+        []
+        >>> find_regressions(baseline, [dict(slower, key='new')], tolerance=0.1)
+        []
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result['key'])
+        if base is None:
+            continue
+
+        base_mean, current_mean = _mean(base['seconds_per_unit']), _mean(result['seconds_per_unit'])
+        if base_mean and current_mean > base_mean * (1 + tolerance):
+            p_value = welch_t_test_p_value(base['seconds_per_unit'], result['seconds_per_unit'])
+            if p_value < SIGNIFICANCE_LEVEL:
+                regressions.append(Regression(result['key'], 'throughput', base_mean, current_mean,
+                                              current_mean / base_mean - 1, p_value))
+
+        base_rss, current_rss = base.get('peak_rss_growth_kb'), result.get('peak_rss_growth_kb')
+        if base_rss is not None and current_rss is not None and current_rss > base_rss * (1 + tolerance) and \
+                current_rss - base_rss > MEMORY_NOISE_FLOOR_KB:
+            regressions.append(Regression(result['key'], 'memory', base_rss, current_rss,
+                                          float(current_rss) / base_rss - 1 if base_rss else float('inf'), None))
+    return regressions
+
+
+def format_regression(regression):
+    if regression.kind == 'throughput':
+        return "{0.key}: {0.change:+.1%} time per unit (p={0.p_value:.3g})".format(regression)
+    return "{0.key}: {0.change:+.1%} peak RSS growth ({0.baseline} KB -> {0.current} KB)".format(regression)
+
+
+def welch_t_test_p_value(baseline_samples, current_samples):
+    """ one-sided Welch's t-test: p-value for "current samples have a higher mean than baseline samples"
+
+        >>> round(welch_t_test_p_value([1.0, 1.1, 0.9], [2.0, 2.1, 1.9]), 5)
+        0.00013
+        >>> welch_t_test_p_value([1.0, 1.1, 0.9], [1.0, 1.1, 0.9])
+        0.5
+        >>> welch_t_test_p_value([1.0, 1.0], [2.0, 2.0])  # no variance at all: any slowdown is "certain"
+        0.0
+        >>> welch_t_test_p_value([1.0], [2.0])  # can't say anything from 1 sample each
+        1.0
+    """
+    n_a, n_b = len(baseline_samples), len(current_samples)
+    if n_a < 2 or n_b < 2:
+        return 1.0
+
+    mean_a, mean_b = _mean(baseline_samples), _mean(current_samples)
+    var_a, var_b = _variance(baseline_samples), _variance(current_samples)
+    standard_error_squared = var_a / n_a + var_b / n_b
+    if standard_error_squared == 0:
+        return 0.0 if mean_b > mean_a else 1.0
+
+    t = (mean_b - mean_a) / math.sqrt(standard_error_squared)
+    degrees_of_freedom = standard_error_squared ** 2 / (
+        (var_a / n_a) ** 2 / (n_a - 1) + (var_b / n_b) ** 2 / (n_b - 1))
+
+    # survival function of Student's t, via the regularized incomplete beta function
+    tail = 0.5 * _regularized_incomplete_beta(
+            degrees_of_freedom / 2.0, 0.5, degrees_of_freedom / (degrees_of_freedom + t * t))
+    return tail if t > 0 else 1.0 - tail
+
+
+def _mean(samples):
+    return float(sum(samples)) / len(samples) if samples else 0.0
+
+
+def _variance(samples):
+    mean = _mean(samples)
+    return sum((sample - mean) ** 2 for sample in samples) / (len(samples) - 1)
+
+
+def _regularized_incomplete_beta(a, b, x):
+    """ I_x(a, b), by continued fraction (Numerical Recipes' betacf). good to ~1e-10, plenty for a p-value
+    """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(log_front) * _beta_continued_fraction(a, b, x) / a
+    return 1.0 - math.exp(log_front) * _beta_continued_fraction(b, a, 1.0 - x) / b
+
+
+def _beta_continued_fraction(a, b, x, max_iterations=200, epsilon=1e-12, tiny=1e-300):
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in xrange(1, max_iterations + 1):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= d * c
+        if abs(d * c - 1.0) < epsilon:
+            break
+    return result
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+""" benchmarks for each stage of the pipeline: clean, tokenize, train, generate, join, proofread. and serving requests
+
+these are disabled by default. to run these, pass "--runslow" to py.test. will be run by `make test-all` or `tox`, too.
+`make benchmark` runs just these, and writes machine-readable results to JSON.
+
+    * each stage is timed on its own (inputs for a stage are prepared, and memoized, outside of the timing)
+    * parametrized by strategy, tokenizer, joiner where relevant; and by corpus size and ngram size, which
+        can be given on the command line: `--bench-corpus-sizes=16KB,1MB,1GB --bench-ngram-sizes=1,2,3,4,5,6`
+    * alongside pytest-benchmark's timing stats, each benchmark records bytes/tokens/sentences per round,
+        the matching per-second throughput, and peak RSS, in `extra_info`. With `--benchmark-json=<path>`
+        (or `--benchmark-autosave`) all of that goes into the JSON, so runs can be compared.
+    * to catch regressions, store a baseline with `--bench-promote` (`make benchmark-promote`), and later compare
+        against it with `--bench-compare` (`make benchmark-compare`); see `regressions` for what gets flagged.
+
+notes on reading the numbers:
+    * the corpora are made by cycling through the plaintext fixtures, so they are repetitive. that's fine for
+        throughput, but the models (and so, generation) of a 1GB corpus won't look like a 1GB corpus of real text.
+    * `peak_rss_growth_kb` is the benchmark's own memory: how far RSS peaked above where it was when the benchmark
+        started. (on Linux, the high-water mark is reset before each benchmark, so this doesn't depend on which
+        benchmarks ran before it; elsewhere, it's how much the process-wide peak rose, which does.) `peak_rss_kb` is
+        the process-wide peak, for reference. the regression gate compares the growth.
+"""
+import json
+
+import pytest
+
+from presswork import constants
+from presswork import serving
+from presswork.text import clean
+from presswork.text import text_makers
+from presswork.text.grammar import joiners
+from presswork.text.grammar import tokenizers
+from tests.text.performance import benchmarking
+from tests.text.performance.benchmarking import StageMeasurement, count_tokens
+
+ROUNDS = 3
+SENTENCES_PER_ROUND = 1000
+
+# requests are small & quick; it takes more rounds to see what one costs
+REQUEST_ROUNDS = 100
+SENTENCES_PER_REQUEST = 10
+
+
+@pytest.mark.slow
+def test_clean(benchmark, corpus_size):
+    corpus = benchmarking.corpus_of_size(corpus_size)
+    measurement = StageMeasurement(benchmark, 'clean', corpus_bytes=len(corpus))
+
+    benchmark.pedantic(clean.CleanInputString, args=(corpus,), rounds=ROUNDS)
+
+    measurement.record(byte_count=len(corpus))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('tokenizer', tokenizers.TOKENIZER_NICKNAMES)
+def test_tokenize(benchmark, corpus_size, tokenizer):
+    text = clean.CleanInputString(benchmarking.corpus_of_size(corpus_size))
+    sentence_tokenizer = tokenizers.create_sentence_tokenizer(tokenizer)
+    measurement = StageMeasurement(benchmark, 'tokenize', corpus_bytes=len(text), tokenizer=tokenizer)
+
+    sentences = benchmark.pedantic(sentence_tokenizer.tokenize, args=(text,), rounds=ROUNDS)
+
+    measurement.record(byte_count=len(text), token_count=count_tokens(sentences), sentence_count=len(sentences))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+@pytest.mark.parametrize('tokenizer', tokenizers.TOKENIZER_NICKNAMES)
+def test_train(benchmark, corpus_size, tokenizer, strategy, ngram_size):
+    sentences = benchmarking.tokenized_corpus(corpus_size, tokenizer)
+    measurement = StageMeasurement(benchmark, 'train', corpus_bytes=corpus_size, tokenizer=tokenizer,
+                                   strategy=strategy, ngram_size=ngram_size)
+
+    def setup():
+        # text makers lock after input_text(), so each round gets a fresh one
+        text_maker = benchmarking.untrained_text_maker(corpus_size, tokenizer, strategy, ngram_size)
+        return (text_maker,), {}
+
+    benchmark.pedantic(lambda text_maker: text_maker.input_text(u""), setup=setup, rounds=ROUNDS)
+
+    measurement.record(token_count=count_tokens(sentences), sentence_count=len(sentences))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+@pytest.mark.parametrize('tokenizer', tokenizers.TOKENIZER_NICKNAMES)
+def test_generate(benchmark, corpus_size, tokenizer, strategy, ngram_size):
+    text_maker = benchmarking.trained_text_maker(corpus_size, tokenizer, strategy, ngram_size)
+    measurement = StageMeasurement(benchmark, 'generate', corpus_bytes=corpus_size, tokenizer=tokenizer,
+                                   strategy=strategy, ngram_size=ngram_size)
+
+    sentences = benchmark.pedantic(text_maker.make_sentences, args=(SENTENCES_PER_ROUND,), rounds=ROUNDS)
+
+    measurement.record(token_count=count_tokens(sentences), sentence_count=len(sentences))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('tracing', ['off', 'on'])
+def test_generate_crude_tracing(benchmark, corpus_size, ngram_size, tracing):
+    """ what tracing costs the crude engine's generation loop. 'off' is the default; it should be ~free.
+
+    'on' formats every trace event, like a real log handler would, so it also shows roughly what generation used to
+    cost when the loop formatted a debug message for every token, logged or not.
+    """
+    text_maker = benchmarking.trained_text_maker(corpus_size, 'just_whitespace', 'crude', ngram_size)
+    measurement = StageMeasurement(benchmark, 'generate_tracing', corpus_bytes=corpus_size, tokenizer='just_whitespace',
+                                   strategy='crude', ngram_size=ngram_size, tracing=tracing)
+
+    with benchmarking.tracing_formatted_and_discarded() if tracing == 'on' else benchmarking.nullcontext():
+        sentences = benchmark.pedantic(text_maker.make_sentences, args=(SENTENCES_PER_ROUND,), rounds=ROUNDS)
+
+    measurement.record(token_count=count_tokens(sentences), sentence_count=len(sentences))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('joiner', joiners.JOINER_NICKNAMES)
+@pytest.mark.parametrize('tokenizer', tokenizers.TOKENIZER_NICKNAMES)
+def test_join(benchmark, corpus_size, tokenizer, joiner):
+    sentences = benchmarking.trained_text_maker(
+            corpus_size, tokenizer, text_makers.DEFAULT_TEXT_MAKER_NICKNAME, constants.DEFAULT_NGRAM_SIZE,
+    ).make_sentences(SENTENCES_PER_ROUND)
+    measurement = StageMeasurement(benchmark, 'join', corpus_bytes=corpus_size, tokenizer=tokenizer, joiner=joiner)
+
+    def setup():
+        # a fresh joiner each round, so memoization inside a joiner doesn't carry over between rounds
+        return (joiners.create_joiner(joiner),), {}
+
+    text = benchmark.pedantic(lambda a_joiner: a_joiner.join(sentences), setup=setup, rounds=ROUNDS)
+
+    measurement.record(byte_count=len(text), token_count=count_tokens(sentences), sentence_count=len(sentences))
+
+
+@pytest.mark.slow
+def test_proofread(benchmark, corpus_size):
+    text_maker = benchmarking.trained_text_maker(
+            corpus_size, 'nltk', text_makers.DEFAULT_TEXT_MAKER_NICKNAME, constants.DEFAULT_NGRAM_SIZE)
+    sentences = text_maker.make_sentences(SENTENCES_PER_ROUND)
+    text = joiners.create_joiner('nltk').join(sentences)
+    measurement = StageMeasurement(benchmark, 'proofread', corpus_bytes=corpus_size)
+
+    benchmark.pedantic(clean.OutputProofreader().proofread, args=(text,), rounds=ROUNDS)
+
+    measurement.record(byte_count=len(text), token_count=count_tokens(sentences), sentence_count=len(sentences))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_serve_request(benchmark, corpus_size, strategy, ngram_size):
+    """ one request to a warm server, JSON line in to JSON line out: that's sampling, joining, proofreading, and JSON.
+    (compare with the 'train' benchmarks, for what a CLI invocation pays on top of that, every time)
+    """
+    text_maker = benchmarking.trained_text_maker(corpus_size, 'nltk', strategy, ngram_size)
+    model_server = serving.ModelServer({strategy: text_maker})
+    request = json.dumps({"model": strategy, "count": SENTENCES_PER_REQUEST})
+    measurement = StageMeasurement(benchmark, 'serve_request', corpus_bytes=corpus_size, tokenizer='nltk',
+                                   strategy=strategy, ngram_size=ngram_size)
+
+    response = benchmark.pedantic(model_server.handle_line, args=(request,), rounds=REQUEST_ROUNDS)
+
+    assert "text" in json.loads(response)
+    measurement.record(sentence_count=SENTENCES_PER_REQUEST)
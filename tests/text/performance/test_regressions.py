@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+""" Tests for the benchmarks' regression gate: the baseline file. (the comparison itself is covered by doctests)
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from tests.text.performance import regressions
+
+
+@pytest.fixture
+def baseline_path():
+    directory = tempfile.mkdtemp()
+    yield os.path.join(directory, "baseline.json")
+    shutil.rmtree(directory)
+
+
+def _result(key):
+    return {'key': key, 'seconds_per_unit': [1.0, 1.1], 'peak_rss_growth_kb': 1000}
+
+
+@pytest.mark.parametrize('stale', [
+    {'version': 1, 'results': {'old': {'peak_rss_kb': 1000}}},
+    ['not', 'a', 'baseline'],
+    "{not even JSON",
+])
+def test_promote_replaces_a_stale_baseline(baseline_path, stale):
+    with open(baseline_path, 'w') as f:
+        f.write(stale if isinstance(stale, str) else json.dumps(stale))
+    with pytest.raises(ValueError):
+        regressions.load_baseline(baseline_path)   # (comparing against it is still an error)
+
+    regressions.promote_to_baseline(baseline_path, [_result('new')])
+
+    assert regressions.load_baseline(baseline_path) == {'new': _result('new')}
+
+
+def test_promote_keeps_other_keys(baseline_path):
+    regressions.promote_to_baseline(baseline_path, [_result('a'), _result('b')])
+    regressions.promote_to_baseline(baseline_path, [dict(_result('b'), peak_rss_growth_kb=2000)])
+
+    baseline = regressions.load_baseline(baseline_path)
+    assert sorted(baseline) == ['a', 'b']
+    assert baseline['b']['peak_rss_growth_kb'] == 2000
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+""" tests for the containers, beyond the doctests - mainly that CompactSentencesAsWordLists is a drop-in alternative
+"""
+import sys
+
+import pytest
+
+from presswork.text import clean
+from presswork.text import text_makers
+from presswork.text.grammar import containers
+from presswork.text.grammar import tokenizers
+from tests import helpers
+
+
+def _deep_sizeof_word_lists(sentences):
+    """ rough deep size of a list-of-lists container: containers, plus each distinct token object once
+    """
+    seen_token_ids = set()
+    size = sys.getsizeof(sentences) + sys.getsizeof(getattr(sentences, 'data', None))
+    for word_list in getattr(sentences, 'data', sentences):
+        size += sys.getsizeof(word_list) + sys.getsizeof(getattr(word_list, 'data', None))
+        for token in word_list:
+            if id(token) not in seen_token_ids:
+                seen_token_ids.add(id(token))
+                size += sys.getsizeof(token)
+    return size
+
+
+def _deep_sizeof_compact(compact):
+    return (sys.getsizeof(compact.token_ids) + sys.getsizeof(compact.sentence_offsets) +
+            sys.getsizeof(compact.vocabulary) + sys.getsizeof(compact._vocabulary.ids_by_token) +
+            sum(sys.getsizeof(token) for token in compact.vocabulary))
+
+
+@pytest.mark.parametrize('tokenizer_nickname', tokenizers.TOKENIZER_NICKNAMES)
+def test_compact_same_as_sentences_as_word_lists(text_any, tokenizer_nickname):
+    text = clean.CleanInputString(text_any)
+    sentence_tokenizer = tokenizers.create_sentence_tokenizer(tokenizer_nickname)
+    expected = sentence_tokenizer.tokenize(text)
+
+    sentence_tokenizer.container_class = containers.CompactSentencesAsWordLists
+    compact = sentence_tokenizer.tokenize(text)
+
+    assert isinstance(compact, containers.CompactSentencesAsWordLists)
+    assert compact == expected
+    assert compact.unwrap() == expected.unwrap()
+    assert len(compact) == len(expected)
+    assert compact[len(compact) // 2] == expected[len(expected) // 2]
+    assert compact[3:-3] == expected[3:-3]
+
+    assert _deep_sizeof_compact(compact) < _deep_sizeof_word_lists(expected)
+
+
+def test_compact_takes_fraction_of_memory(text_any):
+    """ real corpora repeat their tokens a lot (Zipf); repeating a fixture is a crude stand-in for a bigger corpus
+    """
+    text = clean.CleanInputString(text_any * 10)
+    sentence_tokenizer = tokenizers.create_sentence_tokenizer('nltk')
+    expected = sentence_tokenizer.tokenize(text)
+
+    sentence_tokenizer.container_class = containers.CompactSentencesAsWordLists
+    compact = sentence_tokenizer.tokenize(text)
+
+    assert _deep_sizeof_compact(compact) < _deep_sizeof_word_lists(expected) / 4
+
+
+def test_text_makers_accept_compact_tokenizer_output(each_text_maker, text_any):
+    sentence_tokenizer = tokenizers.SentenceTokenizerNLTK()
+    sentence_tokenizer.container_class = containers.CompactSentencesAsWordLists
+
+    text_maker = each_text_maker
+    text_maker.sentence_tokenizer = sentence_tokenizer
+    _input_tokenized = text_maker.input_text(text_any)
+    assert isinstance(_input_tokenized, containers.CompactSentencesAsWordLists)
+
+    sentences = text_maker.make_sentences(200)
+
+    word_set_comparison = helpers.WordSetComparison(generated_tokens=sentences, input_tokenized=_input_tokenized)
+    assert word_set_comparison.output_is_valid_strict()
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_create_text_maker_with_compact_corpus(strategy):
+    sentence_tokenizer = tokenizers.create_sentence_tokenizer('nltk')
+    text_maker = text_makers.create_text_maker(strategy=strategy, sentence_tokenizer=sentence_tokenizer,
+                                               compact_corpus=True, rng=1)
+    assert sentence_tokenizer.container_class is containers.SentencesAsWordLists  # (copied, not changed)
+
+    compact = text_maker.input_text(helpers.ZEN_OF_PYTHON)
+    assert isinstance(compact, containers.CompactSentencesAsWordLists)
+    if strategy == 'markovify':
+        assert text_maker.strategy.parsed_sentences is compact
+
+    same_but_not_compact = text_makers.create_text_maker(strategy=strategy, sentence_tokenizer='nltk',
+                                                         input_text=helpers.ZEN_OF_PYTHON, rng=1)
+    assert text_maker.make_sentences(50) == same_but_not_compact.make_sentences(50)
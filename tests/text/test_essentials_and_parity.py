@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 """ test TextMaker variants - esp. essential properties of markov chain text generators, and parity of the strategies
 """
+import pickle
+import warnings
+
 import pytest
 
 from presswork.text import text_makers
 from presswork.text.grammar import joiners
 from presswork.text.grammar import tokenizers
 from presswork.text.markov import _crude_markov
+from presswork.text.markov import pruning
 from presswork.utils import iter_flatten
 from tests import helpers
 
@@ -120,6 +124,197 @@ def test_empty_and_null(each_text_maker, empty_or_null_string):
     assert not filter(None, iter_flatten(sentences))
 
 
+@pytest.mark.parametrize('ngram_size', [1, 2, 3])
+def test_pruned_models_still_make_valid_text(each_text_maker, ngram_size, text_newlines):
+    """ pruning shrinks the model, but what is left should still make text from the input's words, that ends
+    """
+    text_maker = each_text_maker
+    text_maker.ngram_size = ngram_size
+    _input_tokenized = text_maker.input_text(text_newlines)
+
+    report = text_maker.prune(min_count=2)
+    assert 0 < report.states_after < report.states_before
+    assert 0 < report.transitions_after < report.transitions_before
+    assert report.bytes_after < report.bytes_before
+
+    sentences = text_maker.make_sentences(200)
+    assert any(sentences)
+    word_set_comparison = helpers.WordSetComparison(generated_tokens=sentences, input_tokenized=_input_tokenized)
+    assert word_set_comparison.output_is_valid_strict()
+
+
+def test_pruning_to_top_k_followers(each_text_maker, text_newlines):
+    text_maker = each_text_maker
+    text_maker.input_text(text_newlines)
+
+    report = text_maker.prune(top_k=3)
+
+    assert report.transitions_after < report.transitions_before
+    assert max(len(counts) for counts in text_maker._transition_counts().values()) <= 3
+    assert any(text_maker.make_sentences(10))
+
+
+def test_pruning_to_memory_budget(each_text_maker, text_newlines):
+    text_maker = each_text_maker
+    text_maker.input_text(text_newlines)
+    full_size = text_maker.prune().bytes_after
+
+    report = text_maker.prune(max_bytes=full_size // 2)
+
+    assert report.bytes_after <= full_size // 2
+    assert report.min_count > 1
+    assert any(text_maker.make_sentences(10))
+
+
+def test_pruning_needs_trained_model_and_keeps_start(each_text_maker):
+    text_maker = each_text_maker
+    with pytest.raises(ValueError):
+        text_maker.prune(min_count=2)
+
+    text_maker.input_text("Foo bar baz. Foo bar quux.")
+    with pytest.raises(pruning.PruningError):
+        text_maker.prune(min_count=100)
+    assert 'Foo' in str(text_maker.make_sentences(10))  # (failed pruning leaves the model as it was)
+
+
+def test_stats_agree_with_model(each_text_maker, text_newlines):
+    """ stats() should count the same model that pruning works on; and its memory estimate should be in the ballpark
+    """
+    text_maker = each_text_maker
+    with pytest.raises(ValueError):
+        text_maker.stats()
+    text_maker.input_text(text_newlines)
+
+    estimated, exact = text_maker.stats(), text_maker.stats(exact_memory=True)
+
+    transitions = text_maker._transition_counts()
+    assert estimated.states == exact.states == len(transitions)
+    assert estimated.transitions == exact.transitions == pruning.count_transitions(transitions)
+    assert exact.max_branching == max(len(followers) for followers in transitions.values())
+    assert 1 <= exact.mean_branching <= exact.max_branching
+    assert 0 < exact.vocabulary < exact.transitions
+    assert exact.memory_is_exact and not estimated.memory_is_exact
+    assert exact.memory_bytes == text_maker._model_size()
+    assert 0.5 < float(estimated.memory_bytes) / exact.memory_bytes < 1.5
+
+    report = text_maker.prune(min_count=2)
+    after = text_maker.stats(exact_memory=True)
+    assert (after.states, after.transitions, after.memory_bytes) == (
+        report.states_after, report.transitions_after, report.bytes_after)
+
+
+@pytest.mark.parametrize('ngram_size', [1, 2, 3])
+def test_merged_model_is_same_as_trained_on_all_input(each_text_maker, ngram_size, text_newlines):
+    """ merging models (without retraining) should get the very same model as training on all their input at once
+    """
+    lines = text_newlines.splitlines()
+    halves = "\n".join(lines[:len(lines) // 2]), "\n".join(lines[len(lines) // 2:])
+
+    each_text_maker.ngram_size = ngram_size
+    trained_on_halves = []
+    for half in halves:
+        text_maker = each_text_maker.clone()
+        text_maker.input_text(half)
+        trained_on_halves.append(text_maker)
+    trained_on_all = each_text_maker
+    trained_on_all.input_text("\n".join(halves))
+
+    merged = text_makers.merge_text_makers(trained_on_halves)
+
+    assert merged.is_locked and merged.__class__ is trained_on_all.__class__
+    assert merged._transition_counts() == trained_on_all._transition_counts()
+    assert merged.stats()[:5] == trained_on_all.stats()[:5]
+    assert any(merged.make_sentences(10))
+
+
+def test_merging_with_weights(each_text_maker):
+    text_maker_1 = each_text_maker
+    text_maker_2 = text_maker_1.clone()
+    text_maker_1.input_text(u"Foo bar baz.")
+    text_maker_2.input_text(u"Foo bar quux.")
+
+    merged = text_makers.merge_text_makers([text_maker_1, text_maker_2], weights=[3, 1])
+
+    followers_of_bar = [counts for state, counts in merged._transition_counts().items() if state[-1] == u"bar"]
+    assert {u"baz.": 3, u"quux.": 1} in followers_of_bar
+    sentences = [u" ".join(sentence).strip() for sentence in merged.make_sentences(400)]
+    assert 0.6 < sentences.count(u"Foo bar baz.") / 400.0 < 0.9
+
+
+def test_merged_text_maker_has_its_own_joiner_and_rng():
+    def trained(joiner):
+        return text_makers.create_text_maker(input_text=u"Foo is better than bar. Bar is better than baz.",
+                                             joiner=joiner, rng=1)
+    sources = [trained("random_enjamb"), trained("random_enjamb")]
+
+    merged = text_makers.merge_text_makers(sources)
+    assert isinstance(merged.joiner, joiners.JoinerNLTKWithRandomEnjambment)
+    assert all(merged.joiner is not source.joiner for source in sources)
+
+    def make_text(**kwargs):
+        text_maker = text_makers.merge_text_makers(sources, **kwargs)
+        return text_maker.join(text_maker.make_sentences(20))
+    assert make_text(rng=3) == make_text(rng=3)
+    assert make_text(rng=3) != make_text(rng=4)
+    assert isinstance(text_makers.merge_text_makers(sources, joiner="just_whitespace").joiner, joiners.JoinerWhitespace)
+
+
+def test_merging_only_same_kind_of_trained_models():
+    def trained(strategy="markovify", ngram_size=2, tokenizer="just_whitespace"):
+        return text_makers.create_text_maker(
+                strategy=strategy, ngram_size=ngram_size, sentence_tokenizer=tokenizer, input_text=u"Foo bar baz.")
+
+    for mismatched in (trained(strategy="pymc"), trained(ngram_size=3), trained(tokenizer="nltk"),
+                       text_makers.create_text_maker(strategy="markovify")):
+        with pytest.raises(ValueError):
+            text_makers.merge_text_makers([trained(), mismatched])
+
+    with pytest.raises(ValueError):
+        text_makers.merge_text_makers([trained(), trained()], weights=[1, 0])
+    with pytest.raises(ValueError):
+        text_makers.merge_text_makers([trained(), trained()], weights=[1])
+    with pytest.raises(ValueError):
+        text_makers.merge_text_makers([trained("crude"), trained("crude")], weights=[1, 0.5])
+    assert text_makers.merge_text_makers([trained("pymc"), trained("pymc")], weights=[1, 0.5]).make_sentences(1)
+
+
+def test_saved_model_loads_as_the_same_model(each_text_maker, text_newlines, tmpdir):
+    filename = str(tmpdir.join("saved.model"))
+    with pytest.raises(ValueError):
+        text_makers.save_text_maker(each_text_maker, filename)   # (not trained yet)
+
+    each_text_maker.ngram_size = 3
+    _input_tokenized = each_text_maker.input_text(text_newlines)
+    text_makers.save_text_maker(each_text_maker, filename)
+    assert text_makers.is_model_file(filename)
+
+    loaded = text_makers.load_text_maker(filename, joiner="just_whitespace")
+
+    assert loaded.is_locked and loaded.__class__ is each_text_maker.__class__ and loaded.ngram_size == 3
+    assert isinstance(loaded.joiner, joiners.JoinerWhitespace)
+    assert loaded._transition_counts() == each_text_maker._transition_counts()
+    assert loaded.stats()[:5] == each_text_maker.stats()[:5]
+    word_set_comparison = helpers.WordSetComparison(
+            generated_tokens=loaded.make_sentences(100), input_tokenized=_input_tokenized)
+    assert word_set_comparison.output_is_valid_strict()
+
+    # same tokenizer, so it can still be merged with what it was saved from
+    assert text_makers.merge_text_makers([loaded, each_text_maker]).make_sentences(1)
+
+
+def test_loading_only_model_files(tmpdir):
+    not_a_model = tmpdir.join("input.txt")
+    not_a_model.write("Foo bar baz.")
+    assert not text_makers.is_model_file(str(not_a_model))
+    assert not text_makers.is_model_file(str(tmpdir.join("missing.model")))
+    with pytest.raises(ValueError):
+        text_makers.load_text_maker(str(not_a_model))
+
+    future_model = tmpdir.join("future.model")
+    future_model.write(text_makers.MODEL_FILE_HEADER + pickle.dumps({'version': 99}))
+    with pytest.raises(ValueError):
+        text_makers.load_text_maker(str(future_model))
+
 def _test_self_ensure_test_would_fail_if_comparison_was_invalid(generated_tokens, input_tokenized):
     """ for posterity, let's add a self-check to make sure failure WOULD happen when it should.
 
@@ -254,3 +449,97 @@ def test_mismatched_ngram_size_for_crude():
     with pytest.raises(ValueError):
         generator = _crude_markov.iter_make_sentences(model, count=10, ngram_size=ngram_size + 1)
         generator.next()
+
+
+def test_crude_generation_setup_does_not_copy_keys():
+    """ make_sentences() used to call `model.keys()` (a copy of every key, in py2) before generating anything
+    """
+
+    class NoKeysModel(_crude_markov.CrudeMarkovModel):
+        def keys(self):
+            raise AssertionError("keys() copies every key!")
+
+    tokenize = tokenizers.SentenceTokenizerWhitespace().tokenize
+    model = NoKeysModel(_crude_markov.crude_markov_chain(tokenize("foo bar baz"), ngram_size=2), ngram_size=2)
+
+    assert list(_crude_markov.iter_make_sentences(model, count=3, ngram_size=2)) == [["foo", "bar", "baz", ""]] * 3
+
+
+def test_crude_model_metadata_survives_pickling():
+    tokenize = tokenizers.SentenceTokenizerWhitespace().tokenize
+    model = _crude_markov.crude_markov_chain(tokenize("foo bar baz"), ngram_size=3)
+
+    for protocol in (0, pickle.HIGHEST_PROTOCOL):
+        unpickled = pickle.loads(pickle.dumps(model, protocol=protocol))
+        assert unpickled == model
+        assert (unpickled.ngram_size, unpickled.start_state) == (3, model.start_state)
+
+
+@pytest.mark.parametrize('ngram_size', [1, 2, 3])
+def test_crude_sentences_are_complete(text_newlines, ngram_size):
+    """ every sentence should end with END_SYMBOL, instead of getting cut off at max_loops_per_sentence.
+
+    (with ngram_size=1, sentences used to never end on their own: END_SYMBOL == START_SYMBOL, so the state after the
+    end of sentence was the start state, and generation carried on into the next sentence.)
+    """
+    sentences_as_word_lists = tokenizers.SentenceTokenizerWhitespace().tokenize(text_newlines)
+    model = _crude_markov.crude_markov_chain(sentences_as_word_lists, ngram_size=ngram_size)
+    longest_input_sentence = max(len(word_list) for word_list in sentences_as_word_lists)
+
+    max_loops_per_sentence = longest_input_sentence + 1
+    sentences = list(_crude_markov.iter_make_sentences(
+            model, ngram_size=ngram_size, count=500, max_loops_per_sentence=max_loops_per_sentence))
+
+    assert all(sentence[-1] == _crude_markov.END_SYMBOL for sentence in sentences)
+    assert all(len(sentence) <= max_loops_per_sentence + 1 for sentence in sentences)
+
+
+def test_crude_with_byte_string_tokens_does_not_warn():
+    """ END_SYMBOL is unicode. comparing non-ASCII byte strings with it would warn (UnicodeWarning), every time
+    """
+    sentences_as_word_lists = [["Na\xc3\xafve", "is", "better", "than", "clever."], ["Foo", "is", "na\xc3\xafve."]]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for ngram_size in (1, 2):
+            model = _crude_markov.crude_markov_chain(sentences_as_word_lists, ngram_size=ngram_size)
+            sentences = list(_crude_markov.iter_make_sentences(model, ngram_size=ngram_size, count=20))
+            assert all(sentence[-1] == _crude_markov.END_SYMBOL for sentence in sentences)
+
+
+def test_crude_avoids_doomed_states():
+    """ hand-made model, where 'loop' can never get to the end of a sentence: generation should never go there
+    """
+    model = _crude_markov.CrudeMarkovModel({
+        (u'',): [u'go', u'loop', u'loop', u'loop'],
+        (u'go',): [u'on', u''],
+        (u'on',): [u'go'],
+        (u'loop',): [u'loop'],
+    }, ngram_size=1)
+
+    assert model.doomed_states == [(u'loop',)]
+    assert model.steps_to_end[(u'',)] == 2
+
+    for sentence in _crude_markov.iter_make_sentences(model, ngram_size=1, count=200, max_loops_per_sentence=4):
+        assert u'loop' not in sentence
+        assert sentence[-1] == _crude_markov.END_SYMBOL
+        assert len(sentence) <= 5
+
+
+def test_crude_pruning_leaves_no_doomed_states():
+    """ after pruning, crude's model should have no dead ends left - not even unviable followers to steer around
+    """
+    model = _crude_markov.CrudeMarkovModel({
+        (u'',): [u'go', u'go', u'rare'],
+        (u'go',): [u'on', u'on', u'', u''],
+        (u'on',): [u'go', u'go'],
+        (u'rare',): [u''],
+    }, ngram_size=1)
+    text_maker = text_makers.TextMakerCrude(ngram_size=1)
+    text_maker._model = model
+    text_maker._lock()
+
+    report = text_maker.prune(min_count=2)
+
+    assert (report.states_removed, report.transitions_removed) == (1, 2)
+    assert text_maker._model.doomed_states == [] and text_maker._model.viable_followers == {}
+    assert u'rare' not in str(text_maker.make_sentences(50))
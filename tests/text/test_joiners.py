@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+""" tests for Joiners, beyond the doctests - mainly parity of optimized joining against the straightforward approach
+"""
+import random
+
+import pytest
+
+from presswork.text import clean
+from presswork.text.grammar import joiners
+from presswork.text.grammar import tokenizers
+
+
+def _reference_join_word_seq(joiner, word_list):
+    """ the original JoinerNLTK approach: detokenize to a string, re-split it, re-join through the base class
+    """
+    sentence_string = joiner.detokenizer.detokenize(word_list, return_str=True)
+    return joiners.Joiner._join_word_seq(joiner, word_list=sentence_string.split())
+
+
+@pytest.mark.parametrize('sentence_tokenizer', [
+    tokenizers.SentenceTokenizerNLTK(),
+    tokenizers.SentenceTokenizerNLTK(word_tokenizer=tokenizers.WordTokenizerWhitespace()),
+    tokenizers.SentenceTokenizerWhitespace(),
+])
+@pytest.mark.parametrize('separate_words', [" ", "_", "", None])
+def test_joiner_nltk_same_output_as_reference(text_any, sentence_tokenizer, separate_words):
+    sentences = sentence_tokenizer.tokenize(clean.CleanInputString(text_any))
+    joiner = joiners.JoinerNLTK(separate_words=separate_words)
+
+    for sentence in sentences:
+        assert joiner._join_word_seq(sentence) == _reference_join_word_seq(joiner, sentence)
+
+
+def test_joiner_nltk_enjambment_same_output_as_reference(text_any):
+    """ JoinerNLTKWithRandomEnjambment overrides between_words(), so it takes the 'slow' path. same random draws
+    """
+    sentences = tokenizers.SentenceTokenizerNLTK().tokenize(clean.CleanInputString(text_any))
+
+    joiner = joiners.JoinerNLTKWithRandomEnjambment(_random=random.Random(1234))
+    reference_joiner = joiners.JoinerNLTKWithRandomEnjambment(_random=random.Random(1234))
+
+    for sentence in list(sentences) * 2:
+        assert joiner._join_word_seq(sentence) == _reference_join_word_seq(reference_joiner, sentence)
+
+
+def test_random_is_the_older_name_for_rng():
+    joiner = joiners.JoinerNLTKWithRandomIndent(_random=random.Random(5))
+    assert joiner.random is joiner.rng
+
+    joiner.random = random.Random(5)
+    indents = [joiner.between_sentences() for _ in xrange(10)]
+    joiner.rng = random.Random(5)
+    assert [joiner.between_sentences() for _ in xrange(10)] == indents
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+""" training & generating on an executor: futures, batches, and a caller that doesn't get held up
+"""
+import time
+
+import pytest
+from concurrent import futures
+
+from presswork.text import offload
+from presswork.text import text_makers
+from tests.text.performance import benchmarking
+
+INPUT_TEXT = u"\n".join([u"foo is better than bar.", u"bar is better than baz.", u"baz is better than foo."])
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_train_then_generate_in_batches(strategy):
+    text_maker = offload.create_text_maker(
+            strategy=strategy, sentence_tokenizer='just_whitespace', input_text=INPUT_TEXT).result(timeout=10)
+    assert text_maker.is_locked
+
+    batches = [future.result(timeout=10) for future in offload.iter_sentence_futures(
+            text_maker, 250, batch_size=100, rng=5)]
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+
+    # same output, when all the batches are in the executor at once
+    with futures.ThreadPoolExecutor(max_workers=3) as executor:
+        all_at_once = list(offload.iter_sentence_futures(text_maker, 250, batch_size=100, rng=5, executor=executor))
+        assert [future.result(timeout=10) for future in all_at_once] == batches
+
+
+def test_input_text_on_executor():
+    text_maker = text_makers.create_text_maker(strategy='crude', sentence_tokenizer='just_whitespace')
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        sentences = offload.input_text(text_maker, INPUT_TEXT, executor=executor).result(timeout=10)
+    assert len(sentences) == 3
+    assert text_maker.is_locked
+
+
+def test_errors_come_back_through_the_future():
+    future = offload.create_text_maker(strategy='nope', input_text=INPUT_TEXT)
+    with pytest.raises(KeyError):
+        future.result(timeout=10)
+
+    with pytest.raises(ValueError):
+        next(offload.iter_sentence_futures(text_makers.create_text_maker(), 10, batch_size=0))
+
+
+def test_stopping_early_leaves_no_work_behind():
+    text_maker = offload.create_text_maker(strategy='crude', input_text=INPUT_TEXT).result(timeout=10)
+    submitted = []
+
+    class RecordingExecutor(futures.ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            submitted.append(args)
+            return super(RecordingExecutor, self).submit(*args, **kwargs)
+
+    with RecordingExecutor(max_workers=1) as executor:
+        batch_futures = offload.iter_sentence_futures(text_maker, 10 ** 6, batch_size=10, executor=executor)
+        assert len(next(batch_futures).result(timeout=10)) == 10
+        batch_futures.close()
+    assert len(submitted) == 1
+
+
+@pytest.mark.slow
+def test_caller_keeps_running_while_a_big_model_trains():
+    """ like an event loop: tick every 5ms, while training on 1MB in the background. how late do the ticks get?
+    (training in the same thread instead would make 1 tick late by the whole training time, seconds)
+    """
+    corpus = benchmarking.corpus_of_size(1000000)
+    future = offload.create_text_maker(strategy='pymc', input_text=corpus, sentence_tokenizer='nltk')
+
+    lateness = []
+    while not future.done():
+        before = time.time()
+        time.sleep(0.005)
+        lateness.append(time.time() - before - 0.005)
+    assert future.result().is_locked
+
+    lateness.sort()
+    assert len(lateness) > 20
+    assert lateness[len(lateness) // 2] < 0.005
+    assert lateness[-1] < 0.25
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+""" generating in forked worker processes: same output with any number of workers, in order, errors come back
+"""
+import pytest
+
+from presswork.text import parallel
+from presswork.text import text_makers
+
+INPUT_TEXT = u"\n".join([u"foo is better than bar.", u"bar is better than baz.", u"baz is better than foo."])
+
+
+@pytest.fixture(scope='module', params=text_makers.TEXT_MAKER_NICKNAMES)
+def text_maker(request):
+    return text_makers.create_text_maker(
+            strategy=request.param, sentence_tokenizer='just_whitespace', input_text=INPUT_TEXT, ngram_size=1)
+
+
+def test_output_does_not_depend_on_workers(text_maker):
+    by_workers = [parallel.make_sentences(text_maker, 1005, workers=workers, rng=8, chunk_size=100)
+                  for workers in (1, 2, 4)]
+    assert by_workers[0] == by_workers[1] == by_workers[2]
+    assert len(by_workers[0]) == 1005
+
+    words = set(INPUT_TEXT.split()) | {u""}
+    assert all(set(sentence) <= words for sentence in by_workers[0])
+
+    assert parallel.make_sentences(text_maker, 1005, workers=2, rng=9, chunk_size=100) != by_workers[0]
+
+
+def test_chunks_stream_in_order(text_maker):
+    chunks = list(parallel.iter_sentence_chunks(text_maker, 250, workers=3, rng=1, chunk_size=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    assert [sentence for chunk in chunks for sentence in chunk] == parallel.make_sentences(
+            text_maker, 250, workers=1, rng=1, chunk_size=100)
+
+    # stopping early is fine too (the rest of the workers are stopped)
+    chunks = parallel.iter_sentence_chunks(text_maker, 10 ** 6, workers=2, chunk_size=10)
+    assert len(next(chunks)) == 10
+    chunks.close()
+
+
+def test_make_sentences_with_workers(text_maker):
+    sentences = text_maker.make_sentences(30, workers=2, rng=4)
+    assert len(sentences) == 30
+    assert sentences == text_maker.make_sentences(30, workers=1, rng=4)
+    assert len(text_maker.make_sentences(0, workers=2)) == 0
+
+
+def test_make_sentences_without_workers_is_the_same(text_maker):
+    """ no workers: the same chunks, made right here - so --seed means the same output, with or without --jobs """
+    count = parallel.CHUNK_SIZE + 5
+    assert text_maker.make_sentences(count, rng=4) == text_maker.make_sentences(count, workers=2, rng=4)
+    assert text_maker.make_sentences(count, rng=4) != text_maker.make_sentences(count, rng=5)
+
+
+def test_worker_errors_are_raised(monkeypatch):
+    text_maker = text_makers.create_text_maker(strategy='crude', input_text=INPUT_TEXT)
+
+    def broken(count, rng):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(text_maker, "_make_sentences", broken)
+    with pytest.raises(RuntimeError):
+        parallel.make_sentences(text_maker, 100, workers=2, chunk_size=10)
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        parallel.make_sentences(text_makers.create_text_maker(), 10, workers=2)
+
+    text_maker = text_makers.create_text_maker(input_text=INPUT_TEXT)
+    with pytest.raises(ValueError):
+        parallel.make_sentences(text_maker, 10, workers=0)
+    with pytest.raises(ValueError):
+        parallel.make_sentences(text_maker, 10, workers=2, chunk_size=0)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+""" prepare_for_fork: a layout that forked workers can share. same output, same model, less memory un-shared
+"""
+import os
+import sys
+
+import pytest
+
+from presswork.text import text_makers
+from tests import helpers
+from tests.text.performance.benchmarking import corpus_of_size
+
+
+@pytest.mark.parametrize('ngram_size', [1, 2, 3])
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_same_output_and_model_after_preparing(strategy, ngram_size):
+    text_maker = helpers.create_trained(strategy, ngram_size)
+    sentences = text_maker.make_sentences(200, rng=4)
+    transitions = text_maker._transition_counts()
+
+    text_makers.prepare_for_fork(text_maker)
+    assert text_maker.make_sentences(200, rng=4) == sentences
+    assert text_maker._transition_counts() == transitions
+
+    # preparing twice is fine
+    text_makers.prepare_for_fork(text_maker)
+    assert text_maker.make_sentences(200, rng=4) == sentences
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_prepared_text_maker_can_be_saved_pruned_and_merged(strategy, tmpdir):
+    text_maker = helpers.create_trained(strategy, input_text=corpus_of_size(20000))
+    text_makers.prepare_for_fork(text_maker)
+
+    filename = str(tmpdir.join("model.presswork"))
+    text_makers.save_text_maker(text_maker, filename)
+    loaded = text_makers.load_text_maker(filename)
+    assert loaded._transition_counts() == text_maker._transition_counts()
+    assert loaded.make_sentences(10)
+
+    merged = text_makers.merge_text_makers([text_maker, helpers.create_trained(strategy)])
+    assert merged.make_sentences(10)
+
+    text_maker.prune(min_count=2)
+    assert all(min(followers.values()) >= 2 for followers in text_maker._transition_counts().itervalues())
+    assert text_maker.make_sentences(10)
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_prepared_model_has_same_stats_and_is_no_bigger(strategy):
+    text_maker = helpers.create_trained(strategy, input_text=corpus_of_size(20000))
+    model_stats = text_maker._stats(exact_memory=True)
+    text_makers.prepare_for_fork(text_maker)
+    prepared_model_stats = text_maker._stats(exact_memory=True)
+
+    assert prepared_model_stats._replace(memory_bytes=None) == model_stats._replace(memory_bytes=None)
+    assert prepared_model_stats.memory_bytes <= model_stats.memory_bytes
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_prepared_empty_model(strategy):
+    text_maker = helpers.create_trained(strategy, input_text=u"")
+    text_makers.prepare_for_fork(text_maker)
+    assert text_maker.make_sentences(3) == helpers.create_trained(strategy, input_text=u"").make_sentences(3)
+
+
+def test_cannot_prepare_before_input():
+    with pytest.raises(ValueError):
+        text_makers.prepare_for_fork(text_makers.create_text_maker())
+
+
+def _private_kb_after_generating_in_child(text_maker):
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            before = helpers.private_kb()
+            text_maker.make_sentences(2000)
+            os.write(write_end, str(helpers.private_kb() - before))
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    return int(os.read(read_end, 100))
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="reads /proc/self/smaps")
+@pytest.mark.parametrize('strategy', ['markovify', 'pymc'])
+def test_prepared_model_stays_shared_in_forked_worker(strategy):
+    input_text = corpus_of_size(2000000)
+    unprepared, prepared = (helpers.create_trained(strategy, input_text=input_text) for _ in range(2))
+    text_makers.prepare_for_fork(prepared)
+
+    unshared_kb, unshared_kb_when_prepared = (_private_kb_after_generating_in_child(text_maker)
+                                              for text_maker in (unprepared, prepared))
+    assert unshared_kb_when_prepared < unshared_kb
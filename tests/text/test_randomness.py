@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+""" each TextMaker & joiner draws from its own rng: seeded output is reproducible, and nothing uses the global `random`
+"""
+import random
+import threading
+
+import pytest
+
+from presswork.text import randomness
+from presswork.text import text_makers
+from presswork.text.grammar import joiners
+from tests.helpers import ZEN_OF_PYTHON as INPUT_TEXT
+
+
+def _make_text(strategy, seed, count=50):
+    text_maker = text_makers.create_text_maker(
+            strategy=strategy, joiner='random_enjamb', input_text=INPUT_TEXT, ngram_size=1, rng=seed)
+    return text_maker.join(text_maker.make_sentences(count))
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_seeded_text_making_is_reproducible(strategy):
+    assert _make_text(strategy, seed=1) == _make_text(strategy, seed=1)
+    assert _make_text(strategy, seed=1) != _make_text(strategy, seed=2)
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_text_making_leaves_global_random_alone(strategy):
+    random.seed(123)
+    state = random.getstate()
+    text = _make_text(strategy, seed=1)
+    assert random.getstate() == state
+
+    # ... and doesn't depend on it
+    random.seed(456)
+    assert _make_text(strategy, seed=1) == text
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_substreams_make_parallel_generation_reproducible(strategy):
+    """ workers sharing 1 trained model, each with its own substream: the combined output doesn't depend on scheduling
+    """
+    text_maker = text_makers.create_text_maker(strategy=strategy, input_text=INPUT_TEXT, ngram_size=1)
+    worker_count, count_per_worker = 4, 200
+
+    def in_parallel(seed):
+        results = [None] * worker_count
+
+        def work(i, rng):
+            results[i] = text_maker.make_sentences(count_per_worker, rng=rng)
+
+        threads = [threading.Thread(target=work, args=(i, rng))
+                   for i, rng in enumerate(randomness.split_rng(randomness.make_rng(seed), worker_count))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [sentence for sentences in results for sentence in sentences]
+
+    def in_sequence(seed):
+        return [sentence for rng in randomness.split_rng(randomness.make_rng(seed), worker_count)
+                for sentence in text_maker.make_sentences(count_per_worker, rng=rng)]
+
+    assert in_parallel(seed=5) == in_sequence(seed=5) == in_parallel(seed=5)
+    assert in_parallel(seed=5) != in_parallel(seed=6)
+
+
+@pytest.mark.parametrize('nickname', joiners.JOINER_NICKNAMES)
+def test_every_joiner_takes_an_rng(nickname):
+    sentences = [[u"Foo", u"is", u"better", u"than", u"bar", u"."]] * 30
+    assert joiners.create_joiner(nickname, rng=3).join(sentences) == joiners.create_joiner(nickname, rng=3).join(
+            sentences)
+
+    rng = random.Random(3)
+    assert joiners.create_joiner(nickname, rng=rng).rng is rng
+
+
+def test_split_rng_is_deterministic_and_independent():
+    substreams = randomness.split_rng(randomness.make_rng(42), 8)
+    draws = [[substream.random() for _ in xrange(5)] for substream in substreams]
+    assert draws == [[substream.random() for _ in xrange(5)]
+                     for substream in randomness.split_rng(randomness.make_rng(42), 8)]
+    assert len(set(tuple(d) for d in draws)) == 8
+
+    # splitting advances the parent, so splitting again gives new substreams
+    parent = randomness.make_rng(42)
+    first, second = randomness.split_rng(parent, 1), randomness.split_rng(parent, 1)
+    assert first[0].random() != second[0].random()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+""" models in shared memory: attached models generate the same, in other processes too; swapping; reference tracking
+"""
+import os
+import sys
+
+import pytest
+
+from presswork.text import shared_models
+from presswork.text import text_makers
+from tests import helpers
+
+
+@pytest.fixture
+def directory(tmpdir):
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize('ngram_size', [1, 2, 3])
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_attached_model_generates_the_same(strategy, ngram_size, directory):
+    text_maker = helpers.create_trained(strategy, ngram_size)
+    shared_models.publish(text_maker, "zen", directory=directory)
+    attached = shared_models.attach("zen", directory=directory, joiner='just_whitespace')
+
+    assert attached.__class__ is text_maker.__class__ and attached.is_locked
+    assert attached.ngram_size == ngram_size
+    assert attached.make_sentences(300, rng=4) == text_maker.make_sentences(300, rng=4)
+    assert attached._transition_counts() == text_maker._transition_counts()
+    assert attached.stats()._replace(memory_bytes=0) == text_maker.stats()._replace(memory_bytes=0)
+
+    # an attached model can be published again (say, under another name), and saved, and pruned
+    shared_models.publish(attached, "zen2", directory=directory)
+    assert shared_models.attach("zen2", directory=directory).make_sentences(50, rng=1) == text_maker.make_sentences(
+            50, rng=1)
+    filename = os.path.join(directory, "zen.model")
+    text_makers.save_text_maker(attached, filename)
+    assert text_makers.load_text_maker(filename)._transition_counts() == text_maker._transition_counts()
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_attached_empty_model(strategy, directory):
+    text_maker = helpers.create_trained(strategy, input_text=u"")
+    shared_models.publish(text_maker, "empty", directory=directory)
+    assert shared_models.attach("empty", directory=directory).make_sentences(3) == text_maker.make_sentences(3)
+
+
+def test_attached_crude_model_steers_clear_of_dead_ends(directory):
+    text_maker = text_makers.create_text_maker(strategy='crude', ngram_size=1)
+    text_maker._load_transition_counts({(u'',): {u'go': 1, u'loop': 1}, (u'go',): {u'': 1}, (u'loop',): {u'loop': 1}})
+    text_maker._lock()
+    shared_models.publish(text_maker, "loop", directory=directory)
+
+    attached = shared_models.attach("loop", directory=directory)
+    assert attached.make_sentences(20, rng=2) == text_maker.make_sentences(20, rng=2) == [[u'go', u'']] * 20
+
+
+def test_republishing_swaps_the_model(directory):
+    foo = helpers.create_trained('markovify', input_text=u"Foo is better than bar.")
+    shared_models.publish(foo, "foo", directory=directory)
+    shared_model = shared_models.SharedModel("foo", directory=directory)
+    assert shared_model.generation == 1
+
+    with shared_model.text_maker() as old_text_maker:
+        bar = helpers.create_trained('pymc', input_text=u"Bar is better than baz.")
+        shared_models.publish(bar, "foo", directory=directory)
+        # (going on with the old one, while others get the new one)
+        with shared_model.text_maker() as new_text_maker:
+            assert shared_model.in_use == {1: 1, 2: 1}
+            assert new_text_maker.NICKNAME == 'pymc'
+            assert u"baz" in new_text_maker.join(new_text_maker.make_sentences(1))
+        assert u"bar" in old_text_maker.join(old_text_maker.make_sentences(1))
+
+    # the old one is let go once its last user is done
+    assert shared_model.in_use == {2: 0}
+    assert shared_model.generation == 2
+    assert not shared_model.refresh()
+
+
+def test_attached_model_outlives_unpublishing(directory):
+    shared_models.publish(helpers.create_trained('crude'), "zen", directory=directory)
+    attached = shared_models.attach("zen", directory=directory)
+    shared_models.unpublish("zen", directory=directory)
+
+    assert not os.path.exists(shared_models.shared_model_path("zen", directory=directory))
+    assert len(attached.make_sentences(10)) == 10
+    with pytest.raises(IOError):
+        shared_models.attach("zen", directory=directory)
+
+
+def test_shared_model_outlives_unpublishing(directory):
+    shared_models.publish(helpers.create_trained('crude'), "zen", directory=directory)
+    shared_model = shared_models.SharedModel("zen", directory=directory)
+    shared_models.unpublish("zen", directory=directory)
+
+    assert not shared_model.refresh()
+    with shared_model.text_maker() as text_maker:
+        assert len(text_maker.make_sentences(10)) == 10
+    assert shared_model.generation == 1
+
+    # (and once it's published again, that's picked up as usual)
+    shared_models.publish(helpers.create_trained('pymc'), "zen", directory=directory)
+    with shared_model.text_maker() as text_maker:
+        assert text_maker.NICKNAME == 'pymc'
+    with pytest.raises(OSError):
+        shared_models.SharedModel("never-published", directory=directory)
+
+
+def test_errors(directory):
+    with pytest.raises(ValueError):
+        shared_models.publish(text_makers.create_text_maker(), "untrained", directory=directory)
+    with pytest.raises(ValueError):
+        shared_models.shared_model_path("../escape", directory=directory)
+
+    with open(shared_models.shared_model_path("text", directory=directory), "w") as f:
+        f.write("Foo is better than bar.")
+    with pytest.raises(ValueError):
+        shared_models.attach("text", directory=directory)
+    # (and publishing over it is fine)
+    shared_models.publish(helpers.create_trained('crude'), "text", directory=directory)
+    assert shared_models.SharedModel("text", directory=directory).generation == 1
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_too_big_to_publish(strategy, directory):
+    # (past the limit: 1,625 words is as many as fit, at 6 per state)
+    words = [u"w{}".format(i) for i in xrange(2000)]
+    input_text = u" ".join(u" ".join(words[i:i + 20]) + u"." for i in xrange(0, len(words), 20))
+    text_maker = helpers.create_trained(strategy, ngram_size=6, input_text=input_text)
+
+    with pytest.raises(shared_models.ModelTooBigToPublish):
+        shared_models.publish(text_maker, "big", directory=directory)
+    assert not os.listdir(directory)
+
+    # (a smaller ngram size fits)
+    smaller = helpers.create_trained(strategy, ngram_size=3, input_text=input_text)
+    shared_models.publish(smaller, "big", directory=directory)
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="reads /proc/self/smaps")
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_other_processes_attach_and_share_the_memory(strategy, directory):
+    text_maker = helpers.create_trained(strategy)
+    path = shared_models.publish(text_maker, "zen", directory=directory)
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            attached = shared_models.attach("zen", directory=directory)
+            sentences = attached.make_sentences(500, rng=3)
+            memory_kb = helpers.smaps_kb(path)
+            # (read straight from the file's pages, in memory: none of it copied into this process' own memory)
+            ok = (sentences == text_maker.make_sentences(500, rng=3) and memory_kb['Rss'] > 0 and
+                  memory_kb['Anonymous'] == 0)
+            os.write(write_end, "ok" if ok else "not ok: {!r}".format(memory_kb))
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 1000) == "ok"
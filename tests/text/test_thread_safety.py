@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+""" threads sharing 1 trained TextMaker: generating doesn't change the model, and contention doesn't change the output
+"""
+import collections
+import threading
+
+import pytest
+
+from presswork.text import randomness
+from presswork.text import text_makers
+
+# "foo" starts most sentences, so that's a distribution to check
+INPUT_TEXT = u"\n".join([u"foo is better than bar."] * 3 + [u"bar is better than baz.", u"baz is better than foo."])
+
+THREAD_COUNT = 8
+SENTENCES_PER_THREAD = 300
+
+
+def _train(strategy, seed=None):
+    return text_makers.create_text_maker(
+            strategy=strategy, sentence_tokenizer='just_whitespace', joiner='random_enjamb', input_text=INPUT_TEXT,
+            ngram_size=1, rng=seed)
+
+
+def _make_text_in_threads(text_maker, all_at_once=True):
+    """ each thread makes sentences, and joins some, drawing from its own rngs (the TextMaker's & joiner's defaults,
+    for that thread). all_at_once=False runs the same threads one after another instead, so nothing is contended.
+
+    :return: the sentences made by each thread; and the text joined by each thread, from the same sentences
+    """
+    sentences, texts = [None] * THREAD_COUNT, [None] * THREAD_COUNT
+    errors = []
+    start = threading.Event()
+
+    def work(i):
+        start.wait()
+        try:
+            sentences[i] = [tuple(sentence) for sentence in text_maker.make_sentences(SENTENCES_PER_THREAD)]
+            texts[i] = text_maker.join([sentence.split() for sentence in INPUT_TEXT.splitlines()])
+        except Exception as e:  # pragma: no cover (only if the test fails)
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in xrange(THREAD_COUNT)]
+    start.set()
+    for thread in threads:
+        thread.start()
+        if not all_at_once:
+            thread.join()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    return sentences, texts
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_generating_from_threads_leaves_model_as_is(strategy):
+    text_maker = _train(strategy)
+    transitions_before = text_maker._transition_counts()
+    model_size_before = text_maker._model_size()
+
+    _make_text_in_threads(text_maker)
+
+    assert text_maker._transition_counts() == transitions_before
+    assert text_maker._model_size() == model_size_before
+
+
+@pytest.mark.parametrize('strategy', text_makers.TEXT_MAKER_NICKNAMES)
+def test_contention_does_not_change_the_output(strategy):
+    """ threads don't share an rng, so contended or not, a seeded TextMaker makes the same sentences & text (which
+    thread makes which, depends on the scheduling). the proportions come out as when generating without threads.
+    """
+    sentences, texts = _make_text_in_threads(_train(strategy, seed=11))
+    uncontended_sentences, uncontended_texts = _make_text_in_threads(_train(strategy, seed=11), all_at_once=False)
+
+    assert sorted(sentences) == sorted(uncontended_sentences)
+    assert sorted(texts) == sorted(uncontended_texts)
+    assert all(len(made) == SENTENCES_PER_THREAD for made in sentences)
+
+    def foo_share(made):
+        first_words = collections.Counter(next(word for word in sentence if word) for sentence in made)
+        return first_words["foo"] / float(len(made))
+
+    sample = _train(strategy, seed=12).make_sentences(THREAD_COUNT * SENTENCES_PER_THREAD)
+    all_sentences = [sentence for made in sentences for sentence in made]
+    assert foo_share(all_sentences) == pytest.approx(foo_share(sample), abs=0.05)
+
+
+def test_pymc_model_does_not_grow_when_read():
+    """ pymc's db was a defaultdict, so a lookup that missed would add to it. trained models are plain dicts now
+    """
+    text_maker = text_makers.create_text_maker(strategy='pymc', input_text=u"")
+    db = text_maker.strategy.db
+    assert type(db) is dict and all(type(probabilities) is dict for probabilities in db.itervalues())
+
+    states_before = len(db)
+    text_maker.make_sentences(10)
+    assert len(text_maker.strategy.db) == states_before
+
+
+def test_each_thread_gets_its_own_rng():
+    text_maker = _train('crude', seed=1)
+    rngs = []
+    threads = [threading.Thread(target=lambda: rngs.append(text_maker.rng)) for _ in xrange(4)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+
+    rngs.append(text_maker.rng)
+    rngs.append(text_maker.joiner.rng)
+    assert len(set(id(rng) for rng in rngs)) == len(rngs)
+    assert text_maker.rng is text_maker.rng
+
+
+def test_thread_rngs_are_reproducible():
+    def substreams(seed):
+        rngs = randomness.ThreadRngs(randomness.make_rng(seed))
+        draws = []
+        thread = threading.Thread(target=lambda: draws.append(rngs.get().random()))
+        thread.start()
+        thread.join()
+        return draws + [rngs.get().random()]
+
+    assert substreams(4) == substreams(4) != substreams(5)
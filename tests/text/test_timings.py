@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+""" tests for stage timings, beyond the doctests - each strategy & tokenizer reports each stage, once
+"""
+import pytest
+
+from presswork.text import clean
+from presswork.text import timings
+from presswork.text.grammar import tokenizers
+
+
+@pytest.mark.parametrize('tokenizer_nickname', tokenizers.TOKENIZER_NICKNAMES)
+def test_each_stage_is_timed(each_text_maker, text_any, tokenizer_nickname):
+    text_maker = each_text_maker
+    text_maker.sentence_tokenizer = tokenizers.create_sentence_tokenizer(tokenizer_nickname)
+
+    with timings.collect_timings() as recorded:
+        input_tokenized = text_maker.input_text(text_any)
+        sentences = text_maker.make_sentences(50)
+        text = text_maker.proofread(text_maker.join(sentences))
+
+    assert [timing.stage for timing in recorded] == list(timings.STAGES)
+
+    totals = recorded.totals()
+    assert totals['clean'].chars == len(clean.CleanInputString(text_any))
+    assert totals['split_sentences'].items == len(input_tokenized)
+    assert totals['tokenize_words'].items == sum(len(word_list) for word_list in input_tokenized)
+    assert totals['build_model'].items == len(input_tokenized)
+    assert totals['generate'].items == len(sentences) == 50
+    assert totals['join'].items == 50
+    assert totals['proofread'].chars == len(text)
+
+
+def test_nothing_timed_without_a_sink(each_text_maker):
+    recorded = timings.TimingsRecorder()
+    with timings.collect_timings(recorded):
+        pass
+
+    assert not timings.is_enabled()
+    each_text_maker.input_text(u"nothing is listening now")
+    each_text_maker.make_sentences(5)
+    assert len(recorded) == 0
+
+
+def test_sinks_are_pluggable_and_failed_stages_are_not_reported():
+    received = []
+    with timings.collect_timings(received.append):
+        with pytest.raises(ZeroDivisionError):
+            with timings.stage('generate'):
+                1 / 0
+        with timings.stage('join') as timer:
+            timer.count(items=1, chars=2)
+
+    assert [(timing.stage, timing.items, timing.chars) for timing in received] == [('join', 1, 2)]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+""" tests for engine tracing, beyond the doctests - the crude engine's events, on and off
+"""
+import logging
+
+import pytest
+
+from presswork.text.markov import _crude_markov
+from presswork.text.markov import tracing
+
+
+@pytest.fixture(autouse=True)
+def logging_not_disabled():
+    """ (some doctests call logging.disable(); that would turn tracing off too)
+    """
+    previously_disabled = logging.root.manager.disable
+    logging.disable(logging.NOTSET)
+    yield
+    logging.disable(previously_disabled)
+
+
+def test_crude_emits_structured_events_when_tracing():
+    with tracing.capture_trace_events() as events:
+        model = _crude_markov.crude_markov_chain([[u"a", u"b", u"c"]], ngram_size=2)
+        sentences = list(_crude_markov.iter_make_sentences(model, ngram_size=2, count=3))
+
+    assert [event.engine for event in events] == ['crude'] * len(events)
+    assert events[0].event == 'model_built'
+    assert events[0].fields['states'] == len(model)
+
+    sentence_ends = [event for event in events if event.event == 'sentence_end']
+    assert [event.fields['length'] for event in sentence_ends] == [len(sentence) for sentence in sentences]
+    assert any(event.event == 'step' for event in events)
+    assert all(isinstance(unicode(event), unicode) for event in events)
+
+
+def test_crude_emits_nothing_when_not_tracing():
+    events = []
+    with tracing.capture_trace_events(events):
+        pass
+
+    model = _crude_markov.crude_markov_chain([[u"a", u"b", u"c"]], ngram_size=2)
+    list(_crude_markov.iter_make_sentences(model, ngram_size=2, count=3))
+    assert events == []
+    assert tracing.get_tracer('crude') is None
@@ -6,8 +6,11 @@ this module should NOT test all of Markovify -
 
 what's left is just to test some of the edges in the wrapper (which Coverage showed were not covered by other tests)
 """
+import random
+
 import pytest
 
+from presswork.text import text_makers
 from presswork.text.markov.thirdparty import _markovify
 
 quick_dirty_tokenize = lambda text: [[word.strip() for word in sent.split()] for sent in text.splitlines()]
@@ -44,3 +47,35 @@ def test_markovify_disabled_features():
     # This is a great feature of markovify
     with pytest.raises(_markovify.NotYetImplementedInAdapter):
         markovify_lite.test_sentence_output()
+
+
+def test_text_maker_hands_tokenized_input_to_markovify_without_copying():
+    """ markovify insists on exactly `list` of `list`; tokenizers already give that inside the container, so no copy
+    """
+    text_maker = text_makers.create_text_maker(strategy="markovify", sentence_tokenizer="nltk")
+    tokenized = text_maker.input_text(input_text)
+
+    assert text_maker.strategy.parsed_sentences is tokenized.data
+    assert all(type(word_list) is list for word_list in text_maker.strategy.parsed_sentences)
+
+
+def test_markovify_walk_draws_like_markovify():
+    """ our walk() takes an rng, but otherwise it should be markovify's own Chain.walk(): same draws, same words
+    """
+    markovify_lite = _markovify.MarkovifyLite(parsed_sentences=quick_dirty_tokenize(input_text * 3), state_size=1)
+
+    random.seed(99)
+    expected = [markovify_lite.chain.walk() for _ in xrange(50)]
+
+    rng = random.Random(99)
+    assert [markovify_lite.walk(rng=rng) for _ in xrange(50)] == expected
+
+
+def test_markovify_make_sentence_options():
+    markovify_lite = _markovify.MarkovifyLite(parsed_sentences=quick_dirty_tokenize(input_text), state_size=1)
+
+    sentence = markovify_lite.make_sentence(init_state=(u"Roshi",), rng=random.Random(1))
+    assert sentence[:2] == [u"Roshi", u"always"]
+    assert markovify_lite.make_sentence(max_words=1, tries=3) is None
+    with pytest.raises(_markovify.NotYetImplementedInAdapter):
+        markovify_lite.make_sentence(test_output=True)
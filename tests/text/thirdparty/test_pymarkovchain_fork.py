@@ -5,14 +5,17 @@ just a couple cases because of forking the lib. want to give it smoketests on it
 tests related to TextMaker variants. (if something went wrong, it would help pinpoint.)
 """
 import os
+import random
 import warnings
 from collections import namedtuple
 
 import pytest
 
+from presswork.text import text_makers
 from presswork.text.grammar import joiners
 from presswork.text.grammar import tokenizers
 from presswork.text.markov.thirdparty._pymarkovchain import PyMarkovChainForked
+from tests import fixtures
 
 SentencesTestCase = namedtuple('SentencesTestCase', ['text', 'phrase_in_each_sentence'])
 
@@ -93,3 +96,75 @@ def test_database_persistence(pymc, test_case):
         pymc.db_clear()
         # even though we just deleted the db file, db is still in memory...
         assert test_case.phrase_in_each_sentence in rejoin(pymc.make_sentences_list(1))
+
+
+@pytest.mark.parametrize('window', [1, 2, 3])
+def test_generation_ends_on_cyclic_input(window):
+    """ a refrain where the end of sentence is (nearly) never drawn: used to make very long sentences. now bounded
+    """
+    pymc = PyMarkovChainForked(window=window)
+    pymc.markov_chain([["round", "and", "round", "it", "goes"] * 2000])
+
+    sentences = pymc.make_sentences_list(50)
+    assert all(0 < len(sentence) - 1 <= pymc.max_words_per_sentence for sentence in sentences)
+
+    pymc.max_state_visits_per_sentence = None
+    sentences = pymc.make_sentences_list(50)
+    assert all(len(sentence) - 1 <= pymc.max_words_per_sentence for sentence in sentences)
+    assert any(len(sentence) - 1 == pymc.max_words_per_sentence for sentence in sentences)
+
+
+@pytest.mark.parametrize('window', [1, 2, 3])
+def test_natural_text_is_not_cut_short(window):
+    """ the guards against going in circles shouldn't change sentences from ordinary text """
+    filename, = [filename for filename in fixtures.FILENAMES_NEWLINES if filename.endswith("senate-bills.txt")]
+    with open(filename) as f:
+        sentences = tokenize(f.read().decode('utf-8'))
+    pymc = PyMarkovChainForked(window=window)
+    pymc.markov_chain(sentences)
+    with_guards = pymc.make_sentences_list(500, rng=random.Random(1))
+
+    pymc.max_words_per_sentence = pymc.max_state_visits_per_sentence = None
+    assert with_guards == pymc.make_sentences_list(500, rng=random.Random(1))
+
+
+def test_guards_are_text_maker_options():
+    input_text = u" ".join([u"round and round it goes"] * 500) + u"."
+
+    text_maker = text_makers.create_text_maker(strategy='pymc', input_text=input_text, ngram_size=1)
+    assert text_maker.strategy.max_words_per_sentence == 100
+    assert text_maker.strategy.max_state_visits_per_sentence is None
+
+    text_maker = text_makers.create_text_maker(strategy='pymc', input_text=input_text, ngram_size=1,
+                                               max_words_per_sentence=None, max_state_visits_per_sentence=3)
+    sentences = text_maker.make_sentences(50, rng=1)
+    # ("round" comes up twice per lap, so the 3rd visit comes before the 2nd lap is through)
+    assert all(len(sentence) - 1 < 10 for sentence in sentences)
+
+    text_maker = text_makers.create_text_maker(strategy='pymc', input_text=input_text, ngram_size=1,
+                                               max_words_per_sentence=7)
+    assert max(len(sentence) - 1 for sentence in text_maker.make_sentences(50, rng=1)) == 7
+
+    with pytest.raises(TypeError):
+        text_makers.create_text_maker(strategy='markovify', max_words_per_sentence=7)
+
+
+@pytest.mark.parametrize('window', [1, 2, 3])
+def test_transition_counts_round_trip(window):
+    """ pruning goes via counts: recovering counts from the probabilities, and re-normalizing, should be lossless
+    """
+    pymc = PyMarkovChainForked(window=window)
+    pymc.markov_chain(tokenize(TEST_CASE_ZEN_OF_PYTHON.text))
+    transitions = pymc.transition_counts()
+    assert transitions[("better", "than")[-window:]] == {"ugly.": 1, "implicit.": 1, "complex.": 1,
+                                                        "complicated.": 1, "nested.": 1, "dense.": 1}
+
+    # (the placeholder w/ probability 0, for the beginning of sentence, is not a transition; it's left out)
+    probabilities_before = {state: {word: p for word, p in probabilities.items() if p}
+                            for state, probabilities in pymc.db.items() if any(probabilities.values())}
+    pymc.load_transition_counts(transitions)
+
+    assert set(probabilities_before) == set(pymc.db)
+    for state, probabilities in probabilities_before.items():
+        assert probabilities == pytest.approx(dict(pymc.db[state]))
+    assert pymc.transition_counts() == transitions